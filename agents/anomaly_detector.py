@@ -0,0 +1,214 @@
+"""
+Anomaly Detector Agent - Flags unusual spending at the moment it is recorded
+Keeps running statistics per (user, category) so no history is scanned
+"""
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import json
+import math
+import threading
+
+from memory.db import get_connection
+from utils.tracing import traced_methods
+
+# Transactions needed in a category before amounts are judged
+MIN_SAMPLES = 5
+
+# An expense this many times the category mean is a spike
+SPIKE_RATIO = 5.0
+
+# ...or this many standard deviations above it
+Z_SCORE_THRESHOLD = 3.5
+
+# Same fingerprint inside this window is treated as a duplicate charge
+DUPLICATE_WINDOW_SECONDS = 600
+
+# Fingerprints kept per (user, category)
+RECENT_FINGERPRINTS = 10
+
+# (user, category) entries kept in the in-process cache
+CACHE_SIZE = 10000
+
+
+@traced_methods
+class AnomalyDetectorAgent:
+    """
+    Streaming anomaly detection over expenses.
+    Uses Welford's online mean/variance and a short list of recent
+    transaction fingerprints, stored in `expense_stats`; the in-memory copy
+    is checked against the stored row before use.
+    """
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    def observe(self, cur, user_id, category, amount, description=None,
+                payment_method=None, expense_id=None):
+        """
+        Check a new expense against the running statistics, then fold it in.
+        Runs on the caller's cursor after it has written (so it holds the
+        database write lock) and commits with the expense itself; the stats
+        are read inside that transaction, so concurrent writers never fold
+        into a stale copy.
+        Returns the list of anomalies found (empty if the expense looks normal).
+        """
+        stats = self._load_stats(cur, user_id, category)
+        now = datetime.utcnow()
+        fingerprint = self._fingerprint(amount, description, payment_method)
+
+        anomalies = []
+
+        duplicate_of = self._find_duplicate(stats["recent"], fingerprint, now)
+        if duplicate_of is not None:
+            when = "just now" if duplicate_of < 60 else f"{duplicate_of // 60} minute(s) ago"
+            anomalies.append({
+                "type": "duplicate",
+                "score": duplicate_of,
+                "message": f"Possible duplicate: ₹{amount:,.0f} on {category} was also recorded {when}"
+            })
+
+        if stats["count"] >= MIN_SAMPLES and stats["mean"] > 0:
+            std = math.sqrt(stats["m2"] / (stats["count"] - 1))
+            ratio = amount / stats["mean"]
+            z_score = (amount - stats["mean"]) / std if std > 0 else 0
+            if ratio >= SPIKE_RATIO or z_score >= Z_SCORE_THRESHOLD:
+                anomalies.append({
+                    "type": "unusual_amount",
+                    "score": round(ratio, 2),
+                    "message": f"₹{amount:,.0f} on {category} is {ratio:.1f}x your usual "
+                               f"₹{stats['mean']:,.0f}"
+                })
+
+        # Welford update
+        count = stats["count"] + 1
+        delta = amount - stats["mean"]
+        mean = stats["mean"] + delta / count
+        m2 = stats["m2"] + delta * (amount - mean)
+        recent = ([[fingerprint, now.timestamp()]] + stats["recent"])[:RECENT_FINGERPRINTS]
+
+        cur.execute("""
+            INSERT INTO expense_stats (user_id, category, count, mean, m2, recent, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, category)
+            DO UPDATE SET count = excluded.count, mean = excluded.mean, m2 = excluded.m2,
+                          recent = excluded.recent, updated_at = excluded.updated_at
+        """, (user_id, category, count, mean, m2, json.dumps(recent), now.isoformat()))
+
+        if anomalies:
+            cur.executemany("""
+                INSERT INTO expense_anomalies (user_id, expense_id, category, amount,
+                                               anomaly_type, score, message, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (user_id, expense_id, category, amount, a["type"], a["score"],
+                 a["message"], now.isoformat())
+                for a in anomalies
+            ])
+
+        self._store(user_id, category, {"count": count, "mean": mean, "m2": m2, "recent": recent,
+                                        "updated_at": now.isoformat()})
+        return anomalies
+
+    def forget(self, user_id, category):
+        """Drop a cached entry, e.g. when the transaction that updated it rolled back"""
+        with self._lock:
+            self._cache.pop((user_id, category), None)
+
+    def recent_anomalies(self, user_id, limit=5):
+        """Latest stored anomalies for a user"""
+        conn = get_connection()
+        cur = conn.cursor()
+
+        try:
+            cur.execute("""
+                SELECT expense_id, category, amount, anomaly_type, score, message, created_at
+                FROM expense_anomalies
+                WHERE user_id = ?
+                ORDER BY created_at DESC
+                LIMIT ?
+            """, (user_id, limit))
+
+            return [
+                {
+                    "expense_id": row["expense_id"],
+                    "category": row["category"],
+                    "amount": row["amount"],
+                    "type": row["anomaly_type"],
+                    "score": row["score"],
+                    "message": row["message"],
+                    "created_at": row["created_at"]
+                }
+                for row in cur.fetchall()
+            ]
+        except Exception as e:
+            print(f"Error getting anomalies: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def _load_stats(self, cur, user_id, category):
+        """
+        Running stats as stored now. The cached copy is only used when the row
+        still has its count and updated_at (no other worker or request has
+        folded an expense in since), which saves decoding the fingerprints.
+        """
+        key = (user_id, category)
+        cur.execute("""
+            SELECT count, mean, m2, recent, updated_at FROM expense_stats
+            WHERE user_id = ? AND category = ?
+        """, (user_id, category))
+        row = cur.fetchone()
+        if not row:
+            return {"count": 0, "mean": 0.0, "m2": 0.0, "recent": []}
+
+        with self._lock:
+            stats = self._cache.get(key)
+            if stats is not None:
+                if stats["count"] == row["count"] and stats["updated_at"] == row["updated_at"]:
+                    self._cache.move_to_end(key)
+                    return stats
+                del self._cache[key]
+        return {
+            "count": row["count"],
+            "mean": row["mean"],
+            "m2": row["m2"],
+            "recent": json.loads(row["recent"]) if row["recent"] else []
+        }
+
+    def _store(self, user_id, category, stats):
+        with self._lock:
+            self._cache[(user_id, category)] = stats
+            self._cache.move_to_end((user_id, category))
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def _fingerprint(self, amount, description, payment_method):
+        """Short hash identifying 'the same charge' regardless of when it was entered"""
+        text = f"{round(amount, 2)}|{(description or '').strip().lower()}|{payment_method or ''}"
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+    def _find_duplicate(self, recent, fingerprint, now):
+        """Seconds since a matching recent charge, or None"""
+        for seen, timestamp in recent:
+            elapsed = now.timestamp() - timestamp
+            if seen == fingerprint and elapsed <= DUPLICATE_WINDOW_SECONDS:
+                return int(elapsed)
+        return None
+
+
+def rebuild_expense_stats(conn):
+    """Backfill running statistics from existing expense rows"""
+    cur = conn.cursor()
+    cur.execute("DELETE FROM expense_stats")
+    cur.execute("""
+        INSERT INTO expense_stats (user_id, category, count, mean, m2, recent, updated_at)
+        SELECT user_id, category, COUNT(*), AVG(amount),
+               MAX(SUM(amount * amount) - COUNT(*) * AVG(amount) * AVG(amount), 0),
+               '[]', datetime('now')
+        FROM expenses
+        WHERE user_id IS NOT NULL AND category IS NOT NULL AND amount IS NOT NULL
+        GROUP BY user_id, category
+    """)
+    with AnomalyDetectorAgent._lock:
+        AnomalyDetectorAgent._cache.clear()
@@ -1,12 +1,22 @@
 from llm.local_llm import llm
+from utils.tracing import traced_methods
 
+# Months of history a category needs before its baseline is trusted
+MIN_HISTORY_MONTHS = 3
 
+# Fallback cut for categories with no usable history
+DEFAULT_REDUCTION = 0.15
+
+
+@traced_methods
 class BudgetOptimizerAgent:
     """
     Suggests expense reductions with LLM-powered budget optimization.
+    Categories with enough history are compared against the user's own
+    baseline; only the ones running above their usual range are targeted.
     """
 
-    def suggest(self, expenses_by_category, confidence, financial_context=None):
+    def suggest(self, expenses_by_category, confidence, financial_context=None, baselines=None):
         if confidence < 0.7:
             return {
                 "status": "skipped",
@@ -14,11 +24,20 @@ class BudgetOptimizerAgent:
                 "suggestions": []
             }
 
+        baselines = baselines or {}
         suggestions = []
 
         for category, amount in expenses_by_category.items():
-            if amount > 0:
-                cut = round(amount * 0.15, 2)
+            if amount <= 0:
+                continue
+
+            baseline = baselines.get(category)
+            if baseline and baseline.get("months_observed", 0) >= MIN_HISTORY_MONTHS:
+                suggestion = self._suggest_from_baseline(category, amount, baseline)
+                if suggestion:
+                    suggestions.append(suggestion)
+            else:
+                cut = round(amount * DEFAULT_REDUCTION, 2)
                 suggestions.append({
                     "category": category,
                     "current": amount,
@@ -42,3 +61,26 @@ class BudgetOptimizerAgent:
             "llm_advice": llm_advice,
             "total_potential_savings": sum(s["suggested_reduction"] for s in suggestions)
         }
+
+    def _suggest_from_baseline(self, category, amount, baseline):
+        """Target a category only when it runs above its usual (75th percentile) level"""
+        typical = baseline["median"]
+        if amount <= baseline["p75"] or amount <= typical:
+            return None
+
+        cut = round(amount - typical, 2)
+        message = (
+            f"{category} is ₹{amount:,.0f} this month vs. your usual ₹{typical:,.0f} "
+            f"(75th percentile ₹{baseline['p75']:,.0f}). Bring it back to ₹{typical:,.0f}"
+        )
+        if baseline.get("trend", 0) > 0:
+            message += f" - it has been rising by about ₹{baseline['trend']:,.0f} per month"
+
+        return {
+            "category": category,
+            "current": amount,
+            "suggested_reduction": cut,
+            "new_amount": round(typical, 2),
+            "message": message,
+            "baseline": baseline
+        }
@@ -1,3 +1,7 @@
+from utils.tracing import traced_methods
+
+
+@traced_methods
 class CriticAgent:
     """
     Audits realism and assigns confidence.
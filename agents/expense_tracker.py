@@ -1,19 +1,30 @@
 from datetime import datetime
 from memory.db import get_connection
+from memory.category_stats import record_expense
+from memory.versions import bump_data_version
+from agents.anomaly_detector import AnomalyDetectorAgent
+from agents.recurring_detector import RecurringExpenseAgent
+from utils.tracing import traced_methods
 
 
+@traced_methods
 class ExpenseTrackerAgent:
     """
     This agent records and aggregates expenses.
     It does NOT make decisions or recommendations.
     """
 
+    def __init__(self):
+        self.anomaly_detector = AnomalyDetectorAgent()
+        self.recurring = RecurringExpenseAgent()
+
     def add_expense(self, user_id, category, amount, month, description=None, 
                    subcategory=None, date=None, payment_method=None, 
                    is_recurring=False, tags=None):
         """
         Add expense with detailed information
         Helps agents get more context about spending patterns
+        Returns any spending anomalies flagged for this expense
         """
         conn = get_connection()
         cur = conn.cursor()
@@ -25,18 +36,32 @@ class ExpenseTrackerAgent:
         # Convert tags list to string
         tags_str = ",".join(tags) if isinstance(tags, list) else tags
 
-        cur.execute(
-            """
-            INSERT INTO expenses (user_id, category, subcategory, amount, date, month, 
-                                 description, payment_method, is_recurring, tags, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (user_id, category, subcategory, amount, date, month, description, 
-             payment_method, 1 if is_recurring else 0, tags_str, datetime.utcnow().isoformat())
-        )
+        try:
+            cur.execute(
+                """
+                INSERT INTO expenses (user_id, category, subcategory, amount, date, month, 
+                                     description, payment_method, is_recurring, tags, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (user_id, category, subcategory, amount, date, month, description, 
+                 payment_method, 1 if is_recurring else 0, tags_str, datetime.utcnow().isoformat())
+            )
+            expense_id = cur.lastrowid
+            record_expense(cur, user_id, category, month, amount, date)
+            bump_data_version(cur, user_id)
+            anomalies = self.anomaly_detector.observe(
+                cur, user_id, category, amount, description, payment_method, expense_id
+            )
+            self.recurring.observe(cur, user_id, category, description)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            self.anomaly_detector.forget(user_id, category)
+            raise
+        finally:
+            conn.close()
 
-        conn.commit()
-        conn.close()
+        return anomalies
     
     def get_detailed_expenses(self, user_id, month):
         """Get detailed expense breakdown with all fields"""
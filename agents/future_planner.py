@@ -1,6 +1,8 @@
 from llm.local_llm import llm
+from utils.tracing import traced_methods
 
 
+@traced_methods
 class FuturePlannerAgent:
     """
     Projects future financial readiness with LLM-powered planning advice.
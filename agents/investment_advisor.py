@@ -3,9 +3,26 @@ Investment Advisor Agent with LLM-powered recommendations
 """
 from llm.local_llm import llm
 from memory.db import get_connection
+from memory.versions import bump_data_version
+from utils.backtest import BUCKET_SERIES
+from utils.calculations import xirr_batch, cagr
+from utils.market_data import load_price_series
 from datetime import datetime
+from utils.tracing import traced_methods
 
+# Keywords mapping free-text investment types onto NAV buckets (first match wins)
+TYPE_BUCKETS = [
+    (("elss", "tax saving"), "elss"),
+    (("hybrid", "balanced"), "hybrid"),
+    (("debt", "bond", "gilt", "liquid"), "debt"),
+    (("equity", "mutual fund", "index", "sip", "large cap", "mid cap", "small cap"), "equity")
+]
 
+# Rows fetched and updated per batch during revaluation
+REVALUE_BATCH_SIZE = 1000
+
+
+@traced_methods
 class InvestmentAdvisorAgent:
     """
     Provides investment recommendations based on user profile and financial state
@@ -21,9 +38,10 @@ class InvestmentAdvisorAgent:
         cur = conn.cursor()
         
         try:
-            # Get existing investments
+            # Get existing investments (marked to market by revalue_holdings)
             cur.execute("""
-                SELECT investment_type, SUM(amount) as total_amount, 
+                SELECT investment_type, SUM(amount) as total_amount,
+                       SUM(COALESCE(current_value, amount)) as total_value,
                        AVG(expected_return) as avg_return, risk_level
                 FROM investments
                 WHERE user_id = ?
@@ -31,7 +49,13 @@ class InvestmentAdvisorAgent:
             """, (user_id,))
             
             investments = cur.fetchall()
-            portfolio_value = sum(row["total_amount"] for row in investments)
+            portfolio_value = sum(row["total_value"] for row in investments)
+            invested_amount = sum(row["total_amount"] for row in investments)
+            
+            cur.execute("""
+                SELECT xirr, cagr, valued_at FROM portfolio_returns WHERE user_id = ?
+            """, (user_id,))
+            returns = cur.fetchone()
             
             # Get user profile for context
             cur.execute("""
@@ -60,10 +84,16 @@ class InvestmentAdvisorAgent:
             
             return {
                 "current_portfolio_value": portfolio_value,
+                "invested_amount": invested_amount,
+                "unrealized_gain": portfolio_value - invested_amount,
+                "xirr_pct": round(returns["xirr"] * 100, 2) if returns and returns["xirr"] is not None else None,
+                "cagr_pct": round(returns["cagr"] * 100, 2) if returns and returns["cagr"] is not None else None,
+                "valued_at": returns["valued_at"] if returns else None,
                 "existing_investments": [
                     {
                         "type": row["investment_type"],
                         "amount": row["total_amount"],
+                        "current_value": row["total_value"],
                         "expected_return": row["avg_return"],
                         "risk": row["risk_level"]
                     }
@@ -86,6 +116,21 @@ class InvestmentAdvisorAgent:
         finally:
             conn.close()
     
+    def portfolio_fingerprint(self, user_id: int) -> dict:
+        """Cheap summary that changes whenever the user's holdings or valuations change"""
+        conn = get_connection()
+        cur = conn.cursor()
+        
+        try:
+            cur.execute("""
+                SELECT COUNT(*) AS holdings, MAX(id) AS last_id, SUM(amount) AS invested,
+                       SUM(current_value) AS value, MAX(valued_at) AS valued_at
+                FROM investments WHERE user_id = ?
+            """, (user_id,))
+            return dict(cur.fetchone())
+        finally:
+            conn.close()
+    
     def _calculate_recommendations(self, context: dict, investments: list) -> list:
         """Calculate specific investment recommendations"""
         recommendations = []
@@ -179,7 +224,8 @@ class InvestmentAdvisorAgent:
             return "low"
     
     def add_investment(self, user_id: int, investment_type: str, amount: float, 
-                      expected_return: float, risk_level: str, notes: str = None):
+                      expected_return: float, risk_level: str, notes: str = None,
+                      nav_series: str = None):
         """Record a new investment"""
         conn = get_connection()
         cur = conn.cursor()
@@ -187,10 +233,12 @@ class InvestmentAdvisorAgent:
         try:
             cur.execute("""
                 INSERT INTO investments (user_id, investment_type, amount, current_value, 
-                                       expected_return, risk_level, notes, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                                       expected_return, risk_level, notes, nav_series, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (user_id, investment_type, amount, amount, expected_return, risk_level, notes,
+                  nav_series or self._nav_series_for(investment_type),
                   datetime.utcnow().isoformat()))
+            bump_data_version(cur, user_id)
             conn.commit()
             return True
         except Exception as e:
@@ -199,4 +247,129 @@ class InvestmentAdvisorAgent:
             return False
         finally:
             conn.close()
-
+    
+    def revalue_holdings(self) -> dict:
+        """
+        Mark every holding to market from the local NAV files and refresh
+        per-holding and per-user returns.
+        Units are fixed from the NAV on the purchase date the first time a
+        holding is valued; holdings without a NAV series, or bought before its
+        history starts, keep their last value and NULL units.
+        """
+        conn = get_connection()
+        cur = conn.cursor()
+        
+        try:
+            cur.execute("""
+                SELECT id, user_id, investment_type, amount, current_value, units,
+                       nav_series, created_at
+                FROM investments
+                ORDER BY id
+            """)
+            
+            updated = 0
+            before_history = 0
+            holding_flows = []
+            user_flows = {}
+            user_totals = {}
+            
+            while True:
+                rows = cur.fetchmany(REVALUE_BATCH_SIZE)
+                if not rows:
+                    break
+                
+                updates = []
+                for row in rows:
+                    bought = self._parse_date(row["created_at"])
+                    series_name = row["nav_series"] or self._nav_series_for(row["investment_type"])
+                    series = load_price_series(series_name) if series_name else None
+                    
+                    units = row["units"]
+                    value = row["current_value"] if row["current_value"] is not None else row["amount"]
+                    valued_on = None
+                    if series and len(series) and bought:
+                        buy_index = series.index_as_of(bought.isoformat())
+                        if units is None and buy_index < 0:
+                            before_history += 1  # No NAV on the purchase date to fix units from
+                        elif units is None:
+                            buy_nav = series.closes[buy_index]
+                            units = row["amount"] / buy_nav if buy_nav > 0 else None
+                        if units is not None:
+                            value = units * series.closes[-1]
+                            valued_on = self._parse_date(series.dates[-1])
+                            updates.append((units, series_name, value, series.dates[-1], row["id"]))
+                    
+                    valued_on = valued_on or datetime.utcnow().date()
+                    flows = [(bought, -row["amount"]), (valued_on, value)] if bought else []
+                    holding_flows.append((row["id"], flows, row["amount"], value, bought, valued_on))
+                    user_flows.setdefault(row["user_id"], []).extend(flows)
+                    totals = user_totals.setdefault(row["user_id"], [0.0, 0.0, None, None])
+                    totals[0] += row["amount"]
+                    totals[1] += value
+                    if bought:
+                        totals[2] = min(totals[2] or bought, bought)
+                    totals[3] = max(totals[3] or valued_on, valued_on)
+                
+                if updates:
+                    write = conn.cursor()
+                    write.executemany("""
+                        UPDATE investments
+                        SET units = ?, nav_series = ?, current_value = ?, valued_at = ?
+                        WHERE id = ?
+                    """, updates)
+                    updated += len(updates)
+            
+            # One batched solve for every holding and every user
+            holding_xirr = xirr_batch([flows for _, flows, *_ in holding_flows])
+            user_ids = list(user_flows)
+            user_xirr = xirr_batch([user_flows[uid] for uid in user_ids])
+            
+            write = conn.cursor()
+            write.executemany(
+                "UPDATE investments SET xirr = ? WHERE id = ?",
+                [(rate, holding[0]) for holding, rate in zip(holding_flows, holding_xirr)]
+            )
+            
+            now = datetime.utcnow().isoformat()
+            portfolio_rows = []
+            for uid, rate in zip(user_ids, user_xirr):
+                invested, value, first_buy, last_valued = user_totals[uid]
+                years = (last_valued - first_buy).days / 365.0 if first_buy else 0
+                portfolio_rows.append((uid, invested, value, rate, cagr(invested, value, years), now))
+            write.executemany("""
+                INSERT INTO portfolio_returns (user_id, invested, current_value, xirr, cagr, valued_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET invested = excluded.invested,
+                    current_value = excluded.current_value, xirr = excluded.xirr,
+                    cagr = excluded.cagr, valued_at = excluded.valued_at
+            """, portfolio_rows)
+            # Every user's portfolio view changed
+            bump_data_version(write)
+            
+            conn.commit()
+            return {
+                "holdings": len(holding_flows),
+                "marked_to_market": updated,
+                "before_history": before_history,
+                "users": len(user_ids)
+            }
+        except Exception as e:
+            conn.rollback()
+            print(f"Error revaluing holdings: {e}")
+            raise
+        finally:
+            conn.close()
+    
+    def _nav_series_for(self, investment_type: str):
+        """NAV series name for a free-text investment type, or None"""
+        text = (investment_type or "").lower()
+        for keywords, bucket in TYPE_BUCKETS:
+            if any(keyword in text for keyword in keywords):
+                return BUCKET_SERIES[bucket]
+        return None
+    
+    def _parse_date(self, value):
+        try:
+            return datetime.strptime(value[:10], "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            return None
@@ -2,38 +2,83 @@
 Market Advisor Agent - Provides SIP recommendations based on market conditions
 Helps beginners understand market-based investment strategies
 """
-from llm.local_llm import llm
+from llm.local_llm import llm, run_deferred
+from utils.market_data import (
+    INDEX_SERIES, load_price_series, market_condition_at, volatility_label
+)
+from utils.backtest import (
+    load_bucket_series, monthly_schedule, run_backtest, conditions_for_dates
+)
 from datetime import datetime
-import random
+import threading
+from utils.tracing import traced_methods
 
 
+@traced_methods
 class MarketAdvisorAgent:
     """
     Provides market-aware SIP investment recommendations
-    Simulates market conditions and suggests appropriate SIP strategies
+    Reads market conditions from local index history and suggests appropriate SIP strategies
     """
     
+    _condition_cache = {}
+    _condition_lock = threading.Lock()
+    
     def __init__(self):
         self.llm = llm
     
-    def get_market_condition(self) -> dict:
-        """Get current market condition (simulated - can be replaced with real API)"""
-        # In production, this would fetch from a real market API
-        # For now, we simulate market conditions
-        
-        conditions = ["bull", "bear", "volatile", "stable"]
-        weights = [0.3, 0.2, 0.3, 0.2]  # Probability distribution
-        condition = random.choices(conditions, weights=weights)[0]
-        
+    def get_market_condition(self, as_of: str = None) -> dict:
+        """
+        Get market condition as of a trading day (default: today).
+        Derived deterministically from moving averages, drawdown and realized
+        volatility of the local index history, and cached per trading day.
+        """
+        as_of = as_of or datetime.now().strftime("%Y-%m-%d")
+        series = load_price_series(INDEX_SERIES)
+        index = series.index_as_of(as_of) if series else -1
+
+        if index < 0:
+            # No local history - fall back to a neutral, stable reading
+            return {
+                "condition": "stable",
+                "nifty_level": None,
+                "sentiment": "neutral",
+                "volatility": "medium",
+                "recommended_strategy": self._get_strategy_for_condition("stable"),
+                "as_of": as_of,
+                "data_source": "unavailable"
+            }
+
+        key = (series.name, series.version, series.dates[index])
+        with self._condition_lock:
+            cached = self._condition_cache.get(key)
+        if cached:
+            return dict(cached)
+
+        snapshot = market_condition_at(series, index)
+        condition = snapshot["condition"] or "stable"
+
         market_data = {
             "condition": condition,
-            "nifty_level": random.randint(18000, 22000),
+            "nifty_level": round(snapshot["close"], 2),
             "sentiment": "positive" if condition == "bull" else "cautious" if condition == "bear" else "neutral",
-            "volatility": "high" if condition == "volatile" else "medium" if condition == "bear" else "low",
-            "recommended_strategy": self._get_strategy_for_condition(condition)
+            "volatility": volatility_label(snapshot["volatility"]),
+            "recommended_strategy": self._get_strategy_for_condition(condition),
+            "as_of": snapshot["as_of"],
+            "data_source": INDEX_SERIES,
+            "indicators": {
+                "sma_50": round(snapshot["sma_short"], 2) if snapshot["sma_short"] else None,
+                "sma_200": round(snapshot["sma_long"], 2) if snapshot["sma_long"] else None,
+                "drawdown_pct": round(snapshot["drawdown"] * 100, 2),
+                "volatility_pct": round(snapshot["volatility"] * 100, 2) if snapshot["volatility"] else None
+            }
         }
-        
-        return market_data
+
+        with self._condition_lock:
+            # Only the latest trading day is ever asked for again
+            self._condition_cache.clear()
+            self._condition_cache[key] = market_data
+        return dict(market_data)
     
     def _get_strategy_for_condition(self, condition: str) -> str:
         """Get investment strategy based on market condition"""
@@ -60,15 +105,7 @@ class MarketAdvisorAgent:
         risk_tolerance = user_context.get("risk_tolerance", "moderate") if user_context else "moderate"
         investment_experience = user_context.get("investment_experience", "beginner") if user_context else "beginner"
         
-        # Calculate investable amount (50% of savings if emergency fund is built, else 30%)
-        emergency_fund = financial_state.get("emergency_fund", 0)
-        monthly_expenses = financial_state.get("total_expenses", 0)
-        target_emergency = monthly_expenses * 6
-        
-        if emergency_fund >= target_emergency:
-            investable_amount = monthly_savings * 0.5
-        else:
-            investable_amount = monthly_savings * 0.3
+        investable_amount = self.investable_amount(financial_state)
         
         # Build SIP recommendations based on market and user profile
         sip_plan = {
@@ -86,6 +123,20 @@ class MarketAdvisorAgent:
         
         return sip_plan
     
+    async def asuggest_sip_plan(self, user_id: int, financial_state: dict, user_context: dict = None) -> dict:
+        """Async suggest_sip_plan for the async server - the LLM call doesn't hold a thread"""
+        return await run_deferred(self.suggest_sip_plan, user_id, financial_state, user_context)
+    
+    def investable_amount(self, financial_state: dict) -> float:
+        """Monthly SIP budget: 50% of savings if the emergency fund is built, else 30%"""
+        monthly_savings = financial_state.get("income", 0) - financial_state.get("total_expenses", 0)
+        emergency_fund = financial_state.get("emergency_fund", 0)
+        target_emergency = financial_state.get("total_expenses", 0) * 6
+        
+        if emergency_fund >= target_emergency:
+            return monthly_savings * 0.5
+        return monthly_savings * 0.3
+    
     def _calculate_sip_allocations(self, total_amount: float, risk_tolerance: str, 
                                  market_condition: str, age: int, experience: str) -> list:
         """Calculate SIP allocations across different fund types"""
@@ -127,6 +178,7 @@ class MarketAdvisorAgent:
         if equity_amount > 0:
             allocations.append({
                 "type": "Equity Mutual Funds (SIP)",
+                "bucket": "equity",
                 "amount": equity_amount,
                 "percentage": round(equity_pct * 100, 1),
                 "recommended_funds": self._get_fund_recommendations("equity", market_condition, experience),
@@ -136,6 +188,7 @@ class MarketAdvisorAgent:
         if hybrid_amount > 0:
             allocations.append({
                 "type": "Hybrid/Balanced Funds (SIP)",
+                "bucket": "hybrid",
                 "amount": hybrid_amount,
                 "percentage": round(hybrid_pct * 100, 1),
                 "recommended_funds": self._get_fund_recommendations("hybrid", market_condition, experience),
@@ -145,6 +198,7 @@ class MarketAdvisorAgent:
         if debt_amount > 0:
             allocations.append({
                 "type": "Debt Funds (SIP)",
+                "bucket": "debt",
                 "amount": debt_amount,
                 "percentage": round(debt_pct * 100, 1),
                 "recommended_funds": self._get_fund_recommendations("debt", market_condition, experience),
@@ -157,6 +211,7 @@ class MarketAdvisorAgent:
             if elss_amount > 0:
                 allocations.append({
                     "type": "ELSS (Tax Saving) - SIP",
+                    "bucket": "elss",
                     "amount": elss_amount,
                     "percentage": round((elss_amount / total_amount) * 100, 1),
                     "recommended_funds": self._get_fund_recommendations("elss", market_condition, experience),
@@ -165,6 +220,67 @@ class MarketAdvisorAgent:
         
         return allocations
     
+    def backtest_sip_plan(self, monthly_amount: float, risk_tolerance: str = "moderate",
+                          age: int = 30, experience: str = "beginner", years: int = 10,
+                          strategies: list = None) -> dict:
+        """
+        Replay the SIP allocations from _calculate_sip_allocations over local NAV history.
+        Strategies: "static" (no market adjustment), "market_adjusted" (split follows
+        the market condition each month), each optionally with "_rebalanced" (annual).
+        """
+        series = load_bucket_series()
+        if not series:
+            return {
+                "status": "unavailable",
+                "message": "No local NAV history found for backtesting"
+            }
+
+        dates, navs = monthly_schedule(series, years)
+        if len(dates) < 12:
+            return {
+                "status": "unavailable",
+                "message": "Not enough overlapping NAV history for a backtest"
+            }
+
+        strategies = strategies or [
+            "static", "static_rebalanced", "market_adjusted", "market_adjusted_rebalanced"
+        ]
+
+        # One allocation per market condition, reused for every month
+        split_cache = {}
+
+        def split_for(condition):
+            if condition not in split_cache:
+                allocations = self._calculate_sip_allocations(
+                    monthly_amount, risk_tolerance, condition, age, experience
+                )
+                split_cache[condition] = {a["bucket"]: a["amount"] for a in allocations}
+            return split_cache[condition]
+
+        conditions = None
+        results = {}
+        for strategy in strategies:
+            if strategy.startswith("market_adjusted"):
+                if conditions is None:
+                    conditions = conditions_for_dates(load_price_series(INDEX_SERIES), dates)
+                monthly_splits = [split_for(c or "stable") for c in conditions]
+            elif strategy.startswith("static"):
+                monthly_splits = [split_for("stable")] * len(dates)
+            else:
+                continue
+
+            rebalance = "annual" if strategy.endswith("_rebalanced") else None
+            results[strategy] = run_backtest(dates, navs, monthly_splits, rebalance)
+
+        return {
+            "status": "completed",
+            "monthly_amount": monthly_amount,
+            "risk_tolerance": risk_tolerance,
+            "years": years,
+            "buckets": sorted(series.keys()),
+            "strategies": results
+        }
+    
     def _get_fund_recommendations(self, fund_type: str, market_condition: str, experience: str) -> list:
         """Get specific fund recommendations based on type and market"""
         recommendations = []
@@ -2,12 +2,15 @@
 Monthly Planner Agent - Self-sufficient agent that creates comprehensive monthly plans
 Based on user input and financial data, creates actionable monthly financial plans
 """
-from llm.local_llm import llm
-from memory.db import get_connection
+from llm.local_llm import llm, run_deferred
+from auth import get_user_profile
 from datetime import datetime
 from agents.expense_tracker import ExpenseTrackerAgent
+from agents.recurring_detector import RecurringExpenseAgent
+from utils.tracing import traced_methods
 
 
+@traced_methods
 class MonthlyPlannerAgent:
     """
     Self-sufficient agent that creates monthly financial plans
@@ -17,23 +20,19 @@ class MonthlyPlannerAgent:
     def __init__(self):
         self.llm = llm
         self.expense_tracker = ExpenseTrackerAgent()
+        self.recurring = RecurringExpenseAgent()
     
-    def create_monthly_plan(self, user_id: int, user_prompt: str = None) -> dict:
+    def create_monthly_plan(self, user_id: int, user_prompt: str = None, month: str = None,
+                            profile: dict = None, expenses: dict = None, committed: dict = None) -> dict:
         """
         Create a comprehensive monthly plan based on user's financial situation
         This is the main self-sufficient planning function
+        profile (as get_user_profile returns it), expenses (monthly_summary) and
+        committed (forecast) are read here unless the caller already has them.
         """
-        conn = get_connection()
-        cur = conn.cursor()
-        
         try:
-            # Get user profile
-            cur.execute("""
-                SELECT monthly_income, emergency_fund, total_emi, age, occupation,
-                       financial_goals, risk_tolerance, investment_experience
-                FROM user_profile WHERE user_id = ?
-            """, (user_id,))
-            profile = cur.fetchone()
+            if profile is None:
+                profile = get_user_profile(user_id)
             
             if not profile:
                 return {
@@ -42,14 +41,18 @@ class MonthlyPlannerAgent:
                 }
             
             # Get current month expenses
-            current_month = datetime.now().strftime("%Y-%m")
-            expenses = self.expense_tracker.monthly_summary(user_id, current_month)
+            current_month = month or datetime.now().strftime("%Y-%m")
+            if expenses is None:
+                expenses = self.expense_tracker.monthly_summary(user_id, current_month)
+            if committed is None:
+                committed = self.recurring.forecast(user_id, current_month)
             
             # Build comprehensive financial state
-            income = profile["monthly_income"] or 0
-            total_expenses = expenses.get("total", 0)
-            emi = profile["total_emi"] or 0
-            emergency_fund = profile["emergency_fund"] or 0
+            # The current month is partial, so plan on at least the committed recurring spend
+            income = profile.get("income") or 0
+            total_expenses = max(expenses.get("total", 0), committed.get("committed_spend", 0))
+            emi = profile.get("emi") or 0
+            emergency_fund = profile.get("emergency_fund") or 0
             monthly_savings = income - total_expenses
             
             financial_state = {
@@ -58,10 +61,10 @@ class MonthlyPlannerAgent:
                 "total_emi": emi,
                 "emergency_fund": emergency_fund,
                 "monthly_savings": monthly_savings,
-                "age": profile["age"] or 30,
-                "occupation": profile["occupation"] or "",
-                "financial_goals": profile["financial_goals"] or "",
-                "risk_tolerance": profile["risk_tolerance"] or "moderate",
+                "age": profile.get("age") or 30,
+                "occupation": profile.get("occupation") or "",
+                "financial_goals": profile.get("financial_goals") or "",
+                "risk_tolerance": profile.get("risk_tolerance") or "moderate",
                 "expenses_by_category": expenses.get("by_category", {})
             }
             
@@ -78,6 +81,7 @@ class MonthlyPlannerAgent:
                     "emi_burden": (emi / income * 100) if income > 0 else 0
                 },
                 "expense_breakdown": expenses.get("by_category", {}),
+                "committed_forecast": committed,
                 "recommendations": self._generate_recommendations(financial_state),
                 "action_items": self._generate_action_items(financial_state),
                 "budget_allocation": self._suggest_budget_allocation(financial_state),
@@ -92,8 +96,10 @@ class MonthlyPlannerAgent:
                 "status": "error",
                 "message": f"Error creating plan: {str(e)}"
             }
-        finally:
-            conn.close()
+    
+    async def acreate_monthly_plan(self, user_id: int, user_prompt: str = None) -> dict:
+        """Async create_monthly_plan for the async server - the LLM call doesn't hold a thread"""
+        return await run_deferred(self.create_monthly_plan, user_id, user_prompt)
     
     def _generate_recommendations(self, state: dict) -> list:
         """Generate specific recommendations based on financial state"""
@@ -0,0 +1,195 @@
+"""
+Peer Benchmark Agent - Compares a user's key ratios with similar users
+Sketches are built in the background (build_peer_sketches.py); requests only
+read the small `peer_sketches` table, never user_profile or expenses.
+"""
+from datetime import datetime
+import threading
+import time
+
+from memory.db import get_connection
+from memory.versions import bump_data_version
+from utils.calculations import savings_ratio, emi_ratio, emergency_runway
+from utils.sketches import HistogramSketch
+from utils.tracing import traced_methods
+
+# metric -> (low, high, bins, higher_is_better)
+METRICS = {
+    "savings_ratio": (0.0, 1.0, 100, True),
+    "emi_ratio": (0.0, 1.0, 100, False),
+    "emergency_runway": (0.0, 36.0, 144, True)
+}
+
+AGE_BANDS = [(25, "under_25"), (35, "25_34"), (45, "35_44"), (55, "45_54"), (200, "55_plus")]
+INCOME_BANDS = [(25000, "under_25k"), (50000, "25k_50k"), (100000, "50k_1l"),
+                (200000, "1l_2l"), (float("inf"), "2l_plus")]
+
+# Cohorts smaller than this fall back to the all-users sketch
+MIN_COHORT_SIZE = 20
+
+# Completed months of expenses averaged per user when building sketches
+EXPENSE_MONTHS = 3
+
+# How often the in-process copy of the sketches is reloaded
+RELOAD_SECONDS = 300
+
+
+def cohort_key(age, income):
+    age_band = "unknown"
+    if age:
+        age_band = next(label for limit, label in AGE_BANDS if age < limit)
+    income_band = next(label for limit, label in INCOME_BANDS if (income or 0) < limit)
+    return f"{age_band}|{income_band}"
+
+
+@traced_methods
+class PeerBenchmarkAgent:
+    """
+    Percentile of a user's savings rate, EMI burden and emergency runway
+    within their (age band, income band) cohort.
+    """
+
+    _sketches = {}
+    _loaded_at = 0.0
+    _lock = threading.Lock()
+
+    def compare(self, profile: dict, monthly_expenses: float) -> dict:
+        """Percentiles from the precomputed sketches - O(1) per metric"""
+        sketches = self._get_sketches()
+        if not sketches:
+            return {"status": "unavailable", "metrics": {}}
+
+        income = profile.get("income", 0)
+        values = {
+            "savings_ratio": savings_ratio(income, monthly_expenses),
+            "emi_ratio": emi_ratio(income, profile.get("emi", 0)),
+            "emergency_runway": emergency_runway(profile.get("emergency_fund", 0), monthly_expenses)
+        }
+
+        cohort = cohort_key(profile.get("age"), income)
+        metrics = {}
+        for metric, value in values.items():
+            sketch = sketches.get((cohort, metric))
+            used_cohort = cohort
+            if sketch is None or sketch.total < MIN_COHORT_SIZE:
+                sketch = sketches.get(("all", metric))
+                used_cohort = "all"
+            if sketch is None:
+                continue
+
+            percentile = sketch.percentile_of(value)
+            higher_is_better = METRICS[metric][3]
+            metrics[metric] = {
+                "value": round(value, 4) if value != float("inf") else None,
+                "percentile": percentile,
+                "better_than_pct": percentile if higher_is_better else round(100 - percentile, 1),
+                "cohort": used_cohort,
+                "peers": sketch.total
+            }
+
+        return {"status": "ok", "cohort": cohort, "metrics": metrics}
+
+    def rebuild(self) -> dict:
+        """
+        Background job: recompute every cohort sketch from profiles and the
+        monthly category totals, then swap them in atomically.
+        """
+        conn = get_connection()
+        cur = conn.cursor()
+
+        try:
+            current_month = datetime.now().strftime("%Y-%m")
+            cur.execute("""
+                SELECT p.user_id, p.age, p.monthly_income, p.total_emi, p.emergency_fund,
+                       m.avg_expenses
+                FROM user_profile p
+                LEFT JOIN (
+                    SELECT user_id, AVG(month_total) AS avg_expenses
+                    FROM (
+                        SELECT user_id, month, SUM(total) AS month_total,
+                               ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY month DESC) AS recency
+                        FROM category_monthly_totals
+                        WHERE month < ?
+                        GROUP BY user_id, month
+                    )
+                    WHERE recency <= ?
+                    GROUP BY user_id
+                ) m ON m.user_id = p.user_id
+                WHERE p.monthly_income > 0
+            """, (current_month, EXPENSE_MONTHS))
+
+            sketches = {}
+
+            def sketch_for(cohort, metric):
+                key = (cohort, metric)
+                if key not in sketches:
+                    low, high, bins, _ = METRICS[metric]
+                    sketches[key] = HistogramSketch(low, high, bins)
+                return sketches[key]
+
+            users = 0
+            while True:
+                rows = cur.fetchmany(5000)
+                if not rows:
+                    break
+                for row in rows:
+                    income = row["monthly_income"]
+                    expenses = row["avg_expenses"] or 0
+                    values = {
+                        "savings_ratio": savings_ratio(income, expenses),
+                        "emi_ratio": emi_ratio(income, row["total_emi"] or 0),
+                        "emergency_runway": emergency_runway(row["emergency_fund"] or 0, expenses)
+                    }
+                    cohort = cohort_key(row["age"], income)
+                    for metric, value in values.items():
+                        sketch_for(cohort, metric).add(value)
+                        sketch_for("all", metric).add(value)
+                    users += 1
+
+            now = datetime.utcnow().isoformat()
+            cur.execute("DELETE FROM peer_sketches")
+            cur.executemany("""
+                INSERT INTO peer_sketches (cohort, metric, sketch, population, built_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (cohort, metric, sketch.freeze().to_json(), sketch.total, now)
+                for (cohort, metric), sketch in sketches.items()
+            ])
+            # Every user's comparison changed
+            bump_data_version(cur)
+            conn.commit()
+
+            with self._lock:
+                PeerBenchmarkAgent._sketches = sketches
+                PeerBenchmarkAgent._loaded_at = time.monotonic()
+
+            return {"users": users, "sketches": len(sketches)}
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _get_sketches(self):
+        """In-process sketches, reloaded from the table every RELOAD_SECONDS"""
+        with self._lock:
+            if self._loaded_at and time.monotonic() - self._loaded_at < RELOAD_SECONDS:
+                return self._sketches
+
+        conn = get_connection()
+        try:
+            rows = conn.execute("SELECT cohort, metric, sketch FROM peer_sketches").fetchall()
+        except Exception as e:
+            print(f"Error loading peer sketches: {e}")
+            rows = []
+        finally:
+            conn.close()
+
+        sketches = {
+            (row["cohort"], row["metric"]): HistogramSketch.from_json(row["sketch"])
+            for row in rows
+        }
+        with self._lock:
+            PeerBenchmarkAgent._sketches = sketches
+            PeerBenchmarkAgent._loaded_at = time.monotonic()
+        return sketches
@@ -0,0 +1,370 @@
+"""
+Agent Pipeline - Runs the dashboard agents as an explicit dependency graph
+Each node's inputs are hashed and its output memoized per user, so when one
+input changes (e.g. a new expense) only the nodes downstream of it recompute.
+"""
+from collections import OrderedDict
+from datetime import datetime
+import asyncio
+import hashlib
+import json
+import threading
+
+from agents.expense_tracker import ExpenseTrackerAgent
+from agents.risk_analyzer import RiskAnalyzerAgent
+from agents.critic import CriticAgent
+from agents.budget_optimizer import BudgetOptimizerAgent
+from agents.future_planner import FuturePlannerAgent
+from agents.investment_advisor import InvestmentAdvisorAgent
+from agents.monthly_planner import MonthlyPlannerAgent
+from agents.recurring_detector import RecurringExpenseAgent
+from agents.peer_benchmark import PeerBenchmarkAgent
+from auth import get_user_profile
+from llm.local_llm import llm, run_deferred
+from memory.category_stats import get_category_baselines
+from utils.metrics import agent_memo
+from utils.tracing import traced_methods
+
+# Users whose node outputs are kept in memory
+MEMO_USERS = 1000
+
+# dashboard_payload() section -> the graph node it comes from
+PAYLOAD_NODES = {
+    "expenses": "expense_summary", "risk": "risk", "critic": "critic", "budget": "budget",
+    "future": "future", "investment": "investment", "profile": "profile", "monthly_plan": "monthly_plan",
+    "anomalies": "anomalies", "committed": "committed", "peers": "peers"
+}
+
+
+class Node:
+    def __init__(self, name, func, deps=(), source=False, fallback=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.source = source
+        self.fallback = fallback
+
+
+class AgentGraph:
+    """
+    Minimal memoizing DAG runner.
+    Source nodes read fresh data on every run and are never memoized; every
+    other node is skipped when the hash of its dependency outputs matches the
+    hash recorded the last time it ran for that user.
+    """
+
+    def __init__(self):
+        self.nodes = OrderedDict()
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, name, func, deps=(), source=False, fallback=None):
+        for dep in deps:
+            if dep not in self.nodes:
+                raise ValueError(f"Node '{name}' depends on unknown node '{dep}'")
+        self.nodes[name] = Node(name, func, deps, source, fallback)
+
+    def run(self, user_id, context=None, only=None, sources=None):
+        """
+        Evaluate the graph for one user.
+        `only` limits the run to the named nodes and their ancestors;
+        `sources` supplies already-loaded source outputs so they aren't read twice.
+        Returns (outputs, report) where report lists hits, computed nodes and errors.
+        """
+        sources = sources or {}
+        context, context_hash, memo = self._begin(user_id, context)
+        wanted = self._ancestors(only) if only else set(self.nodes)
+
+        outputs = {}
+        hashes = {}
+        report = {"hits": [], "computed": [], "sources": [], "errors": [], "hashes": hashes}
+
+        for name, node in self.nodes.items():
+            if name not in wanted:
+                continue
+            deps = {dep: outputs[dep] for dep in node.deps}
+
+            if node.source:
+                if name in sources:
+                    outputs[name] = sources[name]
+                else:
+                    outputs[name] = self._call(node, context, deps, report)
+                hashes[name] = self._hash(outputs[name])
+                report["sources"].append(name)
+                continue
+
+            input_hash = self._hash([context_hash] + [hashes[dep] for dep in node.deps])
+            cached = memo.get(name)
+            if cached and cached[0] == input_hash:
+                outputs[name] = cached[1]
+                hashes[name] = cached[2]
+                report["hits"].append(name)
+                continue
+
+            failed_before = len(report["errors"])
+            outputs[name] = self._call(node, context, deps, report)
+            hashes[name] = self._hash(outputs[name])
+            report["computed"].append(name)
+            if len(report["errors"]) == failed_before:
+                memo[name] = (input_hash, outputs[name], hashes[name])
+
+        self._count(report)
+        return outputs, report
+
+    async def arun(self, user_id, context=None, only=None, sources=None):
+        """
+        Async run(): nodes of the same depth run concurrently, each node's DB and
+        CPU work on a worker thread and its LLM calls on the event loop.
+        """
+        sources = sources or {}
+        context, context_hash, memo = self._begin(user_id, context)
+        wanted = self._ancestors(only) if only else set(self.nodes)
+
+        outputs = {}
+        hashes = {}
+        report = {"hits": [], "computed": [], "sources": [], "errors": [], "hashes": hashes}
+
+        async def evaluate(node):
+            deps = {dep: outputs[dep] for dep in node.deps}
+            if node.source:
+                if node.name in sources:
+                    return "sources", sources[node.name], None
+                return "sources", await self._acall(node, context, deps, report), None
+
+            input_hash = self._hash([context_hash] + [hashes[dep] for dep in node.deps])
+            cached = memo.get(node.name)
+            if cached and cached[0] == input_hash:
+                return "hits", cached[1], None
+            return "computed", await self._acall(node, context, deps, report), input_hash
+
+        for level in self._levels(wanted):
+            results = await asyncio.gather(*(evaluate(self.nodes[name]) for name in level))
+            for name, (kind, value, input_hash) in zip(level, results):
+                outputs[name] = value
+                hashes[name] = memo[name][2] if kind == "hits" else self._hash(value)
+                report[kind].append(name)
+                if kind == "computed" and name not in report["errors"]:
+                    memo[name] = (input_hash, value, hashes[name])
+
+        self._count(report)
+        return outputs, report
+
+    def _begin(self, user_id, context):
+        context = {"user_id": user_id, **(context or {})}
+        with self._lock:
+            memo = self._memo.setdefault(user_id, {})
+            self._memo.move_to_end(user_id)
+            while len(self._memo) > MEMO_USERS:
+                self._memo.popitem(last=False)
+        return context, self._hash(context), memo
+
+    def invalidate(self, user_id):
+        """Forget every memoized output for a user"""
+        with self._lock:
+            self._memo.pop(user_id, None)
+
+    @staticmethod
+    def _count(report):
+        """Memo hit/compute/error counts per node for /metrics"""
+        for result, names in (("hit", report["hits"]), ("computed", report["computed"]), ("error", report["errors"])):
+            for name in names:
+                agent_memo.inc(name, result)
+
+    def _call(self, node, context, deps, report):
+        try:
+            return node.func(context, **deps)
+        except Exception as e:
+            print(f"Error in pipeline node {node.name}: {e}")
+            report["errors"].append(node.name)
+            return node.fallback() if callable(node.fallback) else node.fallback
+
+    async def _acall(self, node, context, deps, report):
+        try:
+            return await run_deferred(node.func, context, **deps)
+        except Exception as e:
+            print(f"Error in pipeline node {node.name}: {e}")
+            report["errors"].append(node.name)
+            return node.fallback() if callable(node.fallback) else node.fallback
+
+    def _levels(self, wanted):
+        """Wanted nodes grouped by depth; nodes in one group don't depend on each other"""
+        depth = {}
+        levels = []
+        for name, node in self.nodes.items():
+            if name not in wanted:
+                continue
+            depth[name] = max((depth[dep] + 1 for dep in node.deps), default=0)
+            if depth[name] == len(levels):
+                levels.append([])
+            levels[depth[name]].append(name)
+        return levels
+
+    def _ancestors(self, names):
+        wanted = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name not in wanted:
+                wanted.add(name)
+                stack.extend(self.nodes[name].deps)
+        return wanted
+
+    def _hash(self, value):
+        text = json.dumps(value, sort_keys=True, default=str)
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+@traced_methods
+class DashboardPipeline:
+    """
+    The dashboard's agent graph:
+    profile/expenses/forecast (sources) -> state -> risk -> critic -> optimizer,
+    with future planner, investments, monthly plan and peers alongside.
+    """
+
+    def __init__(self):
+        self.expense_agent = ExpenseTrackerAgent()
+        self.risk_agent = RiskAnalyzerAgent()
+        self.critic_agent = CriticAgent()
+        self.optimizer_agent = BudgetOptimizerAgent()
+        self.future_agent = FuturePlannerAgent()
+        self.investment_agent = InvestmentAdvisorAgent()
+        self.monthly_planner = MonthlyPlannerAgent()
+        self.recurring_agent = RecurringExpenseAgent()
+        self.peer_agent = PeerBenchmarkAgent()
+        self.graph = self._build()
+
+    def run(self, user_id, month=None, only=None, sources=None):
+        """(outputs, report); the report leaves out the node hashes, as it ends up in API responses"""
+        outputs, report = self.graph.run(user_id, self._context(month), only=only, sources=sources)
+        report.pop("hashes", None)
+        return outputs, report
+
+    async def arun(self, user_id, month=None, only=None, sources=None):
+        outputs, report = await self.graph.arun(user_id, self._context(month), only=only, sources=sources)
+        report.pop("hashes", None)
+        return outputs, report
+
+    def invalidate(self, user_id):
+        self.graph.invalidate(user_id)
+
+    def dashboard_payload(self, user_id, month=None, profile=None):
+        """
+        Everything dashboard.html renders (besides the username), plus the run report.
+        Returns (None, None) when the user has not set up a profile yet.
+        """
+        if profile is None:
+            profile = get_user_profile(user_id)
+        if not profile:
+            return None, None
+
+        outputs, report = self.graph.run(user_id, self._context(month), sources={"profile": profile})
+        hashes = report.pop("hashes")
+        critic = outputs["critic"]
+        payload = {
+            "expenses": outputs["expense_summary"],
+            "risk": outputs["risk"],
+            "critic": critic,
+            "warnings": critic.get("warnings", []),
+            "budget": outputs["budget"],
+            "future": outputs["future"],
+            "investment": outputs["investment"],
+            "profile": profile,
+            "monthly_plan": outputs["monthly_plan"],
+            "anomalies": outputs["anomalies"],
+            "committed": outputs["committed"],
+            "peers": outputs["peers"]
+        }
+        # Content hash of each section, keying the template's cached fragments
+        payload["versions"] = {
+            key: hashes[node] for key, node in PAYLOAD_NODES.items() if node in hashes
+        }
+        return payload, report
+
+    def _context(self, month):
+        # Rule-based (shed) runs are memoized apart from LLM-backed ones
+        return {
+            "month": month or datetime.now().strftime("%Y-%m"),
+            "rule_based": llm.rule_based_active()
+        }
+
+    def _build(self):
+        g = AgentGraph()
+
+        # Sources - cheap reads, re-run every time and hashed
+        g.add("profile", lambda ctx: get_user_profile(ctx["user_id"]), source=True, fallback=dict)
+        g.add("expense_summary",
+              lambda ctx: self.expense_agent.monthly_summary(ctx["user_id"], ctx["month"]),
+              source=True, fallback=lambda: {"by_category": {}, "total": 0})
+        g.add("committed",
+              lambda ctx: self.recurring_agent.forecast(ctx["user_id"], ctx["month"]),
+              source=True, fallback=lambda: {"committed_spend": 0, "items": []})
+        g.add("baselines",
+              lambda ctx: get_category_baselines(ctx["user_id"], ctx["month"]),
+              source=True, fallback=dict)
+        g.add("portfolio",
+              lambda ctx: self.investment_agent.portfolio_fingerprint(ctx["user_id"]),
+              source=True, fallback=dict)
+        g.add("anomalies",
+              lambda ctx: self.expense_agent.anomaly_detector.recent_anomalies(ctx["user_id"]),
+              source=True, fallback=list)
+
+        # Derived nodes - memoized on the hash of their inputs
+        g.add("state", self._state, deps=("profile", "expense_summary", "committed"))
+        g.add("user_context", self._user_context, deps=("profile",))
+        g.add("risk", lambda ctx, state: self.risk_agent.run(state), deps=("state",),
+              fallback=lambda: {"risk_score": 0, "risk_level": "LOW", "reasons": [], "generated_at": ""})
+        g.add("critic", lambda ctx, state, risk: self.critic_agent.review(state, risk),
+              deps=("state", "risk"), fallback=lambda: {"confidence": 0.0, "warnings": []})
+        g.add("budget",
+              lambda ctx, expense_summary, critic, state, baselines: self.optimizer_agent.suggest(
+                  expense_summary.get("by_category", {}),
+                  critic.get("confidence", 0),
+                  financial_context=state,
+                  baselines=baselines
+              ),
+              deps=("expense_summary", "critic", "state", "baselines"),
+              fallback=lambda: {"status": "skipped", "reason": "Error in optimization", "suggestions": []})
+        g.add("future",
+              lambda ctx, state, user_context: self.future_agent.plan(state, [], user_context=user_context),
+              deps=("state", "user_context"),
+              fallback=lambda: {"status": "blocked", "reason": "Error in planning"})
+        g.add("investment",
+              lambda ctx, state, portfolio, profile: self.investment_agent.analyze_portfolio(ctx["user_id"], state),
+              deps=("state", "portfolio", "profile"),
+              fallback=lambda: {
+                  "current_portfolio_value": 0,
+                  "existing_investments": [],
+                  "llm_advice": "Unable to analyze investments.",
+                  "recommendations": [],
+                  "risk_assessment": "unknown"
+              })
+        g.add("monthly_plan",
+              lambda ctx, profile, expense_summary, committed: self.monthly_planner.create_monthly_plan(
+                  ctx["user_id"], "Create a comprehensive monthly financial plan", month=ctx["month"],
+                  profile=profile, expenses=expense_summary, committed=committed
+              ),
+              deps=("profile", "expense_summary", "committed"))
+        g.add("peers",
+              lambda ctx, profile, state, risk: self.peer_agent.compare(
+                  profile, risk.get("expense_basis", state["total_expenses"])
+              ),
+              deps=("profile", "state", "risk"),
+              fallback=lambda: {"status": "unavailable", "metrics": {}})
+        return g
+
+    def _state(self, ctx, profile, expense_summary, committed):
+        return {
+            "income": profile.get("income", 0),
+            "total_expenses": expense_summary.get("total", 0),
+            "total_emi": profile.get("emi", 0),
+            "emergency_fund": profile.get("emergency_fund", 0),
+            "committed_forecast": committed.get("committed_spend", 0)
+        }
+
+    def _user_context(self, ctx, profile):
+        return {
+            "age": profile.get("age"),
+            "risk_tolerance": profile.get("risk_tolerance"),
+            "investment_experience": profile.get("investment_experience")
+        }
@@ -0,0 +1,260 @@
+"""
+Recurring Expense Agent - Finds recurring charges in a user's expense history
+and forecasts next month's committed spend from them
+Series are kept up to date as expenses are recorded (observe);
+rebuild_recurring_series() is the full scan used to backfill.
+"""
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+import calendar
+import re
+
+from memory.db import get_connection
+from utils.tracing import traced_methods
+
+# Supported cadences: name -> (period in days, tolerance in days)
+PERIODS = {
+    "weekly": (7, 2),
+    "monthly": (30, 3),
+    "quarterly": (91, 7),
+    "yearly": (365, 10)
+}
+
+# Charges needed before a pattern counts as recurring (user-flagged ones need 1)
+MIN_OCCURRENCES = 3
+
+# Share of intervals that must match the cadence
+MIN_REGULARITY = 0.66
+
+# Charges whose amounts are within ~10% of the next larger one are the same charge
+AMOUNT_TOLERANCE = 1.1
+
+
+@traced_methods
+class RecurringExpenseAgent:
+    """
+    Detects recurring expenses by grouping transactions on (category,
+    normalized description - the category when there is none), splitting each
+    group into runs of similar amounts and checking the intervals inside each
+    run. The group's key is stored with each series as match_key.
+    """
+
+    def observe(self, cur, user_id, category, description):
+        """
+        Re-evaluate the one series a new expense can belong to.
+        Runs on the caller's cursor so it commits with the expense itself.
+        """
+        key = self._match_key(category, description)
+        cur.execute("""
+            SELECT id, category, description, amount,
+                   COALESCE(date, month || '-01') AS date, is_recurring
+            FROM expenses
+            WHERE user_id = ? AND category = ? AND amount > 0
+        """, (user_id, category))
+        rows = [row for row in cur.fetchall() if self._match_key(category, row["description"]) == key]
+
+        cur.execute("DELETE FROM recurring_series WHERE user_id = ? AND category = ? AND match_key = ?",
+                    (user_id, category, key))
+
+        series = self._find_series(rows)
+        self._save_series(cur, user_id, series)
+        return series
+
+    def forecast(self, user_id: int, month: str = None) -> dict:
+        """
+        Committed spend for the month after `month` (default: current month)
+        from the stored recurring series (kept current by observe()).
+        """
+        month = month or datetime.now().strftime("%Y-%m")
+        year, mon = (int(part) for part in month.split("-"))
+        start = self._add_months(date(year, mon, 1), 1)
+        end = date(start.year, start.month, calendar.monthrange(start.year, start.month)[1])
+
+        conn = get_connection()
+        cur = conn.cursor()
+
+        try:
+            cur.execute("""
+                SELECT category, description, amount, cadence, period_days, next_date
+                FROM recurring_series WHERE user_id = ?
+            """, (user_id,))
+
+            items = []
+            for row in cur.fetchall():
+                due = datetime.strptime(row["next_date"], "%Y-%m-%d").date()
+                if (date.today() - due).days > 2 * row["period_days"]:
+                    continue  # Lapsed - the charge has stopped appearing
+                charges = 0
+                while due <= end:
+                    if due >= start:
+                        charges += 1
+                    due = self._next_due(due, row["cadence"], row["period_days"])
+                if charges:
+                    items.append({
+                        "category": row["category"],
+                        "description": row["description"],
+                        "cadence": row["cadence"],
+                        "amount": round(row["amount"] * charges, 2)
+                    })
+
+            return {
+                "month": start.strftime("%Y-%m"),
+                "committed_spend": round(sum(item["amount"] for item in items), 2),
+                "items": sorted(items, key=lambda item: item["amount"], reverse=True)
+            }
+        except Exception as e:
+            print(f"Error forecasting recurring expenses: {e}")
+            return {"month": start.strftime("%Y-%m"), "committed_spend": 0, "items": []}
+        finally:
+            conn.close()
+
+    def _match_key(self, category, description) -> str:
+        """
+        Description with digits, punctuation and case dropped ("Rent - Mar 2024"
+        -> "rent mar"); the category, normalized the same way, when that leaves
+        nothing - as a series without a description is named after its category
+        """
+        for text in (description, category):
+            text = " ".join(re.sub(r"[^a-z ]+", " ", (text or "").lower()).split())
+            if text:
+                return text
+        return ""
+
+    def _find_series(self, rows) -> list:
+        """Recurring series among expense rows (id, category, description, amount, date, is_recurring)"""
+        groups = defaultdict(list)
+        for row in rows:
+            try:
+                day = datetime.strptime(row["date"][:10], "%Y-%m-%d").date()
+            except (TypeError, ValueError):
+                continue
+            groups[(row["category"], self._match_key(row["category"], row["description"]))].append(
+                (day, row["amount"], row["id"], row["is_recurring"], row["description"])
+            )
+
+        series = []
+        for (category, key), charges in groups.items():
+            for run in self._amount_runs(charges):
+                found = self._match_series(category, run)
+                if found:
+                    found["match_key"] = key
+                    series.append(found)
+        return series
+
+    def _amount_runs(self, charges: list) -> list:
+        """
+        Split charges into runs of similar amounts: sorted by amount, a new run
+        starts where the next amount is more than AMOUNT_TOLERANCE times the
+        previous one, so a bill jittering around any fixed boundary stays whole
+        """
+        charges = sorted(charges, key=lambda c: c[1])
+        runs = [[charges[0]]] if charges else []
+        for previous, charge in zip(charges, charges[1:]):
+            if charge[1] > previous[1] * AMOUNT_TOLERANCE:
+                runs.append([])
+            runs[-1].append(charge)
+        return runs
+
+    def _save_series(self, cur, user_id, series):
+        """Insert series and flag their expenses as recurring"""
+        now = datetime.utcnow().isoformat()
+        cur.executemany("""
+            INSERT INTO recurring_series (user_id, category, description, match_key, amount, cadence,
+                                          period_days, occurrences, last_date, next_date,
+                                          source, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (user_id, s["category"], s["description"], s["match_key"], s["amount"], s["cadence"],
+             s["period_days"], s["occurrences"], s["last_date"], s["next_date"],
+             s["source"], now)
+            for s in series
+        ])
+        cur.executemany(
+            "UPDATE expenses SET is_recurring = 1 WHERE id = ? AND is_recurring = 0",
+            [(expense_id,) for s in series for expense_id in s.pop("expense_ids")]
+        )
+
+    def _match_series(self, category: str, charges: list) -> dict:
+        """Decide whether one bucket of charges is a recurring series"""
+        charges.sort()
+        user_flagged = any(c[3] for c in charges)
+        if len(charges) < MIN_OCCURRENCES and not user_flagged:
+            return None
+
+        intervals = [(b[0] - a[0]).days for a, b in zip(charges, charges[1:])]
+        intervals = [days for days in intervals if days > 0]
+
+        cadence = None
+        if intervals:
+            ordered = sorted(intervals)
+            typical = ordered[len(ordered) // 2]
+            for name, (period, tolerance) in PERIODS.items():
+                if abs(typical - period) <= tolerance:
+                    regular = sum(1 for days in intervals if abs(days - period) <= tolerance)
+                    if regular / len(intervals) >= MIN_REGULARITY:
+                        cadence = name
+                    break
+
+        if cadence is None:
+            if not user_flagged:
+                return None
+            # Trust the user's flag and assume a monthly bill
+            cadence = "monthly"
+            source = "user"
+        else:
+            source = "detected"
+
+        period_days = PERIODS[cadence][0]
+        last_date = charges[-1][0]
+        recent_amounts = [c[1] for c in charges[-3:]]
+
+        return {
+            "category": category,
+            "description": charges[-1][4] or category,
+            "amount": round(sum(recent_amounts) / len(recent_amounts), 2),
+            "cadence": cadence,
+            "period_days": period_days,
+            "occurrences": len(charges),
+            "last_date": last_date.isoformat(),
+            "next_date": self._next_due(last_date, cadence, period_days).isoformat(),
+            "source": source,
+            "expense_ids": [c[2] for c in charges]
+        }
+
+    def _next_due(self, due: date, cadence: str, period_days: int) -> date:
+        if cadence == "monthly":
+            return self._add_months(due, 1)
+        if cadence == "quarterly":
+            return self._add_months(due, 3)
+        if cadence == "yearly":
+            return self._add_months(due, 12)
+        return due + timedelta(days=period_days)
+
+    def _add_months(self, day: date, months: int) -> date:
+        month_index = day.month - 1 + months
+        year = day.year + month_index // 12
+        month = month_index % 12 + 1
+        return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def rebuild_recurring_series(conn):
+    """
+    Backfill recurring series for every user from existing expense rows - the
+    only full scan; afterwards observe() keeps them current
+    """
+    agent = RecurringExpenseAgent()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT id, user_id, category, description, amount,
+               COALESCE(date, month || '-01') AS date, is_recurring
+        FROM expenses
+        WHERE user_id IS NOT NULL AND amount > 0
+        ORDER BY user_id
+    """)
+    by_user = defaultdict(list)
+    for row in cur.fetchall():
+        by_user[row["user_id"]].append(row)
+
+    cur.execute("DELETE FROM recurring_series")
+    for user_id, rows in by_user.items():
+        agent._save_series(cur, user_id, agent._find_series(rows))
@@ -1,7 +1,9 @@
 from utils.calculations import savings_ratio, emi_ratio, emergency_runway
 from datetime import datetime
+from utils.tracing import traced_methods
 
 
+@traced_methods
 class RiskAnalyzerAgent:
     """
     This agent evaluates financial risk using deterministic rules.
@@ -10,7 +12,12 @@ class RiskAnalyzerAgent:
 
     def run(self, financial_state):
         income = financial_state["income"]
-        total_expenses = financial_state["total_expenses"]
+        # The current month is usually partial; recurring commitments forecast
+        # for next month are a floor on what the user will actually spend
+        total_expenses = max(
+            financial_state["total_expenses"],
+            financial_state.get("committed_forecast", 0)
+        )
         total_emi = financial_state["total_emi"]
         emergency_fund = financial_state["emergency_fund"]
 
@@ -47,5 +54,6 @@ class RiskAnalyzerAgent:
             "risk_score": min(risk_score, 100),
             "risk_level": level,
             "reasons": reasons,
+            "expense_basis": total_expenses,
             "generated_at": datetime.utcnow().isoformat()
         }
@@ -2,23 +2,36 @@
 Financial Advisor AI - Main Application
 Professional financial planning system with LLM-powered advice
 """
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for, flash
+from flask import Flask, request, jsonify, render_template, session, redirect, url_for, flash, make_response, g, Response, send_file
 from datetime import datetime
 import os
-
-from agents.expense_tracker import ExpenseTrackerAgent
-from agents.risk_analyzer import RiskAnalyzerAgent
-from agents.critic import CriticAgent
-from agents.budget_optimizer import BudgetOptimizerAgent
-from agents.future_planner import FuturePlannerAgent
-from agents.investment_advisor import InvestmentAdvisorAgent
-from agents.monthly_planner import MonthlyPlannerAgent
-from agents.market_advisor import MarketAdvisorAgent
-from auth import register_user, authenticate_user, get_user_profile, update_user_profile, login_required
-from memory.db import get_connection
+import time
+
+from auth import (
+    register_user, authenticate_user, get_user_profile, update_user_profile, login_required, admin_required, is_admin
+)
+from memory.db import get_connection, begin_request, end_request
+from memory.expense_series import expense_series
+from memory.snapshots import load_snapshot
+from llm.local_llm import llm
+from utils.admission import llm_gate, Rejected
+from utils.events import events, format_sse, STREAM_PREAMBLE, HEARTBEAT
+from utils.rate_limit import Throttled
+from utils.responses import FastJSONProvider, api_response, compress_response
+from utils.fragments import FragmentCacheExtension, bytecode_cache
+from utils.http_cache import http_cached
+from utils.lazy import Lazy
+from utils import metrics, profiling, tracing
 
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production-2024")
+# {% cache %} fragments and on-disk compiled templates (set before the Jinja environment is created)
+app.jinja_options = {
+    **app.jinja_options,
+    "extensions": [*app.jinja_options.get("extensions", ()), FragmentCacheExtension],
+    "bytecode_cache": bytecode_cache()
+}
+app.json = FastJSONProvider(app)
 
 # Custom Jinja2 filter for number formatting
 @app.template_filter('currency')
@@ -41,15 +54,269 @@ def percent_filter(value):
     except (ValueError, TypeError):
         return "0.0"
 
-# Initialize agents
-expense_agent = ExpenseTrackerAgent()
-risk_agent = RiskAnalyzerAgent()
-critic_agent = CriticAgent()
-optimizer_agent = BudgetOptimizerAgent()
-future_agent = FuturePlannerAgent()
-investment_agent = InvestmentAdvisorAgent()
-monthly_planner = MonthlyPlannerAgent()  # Self-sufficient monthly planner
-market_advisor = MarketAdvisorAgent()  # Market-aware SIP recommendations
+# Run warm_up() in create_app() (and at async server startup) before taking traffic
+WARM_UP = os.getenv("WARM_UP", "0") == "1"
+
+
+def _dashboard_pipeline():
+    from agents.pipeline import DashboardPipeline
+    return DashboardPipeline()
+
+
+def _market_advisor():
+    from agents.market_advisor import MarketAdvisorAgent
+    return MarketAdvisorAgent()
+
+
+# Agents are built on first use (or by warm_up), so importing the app stays cheap
+# The dashboard agents run as a memoized graph; its agent instances serve the other routes too
+dashboard_pipeline = Lazy(_dashboard_pipeline)
+expense_agent = Lazy(lambda: dashboard_pipeline.expense_agent, "expense_agent")
+investment_agent = Lazy(lambda: dashboard_pipeline.investment_agent, "investment_agent")
+monthly_planner = Lazy(lambda: dashboard_pipeline.monthly_planner, "monthly_planner")  # Self-sufficient monthly planner
+peer_agent = Lazy(lambda: dashboard_pipeline.peer_agent, "peer_agent")
+market_advisor = Lazy(_market_advisor)  # Market-aware SIP recommendations
+
+
+def _warm_database():
+    conn = get_connection()
+    conn.execute("SELECT 1 FROM user_profile LIMIT 1").fetchall()
+    conn.close()
+
+
+def warm_up():
+    """
+    Do the one-off work of a worker's first requests now: build the agents,
+    load the LLM client, open the database, compile the templates and load
+    the market data. Returns seconds per step.
+    """
+    steps = [
+        ("agents", lambda: [agent.resolve() for agent in (dashboard_pipeline, expense_agent, investment_agent,
+                                                           monthly_planner, peer_agent, market_advisor)]),
+        ("llm", llm.warm_up),
+        ("database", _warm_database),
+        ("templates", lambda: [app.jinja_env.get_template(name) for name in app.jinja_env.list_templates()
+                               if name.endswith(".html")]),
+        ("market", lambda: market_advisor.get_market_condition()),
+        ("strptime", lambda: datetime.strptime("2024-01-01", "%Y-%m-%d")),
+    ]
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"Warm-up step {name} failed: {e}")
+        timings[name] = time.perf_counter() - started
+    print(f"Warm-up done in {sum(timings.values()):.2f}s: "
+          + ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in timings.items()))
+    return timings
+
+
+def create_app(warm=None):
+    """
+    Application factory for WSGI servers (`gunicorn 'app:create_app()'`,
+    `flask --app app:create_app run`): the configured app, warmed up first when
+    warm (default: WARM_UP) is set
+    """
+    if warm is None:
+        warm = WARM_UP
+    if warm:
+        warm_up()
+    return app
+
+
+@app.errorhandler(Rejected)
+def llm_rejected(e):
+    """Admission control turned the request away - tell the client when to retry"""
+    response = jsonify({"error": "Too many requests, please retry shortly", "reason": e.reason})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+# Registered first, so it runs after every other after_request hook
+app.after_request(compress_response)
+
+
+@app.after_request
+def mark_degraded(response):
+    """Flag responses built from rule-based advice because the LLM was shed"""
+    if g.get("degraded"):
+        response.headers["X-Degraded"] = "1"
+    return response
+
+
+def route_name():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+@app.before_request
+def start_profile():
+    """Profile this request when an admin asks (?profile= / X-Profile) or sampling picks it"""
+    flag = request.args.get("profile") or request.headers.get("X-Profile")
+    if profiling.CHOICE_ENVIRON in request.environ:
+        choice = request.environ[profiling.CHOICE_ENVIRON]  # already made by asgi.py
+    else:
+        choice = profiling.choose(request.path, flag, is_admin)
+    if choice:
+        g.profile = profiling.RequestProfile(*choice).start()
+        # Hotspot headers name internal code - only for the admin who asked
+        g.profile_annotate = bool(flag) and is_admin()
+
+
+def save_profile(profile, status):
+    try:
+        return profile.stop(route=route_name(), method=request.method, path=request.path, status=status,
+                            user_id=session.get("user_id"))
+    except Exception as e:
+        print(f"Error saving profile: {e}")
+        return None
+
+
+@app.after_request
+def finish_profile(response):
+    """Save the request's profile; an admin's flagged request gets its id and top hotspots"""
+    profile = g.pop("profile", None)
+    if profile is not None:
+        summary = save_profile(profile, response.status_code)
+        if summary is not None and g.pop("profile_annotate", False):
+            response.headers["X-Profile-Id"] = summary["id"]
+            response.headers["X-Profile-Hotspots"] = profiling.header_hotspots(summary)
+    return response
+
+
+@app.before_request
+def start_metrics():
+    g.metrics = metrics.request_started()
+    g.db_queries = begin_request(route_name())
+
+
+@app.after_request
+def record_metrics(response):
+    """Latency and DB statement counts per route (see /metrics)"""
+    started = g.pop("metrics", None)
+    if started is not None:
+        metrics.request_finished(started, route_name(), request.method, response.status_code)
+    end_request(g.pop("db_queries", None))
+    return response
+
+
+@app.before_request
+def open_trace():
+    """Trace the request when TRACING=1 - agents, queries and LLM calls add spans to it"""
+    g.trace = tracing.start(request.endpoint or request.path, method=request.method, path=request.path)
+
+
+@app.after_request
+def close_trace(response):
+    trace = g.pop("trace", None)
+    if trace is not None:
+        response.headers["Server-Timing"] = tracing.finish(trace, status=response.status_code)
+    return response
+
+
+@app.teardown_request
+def drop_trace(exc):
+    """A request that failed before after_request still closes its trace"""
+    trace = g.pop("trace", None)
+    if trace is not None:
+        tracing.finish(trace, status=500, error=type(exc).__name__ if exc else None)
+    started = g.pop("metrics", None)
+    if started is not None:
+        metrics.request_finished(started, route_name(), request.method, 500)
+    end_request(g.pop("db_queries", None))
+    profile = g.pop("profile", None)
+    if profile is not None:
+        save_profile(profile, 500)
+
+
+def pipeline_report_header(report):
+    """Compact summary of which pipeline nodes were cache hits"""
+    return f"hits={','.join(report['hits'])}; computed={','.join(report['computed'])}"
+
+
+def publish_update(user_id, change, category=None, month=None):
+    """
+    After a write commits, push a dashboard delta to the user's open event streams:
+    the new risk score and totals (rule-based, no LLM) and a stale-advice flag.
+    """
+    if not events.has_subscribers(user_id):
+        return
+    current_month = datetime.now().strftime("%Y-%m")
+    delta = {"change": change, "advice_stale": True}
+    
+    try:
+        outputs, _ = dashboard_pipeline.run(user_id, current_month, only=["risk"])
+        risk = outputs["risk"]
+        delta["risk"] = {
+            "risk_score": risk.get("risk_score"),
+            "risk_level": risk.get("risk_level"),
+            "reasons": risk.get("reasons", [])
+        }
+        delta["income"] = outputs["state"]["income"]
+        delta["expenses_total"] = outputs["state"]["total_expenses"]
+        if category and month == current_month:
+            delta["category"] = {
+                "name": category,
+                "month": month,
+                "total": outputs["expense_summary"]["by_category"].get(category, 0)
+            }
+    except Exception as e:
+        print(f"Error building live update: {e}")
+    
+    events.publish(user_id, "update", delta)
+
+
+def prompt_state(user_id):
+    """Financial state used as LLM context for free-form prompts"""
+    profile = get_user_profile(user_id)
+    current_month = datetime.now().strftime("%Y-%m")
+    summary = expense_agent.monthly_summary(user_id, current_month)
+    
+    return {
+        "income": profile.get("income", 0),
+        "total_expenses": summary.get("total", 0),
+        "total_emi": profile.get("emi", 0),
+        "emergency_fund": profile.get("emergency_fund", 0),
+        "age": profile.get("age"),
+        "risk_tolerance": profile.get("risk_tolerance"),
+        "financial_goals": profile.get("financial_goals", "")
+    }
+
+
+def classify_question(prompt):
+    """Determine question type from prompt"""
+    prompt_lower = prompt.lower()
+    if any(word in prompt_lower for word in ["invest", "investment", "portfolio", "mutual fund", "sip"]):
+        return "investment"
+    elif any(word in prompt_lower for word in ["save", "savings", "emergency", "fund"]):
+        return "savings"
+    elif any(word in prompt_lower for word in ["debt", "emi", "loan", "pay"]):
+        return "debt"
+    elif any(word in prompt_lower for word in ["plan", "monthly", "budget", "allocate"]):
+        return "planning"
+    return "general"
+
+
+def sip_inputs(user_id, current_month):
+    """(financial state, user context) for the SIP planner"""
+    profile = get_user_profile(user_id)
+    summary = expense_agent.monthly_summary(user_id, current_month)
+    
+    state = {
+        "income": profile.get("income", 0),
+        "total_expenses": summary.get("total", 0),
+        "total_emi": profile.get("emi", 0),
+        "emergency_fund": profile.get("emergency_fund", 0)
+    }
+    
+    user_context = {
+        "age": profile.get("age"),
+        "risk_tolerance": profile.get("risk_tolerance"),
+        "investment_experience": profile.get("investment_experience")
+    }
+    return state, user_context
 
 
 # ==================== AUTHENTICATION ROUTES ====================
@@ -62,6 +329,15 @@ def index():
     return redirect(url_for('login'))
 
 
+def throttled_page(template, e):
+    """Re-render an auth form with a 429 when attempts are throttled"""
+    response = make_response(render_template(
+        template, error=f"Too many attempts. Please try again in {e.retry_after} seconds."
+    ), 429)
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     """User login"""
@@ -69,7 +345,10 @@ def login():
         username = request.form.get("username", "").strip()
         password = request.form.get("password", "")
         
-        success, user_id, message = authenticate_user(username, password)
+        try:
+            success, user_id, message = authenticate_user(username, password, request.remote_addr)
+        except Throttled as e:
+            return throttled_page("login.html", e)
         
         if success:
             session['user_id'] = user_id
@@ -93,7 +372,10 @@ def register():
         if len(password) < 6:
             return render_template("register.html", error="Password must be at least 6 characters")
         
-        success, message = register_user(username, email, password, full_name)
+        try:
+            success, message = register_user(username, email, password, full_name, request.remote_addr)
+        except Throttled as e:
+            return throttled_page("register.html", e)
         
         if success:
             return render_template("login.html", success=message)
@@ -115,97 +397,33 @@ def logout():
 
 @app.route("/dashboard")
 @login_required
+@http_cached("dashboard")
 def dashboard():
     """Main financial dashboard"""
     user_id = session['user_id']
     current_month = datetime.now().strftime("%Y-%m")
     
-    # Get user profile
-    profile = get_user_profile(user_id)
-    if not profile:
-        return redirect(url_for('setup_profile'))
-    
-    # Get expense summary
-    summary = {"by_category": {}, "total": 0}
-    try:
-        summary_result = expense_agent.monthly_summary(user_id, current_month)
-        if summary_result and isinstance(summary_result, dict):
-            summary = summary_result
-    except Exception:
-        pass
-    
-    # Build financial state
-    state = {
-        "income": profile.get("income", 0),
-        "total_expenses": summary.get("total", 0),
-        "total_emi": profile.get("emi", 0),
-        "emergency_fund": profile.get("emergency_fund", 0)
-    }
-    
-    # Run all agents
-    try:
-        risk = risk_agent.run(state)
-    except Exception:
-        risk = {"risk_score": 0, "risk_level": "LOW", "reasons": [], "generated_at": ""}
-    
-    try:
-        critic = critic_agent.review(state, risk)
-    except Exception:
-        critic = {"confidence": 0.0, "warnings": []}
-    
-    try:
-        optimizer = optimizer_agent.suggest(
-            summary.get("by_category", {}),
-            critic.get("confidence", 0),
-            financial_context=state
-        )
-    except Exception:
-        optimizer = {"status": "skipped", "reason": "Error in optimization", "suggestions": []}
-    
-    # Get user context for LLM
-    user_context = {
-        "age": profile.get("age"),
-        "risk_tolerance": profile.get("risk_tolerance"),
-        "investment_experience": profile.get("investment_experience")
-    }
-    
-    try:
-        future = future_agent.plan(state, [], user_context=user_context)
-    except Exception:
-        future = {"status": "blocked", "reason": "Error in planning"}
-    
-    # Get investment analysis
-    try:
-        investment_analysis = investment_agent.analyze_portfolio(user_id, state)
-    except Exception:
-        investment_analysis = {
-            "current_portfolio_value": 0,
-            "existing_investments": [],
-            "llm_advice": "Unable to analyze investments.",
-            "recommendations": [],
-            "risk_assessment": "unknown"
-        }
-    
-    # Generate monthly plan automatically (self-sufficient agent)
-    monthly_plan = None
-    try:
-        monthly_plan = monthly_planner.create_monthly_plan(user_id, "Create a comprehensive monthly financial plan")
-    except Exception as e:
-        print(f"Error generating monthly plan: {e}")
-    
-    return render_template(
+    # Serve the nightly precomputed snapshot when it is still fresh
+    payload = load_snapshot(user_id, current_month, g.data_version)
+    if payload is not None:
+        cache_status = "snapshot"
+    else:
+        # Run the agent graph; only nodes whose inputs changed since the last view recompute
+        with llm_gate.slot(user_id, degrade_only=True) as admitted:
+            g.degraded = not admitted
+            payload, report = dashboard_pipeline.dashboard_payload(user_id, current_month)
+        if payload is None:
+            return redirect(url_for('setup_profile'))
+        cache_status = pipeline_report_header(report)
+    
+    payload.setdefault("versions", {})  # snapshots built before fragment caching render uncached
+    response = make_response(render_template(
         "dashboard.html",
         user=session.get('username', 'User'),
-        expenses=summary,
-        risk=risk,
-        critic=critic,
-        warnings=critic.get("warnings", []),
-        budget=optimizer,
-        future=future,
-        investment=investment_analysis,
-        profile=profile,
-        monthly_plan=monthly_plan
-    )
+        **payload
+    ))
+    response.headers["X-Agent-Cache"] = cache_status
+    return response
 
 
 @app.route("/setup-profile", methods=["GET", "POST"])
@@ -229,6 +447,7 @@ def setup_profile():
         }
         
         if update_user_profile(user_id, **update_data):
+            publish_update(user_id, "profile")
             return redirect(url_for('dashboard'))
         else:
             return render_template("setup_profile.html", error="Failed to save profile")
@@ -254,11 +473,13 @@ def add_expense():
     data = request.json
     
     try:
-        expense_agent.add_expense(
+        category = data.get("category", "Other")
+        month = data.get("month", datetime.now().strftime("%Y-%m"))
+        anomalies = expense_agent.add_expense(
             user_id,
-            data.get("category", "Other"),
+            category,
             float(data.get("amount", 0)),
-            data.get("month", datetime.now().strftime("%Y-%m")),
+            month,
             data.get("description", ""),
             data.get("subcategory"),
             data.get("date"),
@@ -266,7 +487,8 @@ def add_expense():
             data.get("is_recurring", False),
             data.get("tags")
         )
-        return jsonify({"status": "success", "message": "Expense added"})
+        publish_update(user_id, "expense", category, month)
+        return jsonify({"status": "success", "message": "Expense added", "anomalies": anomalies})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 400
 
@@ -297,6 +519,7 @@ def update_profile():
         update_data["financial_goals"] = data["financial_goals"]
     
     if update_user_profile(user_id, **update_data):
+        publish_update(user_id, "profile")
         return jsonify({"status": "success", "message": "Profile updated"})
     else:
         return jsonify({"status": "error", "message": "Update failed"}), 400
@@ -316,8 +539,10 @@ def add_investment():
             float(data.get("amount", 0)),
             float(data.get("expected_return", 0)),
             data.get("risk_level", "moderate"),
-            data.get("notes", "")
+            data.get("notes", ""),
+            data.get("nav_series")
         )
+        publish_update(user_id, "investment")
         return jsonify({"status": "success", "message": "Investment added"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 400
@@ -325,33 +550,27 @@ def add_investment():
 
 @app.route("/api/analysis/full", methods=["GET"])
 @login_required
+@http_cached("analysis")
 def full_analysis():
     """Get comprehensive financial analysis"""
     user_id = session['user_id']
     current_month = datetime.now().strftime("%Y-%m")
     
-    profile = get_user_profile(user_id)
-    summary = expense_agent.monthly_summary(user_id, current_month)
-    
-    state = {
-        "income": profile.get("income", 0),
-        "total_expenses": summary.get("total", 0),
-        "total_emi": profile.get("emi", 0),
-        "emergency_fund": profile.get("emergency_fund", 0)
-    }
-    
-    risk = risk_agent.run(state)
-    critic = critic_agent.review(state, risk)
-    optimizer = optimizer_agent.suggest(summary.get("by_category", {}), critic.get("confidence", 0), state)
-    future = future_agent.plan(state, [], user_context=profile)
-    investment = investment_agent.analyze_portfolio(user_id, state)
+    with llm_gate.slot(user_id) as admitted:
+        g.degraded = not admitted
+        outputs, report = dashboard_pipeline.run(
+            user_id, current_month,
+            only=["risk", "critic", "budget", "future", "investment", "committed"]
+        )
     
-    return jsonify({
-        "risk": risk,
-        "critic": critic,
-        "budget": optimizer,
-        "future": future,
-        "investment": investment
+    return api_response({
+        "risk": outputs["risk"],
+        "critic": outputs["critic"],
+        "budget": outputs["budget"],
+        "future": outputs["future"],
+        "investment": outputs["investment"],
+        "committed_forecast": outputs["committed"],
+        "pipeline": report
     })
 
 
@@ -364,9 +583,11 @@ def create_monthly_plan():
     user_prompt = data.get("prompt", "")
     
     # Monthly planner is self-sufficient - it handles everything
-    plan = monthly_planner.create_monthly_plan(user_id, user_prompt)
+    with llm_gate.slot(user_id) as admitted:
+        g.degraded = not admitted
+        plan = monthly_planner.create_monthly_plan(user_id, user_prompt)
     
-    return jsonify(plan)
+    return api_response(plan)
 
 
 @app.route("/api/prompt/ask", methods=["POST"])
@@ -380,42 +601,19 @@ def ask_prompt():
     if not prompt:
         return jsonify({"error": "Please provide a prompt"}), 400
     
-    # Get user profile for context
-    profile = get_user_profile(user_id)
-    current_month = datetime.now().strftime("%Y-%m")
-    summary = expense_agent.monthly_summary(user_id, current_month)
-    
-    state = {
-        "income": profile.get("income", 0),
-        "total_expenses": summary.get("total", 0),
-        "total_emi": profile.get("emi", 0),
-        "emergency_fund": profile.get("emergency_fund", 0),
-        "age": profile.get("age"),
-        "risk_tolerance": profile.get("risk_tolerance"),
-        "financial_goals": profile.get("financial_goals", "")
-    }
-    
-    # Determine question type from prompt
+    state = prompt_state(user_id)
     prompt_lower = prompt.lower()
-    if any(word in prompt_lower for word in ["invest", "investment", "portfolio", "mutual fund", "sip"]):
-        question_type = "investment"
-    elif any(word in prompt_lower for word in ["save", "savings", "emergency", "fund"]):
-        question_type = "savings"
-    elif any(word in prompt_lower for word in ["debt", "emi", "loan", "pay"]):
-        question_type = "debt"
-    elif any(word in prompt_lower for word in ["plan", "monthly", "budget", "allocate"]):
-        question_type = "planning"
-    else:
-        question_type = "general"
+    question_type = classify_question(prompt)
     
     # Get AI advice
-    from llm.local_llm import llm
-    advice = llm.get_financial_advice(state, question_type)
-    
-    # Also create monthly plan if it's a planning question
-    monthly_plan = None
-    if "plan" in prompt_lower or "monthly" in prompt_lower:
-        monthly_plan = monthly_planner.create_monthly_plan(user_id, prompt)
+    with llm_gate.slot(user_id) as admitted:
+        g.degraded = not admitted
+        advice = llm.get_financial_advice(state, question_type)
+        
+        # Also create monthly plan if it's a planning question
+        monthly_plan = None
+        if "plan" in prompt_lower or "monthly" in prompt_lower:
+            monthly_plan = monthly_planner.create_monthly_plan(user_id, prompt)
     
     return jsonify({
         "prompt": prompt,
@@ -427,30 +625,172 @@ def ask_prompt():
 
 @app.route("/api/investment/sip-plan", methods=["GET"])
 @login_required
+@http_cached("sip_plan")
 def get_sip_plan():
     """Get market-aware SIP investment plan"""
     user_id = session['user_id']
     current_month = datetime.now().strftime("%Y-%m")
     
-    profile = get_user_profile(user_id)
-    summary = expense_agent.monthly_summary(user_id, current_month)
+    state, user_context = sip_inputs(user_id, current_month)
     
-    state = {
-        "income": profile.get("income", 0),
-        "total_expenses": summary.get("total", 0),
-        "total_emi": profile.get("emi", 0),
-        "emergency_fund": profile.get("emergency_fund", 0)
-    }
+    with llm_gate.slot(user_id) as admitted:
+        g.degraded = not admitted
+        sip_plan = market_advisor.suggest_sip_plan(user_id, state, user_context)
     
-    user_context = {
-        "age": profile.get("age"),
-        "risk_tolerance": profile.get("risk_tolerance"),
-        "investment_experience": profile.get("investment_experience")
-    }
+    return api_response(sip_plan)
+
+
+@app.route("/api/benchmarks/peers", methods=["GET"])
+@login_required
+def peer_benchmarks():
+    """Compare the user's savings rate, EMI burden and runway with similar users"""
+    user_id = session['user_id']
+    current_month = datetime.now().strftime("%Y-%m")
     
-    sip_plan = market_advisor.suggest_sip_plan(user_id, state, user_context)
+    # The dashboard's peers node, so both show the same percentiles
+    outputs, _ = dashboard_pipeline.run(user_id, current_month, only=["peers"])
+    return jsonify(outputs["peers"])
+
+
+@app.route("/api/charts/expenses", methods=["GET"])
+@login_required
+@http_cached("expense_chart")
+def expense_chart():
+    """Bucketed per-category spend (?granularity=day|week|month&start=&end=&top=&categories=)"""
+    user_id = session['user_id']
+    categories = request.args.get("categories")
+    
+    try:
+        series = expense_series(
+            user_id,
+            request.args.get("granularity", "month"),
+            request.args.get("start"),
+            request.args.get("end"),
+            request.args.get("top", 5),
+            categories.split(",") if categories else None
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    return jsonify(sip_plan)
+    return jsonify(series)
+
+
+@app.route("/api/investment/backtest", methods=["GET"])
+@login_required
+def backtest_sip_plan():
+    """Backtest the market-aware SIP allocations over local NAV history"""
+    user_id = session['user_id']
+    current_month = datetime.now().strftime("%Y-%m")
+    
+    profile = get_user_profile(user_id)
+    
+    try:
+        years = min(max(int(request.args.get("years", 10)), 1), 30)
+        amount = request.args.get("amount")
+        if amount is not None:
+            amount = float(amount)
+    except ValueError:
+        return jsonify({"error": "Invalid years or amount"}), 400
+    
+    if amount is None:
+        summary = expense_agent.monthly_summary(user_id, current_month)
+        amount = market_advisor.investable_amount({
+            "income": profile.get("income", 0),
+            "total_expenses": summary.get("total", 0),
+            "emergency_fund": profile.get("emergency_fund", 0)
+        })
+    if amount <= 0:
+        return jsonify({"error": "No investable amount - provide ?amount="}), 400
+    
+    strategies = request.args.get("strategies")
+    result = market_advisor.backtest_sip_plan(
+        round(amount, 0),
+        profile.get("risk_tolerance") or "moderate",
+        profile.get("age") or 30,
+        profile.get("investment_experience") or "beginner",
+        years=years,
+        strategies=strategies.split(",") if strategies else None
+    )
+    
+    return jsonify(result)
+
+
+@app.route("/api/events", methods=["GET"])
+@login_required
+def event_stream():
+    """
+    Server-Sent Events stream of dashboard deltas for the logged-in user.
+    Holds a worker thread per open stream; under asgi.py the stream is served
+    on the event loop instead and idle connections are nearly free.
+    """
+    subscription = events.subscribe(session['user_id'])
+    
+    def stream():
+        try:
+            yield STREAM_PREAMBLE
+            while not subscription.closed:
+                batch = subscription.get()
+                yield b"".join(format_sse(message) for message in batch) or HEARTBEAT
+        finally:
+            events.unsubscribe(subscription)
+    
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/api/metrics/admission", methods=["GET"])
+@login_required
+def admission_metrics():
+    """LLM admission control: slots in use, queue depth, shed and rejected counts"""
+    return jsonify(llm_gate.metrics())
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus scrape endpoint (bearer METRICS_TOKEN, or loopback clients when unset)"""
+    if not metrics.scrape_allowed(request.headers.get("Authorization"), request.remote_addr):
+        if metrics.METRICS_TOKEN:
+            return jsonify({"error": "Unauthorized"}), 401
+        return jsonify({"error": "Forbidden - set METRICS_TOKEN to scrape /metrics remotely"}), 403
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/admin/profiles", methods=["GET"])
+@admin_required
+def profiles():
+    """Stored request profiles (optionally ?route=) with the latest hotspots per route"""
+    return jsonify(profiling.list_profiles(request.args.get("route")))
+
+
+@app.route("/admin/profiles/settings", methods=["POST"])
+@admin_required
+def profile_settings():
+    """Change profile sampling at runtime: {"sample_rate": 0.05, "mode": "sample", "memory": false}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        return jsonify(profiling.settings.update(data.get("sample_rate"), data.get("mode"), data.get("memory")))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/admin/profiles/<profile_id>", methods=["GET"])
+@admin_required
+def profile_summary(profile_id):
+    """One profile's hotspots, allocations and request details"""
+    summary = profiling.load_profile(profile_id)
+    if summary is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return jsonify(summary)
+
+
+@app.route("/admin/profiles/<profile_id>/download", methods=["GET"])
+@admin_required
+def profile_download(profile_id):
+    """The raw profile: .prof (pstats, snakeviz) or .folded (flamegraph.pl, speedscope)"""
+    path = profiling.artifact_path(profile_id)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,363 @@
+"""
+ASGI entry point - async serving mode
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+The LLM-bound API endpoints are served on the event loop: their SQLite work runs
+on the bounded DB thread pool (ASYNC_DB_THREADS) and their LLM calls are awaited
+over aiohttp, so a request waiting on the LLM holds no thread and one process can
+keep hundreds of them in flight. They share the LLM admission gate
+(utils/admission.py) with the Flask views. /api/events streams dashboard
+deltas (utils/events.py) the same way: an idle stream holds no thread. Every
+other path goes to the Flask app in
+app.py on its own thread pool (ASYNC_WSGI_THREADS).
+Needs the async extras: uvicorn, aiohttp, asgiref.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+import asyncio
+import io
+import json
+import os
+
+from asgiref.wsgi import WsgiToAsgiInstance
+
+from app import (
+    app as flask_app, dashboard_pipeline, market_advisor, monthly_planner,
+    prompt_state, classify_question, sip_inputs, warm_up, WARM_UP
+)
+from auth import ADMIN_USERS
+from llm.local_llm import llm
+from memory.db import run_in_db_thread, begin_request, end_request
+from memory.versions import get_data_version
+from utils.admission import llm_gate, Rejected
+from utils.events import events, format_sse, STREAM_PREAMBLE, HEARTBEAT
+from utils.http_cache import cache_key, cache_get, cache_put
+from utils.responses import apply_fields, dumps, encode_body, weak_etag
+from utils import metrics, profiling, tracing
+
+# Threads running Flask views for paths not served natively
+ASYNC_WSGI_THREADS = int(os.getenv("ASYNC_WSGI_THREADS", "16"))
+_wsgi_executor = ThreadPoolExecutor(ASYNC_WSGI_THREADS, thread_name_prefix="wsgi")
+metrics.registry.callback("finance_wsgi_pool_queue", "Flask requests waiting for a WSGI thread (async mode)",
+                          lambda: _wsgi_executor._work_queue.qsize())
+_session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+
+
+class Request:
+    """The parts of an ASGI HTTP request the async endpoints need"""
+
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.body = body
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        self.query_string = scope.get("query_string", b"").decode("utf-8")
+        self.args = {k: v[0] for k, v in parse_qs(self.query_string).items()}
+
+    def json(self):
+        """The body as a JSON object; ValueError when it is malformed or not an object"""
+        data = json.loads(self.body or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError("JSON body must be an object")
+        return data
+
+    def user_id(self):
+        """user_id from the Flask session cookie, or None when not logged in"""
+        cookie = SimpleCookie(self.headers.get("cookie", ""))
+        morsel = cookie.get(flask_app.config["SESSION_COOKIE_NAME"])
+        if not morsel or _session_serializer is None:
+            return None
+        try:
+            data = _session_serializer.loads(
+                morsel.value, max_age=int(flask_app.permanent_session_lifetime.total_seconds())
+            )
+        except Exception:
+            return None
+        return data.get("user_id")
+
+
+def json_response(payload, status=200, headers=None, request=None):
+    """Handler result; with request, ?fields= selects the sections returned"""
+    if request is not None:
+        payload = apply_fields(payload, request.args.get("fields"))
+    return status, dumps(payload), "application/json", headers or []
+
+
+async def ask_prompt(request, user_id):
+    """Async /api/prompt/ask"""
+    try:
+        prompt = str(request.json().get("prompt") or "").strip()
+    except ValueError:
+        return json_response({"error": "Invalid JSON"}, 400)
+    if not prompt:
+        return json_response({"error": "Please provide a prompt"}, 400)
+
+    state = await run_in_db_thread(prompt_state, user_id)
+    question_type = classify_question(prompt)
+
+    advice = await llm.aget_financial_advice(state, question_type)
+
+    monthly_plan = None
+    prompt_lower = prompt.lower()
+    if "plan" in prompt_lower or "monthly" in prompt_lower:
+        monthly_plan = await monthly_planner.acreate_monthly_plan(user_id, prompt)
+
+    return json_response({
+        "prompt": prompt,
+        "advice": advice,
+        "question_type": question_type,
+        "monthly_plan": monthly_plan
+    })
+
+
+async def create_monthly_plan(request, user_id):
+    """Async /api/plan/monthly"""
+    try:
+        prompt = request.json().get("prompt", "")
+    except ValueError:
+        return json_response({"error": "Invalid JSON"}, 400)
+    plan = await monthly_planner.acreate_monthly_plan(user_id, prompt)
+    return json_response(plan, request=request)
+
+
+async def full_analysis(request, user_id):
+    """Async /api/analysis/full"""
+    current_month = datetime.now().strftime("%Y-%m")
+    outputs, report = await dashboard_pipeline.arun(
+        user_id, current_month,
+        only=["risk", "critic", "budget", "future", "investment", "committed"]
+    )
+    return json_response({
+        "risk": outputs["risk"],
+        "critic": outputs["critic"],
+        "budget": outputs["budget"],
+        "future": outputs["future"],
+        "investment": outputs["investment"],
+        "committed_forecast": outputs["committed"],
+        "pipeline": report
+    }, request=request)
+
+
+async def sip_plan(request, user_id):
+    """Async /api/investment/sip-plan"""
+    current_month = datetime.now().strftime("%Y-%m")
+    state, user_context = await run_in_db_thread(sip_inputs, user_id, current_month)
+    return json_response(await market_advisor.asuggest_sip_plan(user_id, state, user_context), request=request)
+
+
+# (method, path) -> (handler, cache endpoint name or None); mirrors the Flask routes
+ROUTES = {
+    ("POST", "/api/prompt/ask"): (ask_prompt, None),
+    ("POST", "/api/plan/monthly"): (create_monthly_plan, None),
+    ("GET", "/api/analysis/full"): (full_analysis, "analysis"),
+    ("GET", "/api/investment/sip-plan"): (sip_plan, "sip_plan"),
+}
+
+
+async def gated(handler, request, user_id):
+    """Run a handler under an LLM admission slot; 429 or rule-based when shed"""
+    try:
+        async with llm_gate.aslot(user_id) as admitted:
+            status, body, mimetype, headers = await handler(request, user_id)
+    except Rejected as e:
+        return json_response(
+            {"error": "Too many requests, please retry shortly", "reason": e.reason},
+            429, [("Retry-After", str(e.retry_after))]
+        )
+    if not admitted:
+        headers = headers + [("X-Degraded", "1")]
+    return status, body, mimetype, headers
+
+
+async def cached(handler, endpoint, request, user_id):
+    """Same (user, endpoint, data version) cache and ETags as utils.http_cache.http_cached"""
+    version = await run_in_db_thread(get_data_version, user_id)
+    key, etag = cache_key(user_id, endpoint, version, request.query_string)
+    headers = [("ETag", f'"{etag}"'), ("Cache-Control", "private, no-cache")]
+
+    if f'"{etag}"' in request.headers.get("if-none-match", ""):
+        metrics.http_cache_requests.inc(endpoint, "revalidated")
+        return 304, b"", None, headers + [("X-Cache", "REVALIDATED")]
+
+    hit = cache_get(key, endpoint)
+    if hit:
+        body, mimetype = hit
+        return 200, body, mimetype, headers + [("X-Cache", "HIT")]
+
+    status, body, mimetype, extra = await gated(handler, request, user_id)
+    if status == 200 and ("X-Degraded", "1") not in extra:
+        cache_put(key, body, mimetype)
+    return status, body, mimetype, headers + extra + [("X-Cache", "MISS")]
+
+
+async def event_stream(receive, send, user_id):
+    """Async /api/events: forward the user's deltas until the client disconnects"""
+    subscription = events.subscribe(user_id, asyncio.get_running_loop())
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        subscription.close()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        await send({"type": "http.response.body", "body": STREAM_PREAMBLE, "more_body": True})
+        while not subscription.closed:
+            batch = await subscription.aget()
+            if subscription.closed:
+                break
+            chunk = b"".join(format_sse(message) for message in batch) or HEARTBEAT
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    finally:
+        watcher.cancel()
+        events.unsubscribe(subscription)
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if WARM_UP:
+                await asyncio.to_thread(warm_up)  # before the server accepts connections
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await llm.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    if scope["type"] == "http":
+        if scope["method"] == "GET" and scope["path"] == "/api/events":
+            user_id = Request(scope, b"").user_id()
+            if user_id is not None:
+                await event_stream(receive, send, user_id)
+                return
+
+        route = ROUTES.get((scope["method"], scope["path"]))
+        if route:
+            body = await read_body(receive)
+            request = Request(scope, body)
+            user_id = request.user_id()
+            # Requests picked for profiling go through Flask, where the profiler hooks live
+            choice = None
+            if user_id is not None:
+                flag = request.args.get("profile") or request.headers.get("x-profile")
+                choice = profiling.choose(scope["path"], flag, lambda: user_id in ADMIN_USERS)
+            if user_id is not None and choice is None:
+                handler, endpoint = route
+                started = metrics.request_started()
+                db_queries = begin_request(scope["path"])
+                trace = tracing.start(handler.__name__, method=scope["method"], path=scope["path"], server="asgi")
+                try:
+                    if endpoint:
+                        status, payload, mimetype, headers = await cached(handler, endpoint, request, user_id)
+                    else:
+                        status, payload, mimetype, headers = await gated(handler, request, user_id)
+                except BaseException as e:
+                    if trace is not None:
+                        tracing.finish(trace, status=500, error=type(e).__name__)
+                    metrics.request_finished(started, scope["path"], scope["method"], 500)
+                    end_request(db_queries)
+                    raise
+                metrics.request_finished(started, scope["path"], scope["method"], status)
+                end_request(db_queries)
+                if trace is not None:
+                    headers = list(headers) + [("Server-Timing", tracing.finish(trace, status=status))]
+
+                response_headers = []
+                if status == 200:
+                    etag = dict(headers).get("ETag")
+                    payload, encoding = encode_body(payload, mimetype, request.headers.get("accept-encoding"), etag)
+                    response_headers.append((b"vary", b"Accept-Encoding"))
+                    if encoding:
+                        response_headers.append((b"content-encoding", encoding.encode()))
+                        if etag:
+                            headers = [(k, weak_etag(v) if k == "ETag" else v) for k, v in headers]
+                response_headers.append((b"content-length", str(len(payload)).encode()))
+                if mimetype:
+                    response_headers.append((b"content-type", mimetype.encode()))
+                response_headers += [(k.lower().encode(), v.encode()) for k, v in headers]
+                await send({"type": "http.response.start", "status": status, "headers": response_headers})
+                await send({"type": "http.response.body", "body": payload})
+                return
+
+            # Not logged in (Flask redirects to /login) or profiled
+            receive = _replay(body)
+            if choice is not None:
+                await flask_application(scope, receive, send, {profiling.CHOICE_ENVIRON: choice})
+                return
+
+    await flask_application(scope, receive, send)
+
+
+async def flask_application(scope, receive, send, environ_extra=None):
+    """
+    Serve a request with the Flask app on the WSGI thread pool, response
+    buffered (the one streaming route, /api/events, is served natively).
+    asgiref's WsgiToAsgi runs every request on a single shared thread, which
+    serialized all Flask-routed traffic under load. environ_extra is added to
+    the WSGI environ.
+    """
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            return  # client went away
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+
+    adapter = WsgiToAsgiInstance(flask_app)
+    adapter.scope = scope
+    environ = adapter.build_environ(scope, io.BytesIO(bytes(body)))
+    environ.update(environ_extra or {})
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    def run():
+        chunks = flask_app(environ, start_response)
+        try:
+            return b"".join(chunks)
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    payload = await asyncio.get_running_loop().run_in_executor(_wsgi_executor, run)
+    await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+    await send({"type": "http.response.body", "body": payload})
+
+
+def _replay(body):
+    """A receive() that hands an already-read body to the Flask app"""
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+    return receive
@@ -1,13 +1,38 @@
 """
 Authentication system for financial advisor
 Simple session-based auth with password hashing
+Password hashes are computed on a small bounded thread pool (hashlib releases
+the GIL, so they run in parallel); the request thread still blocks on its own
+hash, the pool only caps how many run at once and refuses the excess. Attempts
+are throttled per IP and per account before any hashing happens.
 """
-from functools import wraps
-from flask import session, redirect, url_for, request
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
+import os
+import sqlite3
+import threading
+from flask import session, redirect, url_for, request, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 from memory.db import get_connection
+from memory.versions import bump_data_version
+from utils.metrics import registry
+from utils.rate_limit import Throttled, ip_limiter, account_lockout
 from datetime import datetime
 
+# Werkzeug method spec including its cost; stored hashes with another spec are
+# upgraded on the user's next successful login
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+# Hashes computed at once, and how many more may wait before attempts are refused
+PASSWORD_HASH_THREADS = int(os.getenv("PASSWORD_HASH_THREADS", str(min(os.cpu_count() or 2, 4))))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+# User ids (comma separated) allowed to use the /admin routes and profile requests
+ADMIN_USERS = {int(user_id) for user_id in os.getenv("ADMIN_USERS", "").split(",") if user_id.strip()}
+
+_hash_pool = ThreadPoolExecutor(PASSWORD_HASH_THREADS, thread_name_prefix="pwhash")
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_THREADS + PASSWORD_HASH_QUEUE)
+registry.callback("finance_password_hash_queue", "Password hashes running or waiting",
+                  lambda: PASSWORD_HASH_THREADS + PASSWORD_HASH_QUEUE - _hash_slots._value)
+
 
 def login_required(f):
     """Decorator to require login for routes"""
@@ -19,28 +44,89 @@ def login_required(f):
     return decorated_function
 
 
-def register_user(username: str, email: str, password: str, full_name: str = None) -> tuple[bool, str]:
+def is_admin():
+    """Whether the logged-in user is listed in ADMIN_USERS"""
+    return session.get('user_id') in ADMIN_USERS
+
+
+def admin_required(f):
+    """Decorator to require an ADMIN_USERS login (403 for other users)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('login'))
+        if not is_admin():
+            return jsonify({"error": "Forbidden"}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _run_hash(func, *args):
+    """
+    Run a hash function on the pool and wait for it; raises Throttled when the
+    pool's queue is full. The calling thread still blocks for its own hash: the
+    pool caps the CPU spent hashing at once and refuses the excess fast, it
+    doesn't free request threads.
+    """
+    if not _hash_slots.acquire(blocking=False):
+        raise Throttled("busy", 1)
+    try:
+        future = _hash_pool.submit(func, *args)
+    except Exception:
+        _hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return future.result()
+
+
+def hash_password(password: str) -> str:
+    return _run_hash(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    return _run_hash(check_password_hash, password_hash, password)
+
+
+@lru_cache(maxsize=1)
+def _current_method() -> str:
+    """
+    The method prefix hashes made now carry. Werkzeug expands short specs
+    ("scrypt" -> "scrypt:32768:8:1"), so it is read off a real hash, made once.
+    """
+    return generate_password_hash("", PASSWORD_HASH_METHOD).split("$", 1)[0]
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """True when a stored hash was made with a different method or cost"""
+    return password_hash.split("$", 1)[0] != _current_method()
+
+
+def register_user(username: str, email: str, password: str, full_name: str = None,
+                  client_ip: str = None) -> tuple[bool, str]:
     """
     Register a new user
     Returns: (success: bool, message: str)
+    Raises Throttled when the client is over its attempt rate or hashing is saturated.
     """
+    if client_ip:
+        ip_limiter.hit(client_ip)
+    
+    # Hash password
+    password_hash = hash_password(password)
+    
     conn = get_connection()
     cur = conn.cursor()
     
     try:
-        # Check if username or email already exists
-        cur.execute("SELECT id FROM users WHERE username = ? OR email = ?", (username, email))
-        if cur.fetchone():
+        # Insert user - the UNIQUE constraints reject a taken username or email
+        try:
+            cur.execute(
+                "INSERT INTO users (username, email, password_hash, full_name, created_at) VALUES (?, ?, ?, ?, ?)",
+                (username, email, password_hash, full_name, datetime.utcnow().isoformat())
+            )
+        except sqlite3.IntegrityError:
+            conn.rollback()
             return False, "Username or email already exists"
-        
-        # Hash password
-        password_hash = generate_password_hash(password)
-        
-        # Insert user
-        cur.execute(
-            "INSERT INTO users (username, email, password_hash, full_name, created_at) VALUES (?, ?, ?, ?, ?)",
-            (username, email, password_hash, full_name, datetime.utcnow().isoformat())
-        )
         user_id = cur.lastrowid
         
         # Create default profile
@@ -60,11 +146,17 @@ def register_user(username: str, email: str, password: str, full_name: str = Non
         conn.close()
 
 
-def authenticate_user(username: str, password: str) -> tuple[bool, int, str]:
+def authenticate_user(username: str, password: str, client_ip: str = None) -> tuple[bool, int, str]:
     """
     Authenticate a user
     Returns: (success: bool, user_id: int, message: str)
+    Raises Throttled when the client or account is over its attempt limits.
     """
+    account = username.lower()
+    if client_ip:
+        ip_limiter.hit(client_ip)
+    account_lockout.check(account)
+    
     conn = get_connection()
     cur = conn.cursor()
     
@@ -73,15 +165,27 @@ def authenticate_user(username: str, password: str) -> tuple[bool, int, str]:
         user = cur.fetchone()
         
         if not user:
+            account_lockout.failed(account)
             return False, None, "Invalid username or password"
         
         user_id, password_hash, full_name = user
         
-        if check_password_hash(password_hash, password):
-            return True, user_id, full_name or username
-        else:
+        if not verify_password(password_hash, password):
+            account_lockout.failed(account)
             return False, None, "Invalid username or password"
+        
+        account_lockout.succeeded(account)
+        if needs_rehash(password_hash):
+            # Cost setting changed since this hash was made - upgrade it now that we have the password
+            try:
+                cur.execute("UPDATE users SET password_hash = ? WHERE id = ?", (hash_password(password), user_id))
+                conn.commit()
+            except Throttled:
+                pass  # hashing saturated; upgrade on a later login
+        return True, user_id, full_name or username
     
+    except Throttled:
+        raise
     except Exception as e:
         return False, None, f"Authentication error: {str(e)}"
     finally:
@@ -160,6 +264,7 @@ def update_user_profile(user_id: int, **kwargs) -> bool:
         """
         
         cur.execute(query, values)
+        bump_data_version(cur, user_id)
         conn.commit()
         return True
     except Exception as e:
@@ -0,0 +1,160 @@
+"""
+Load benchmark: sync (Flask, fixed thread pool) vs async (asgi.py) serving of
+LLM-bound requests against the local fake LLM
+
+    python -m benchmarks.async_load --requests 400 --concurrency 200 --threads 8 --delay 0.5
+
+Runs against a throwaway database; the sync side models a WSGI server with
+--threads worker threads, the async side drives asgi.application directly.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ENDPOINTS = {
+    "ask": ("POST", "/api/prompt/ask", {"prompt": "How should I invest my savings?"}),
+    "plan": ("POST", "/api/plan/monthly", {"prompt": "Plan my month"}),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def start_fake_llm(delay, *options):
+    """Fake LLM in its own process so it doesn't compete for this one's GIL"""
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_llm_server", "--port", str(port), "--delay", str(delay), *options
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def setup(delay):
+    """Start the fake LLM, point the app at it and at a fresh database with one user"""
+    server, url = start_fake_llm(delay)
+    os.environ["LLM_PROVIDER"] = "ollama"
+    os.environ["OLLAMA_URL"] = url
+    # One user drives all the traffic; measure serving, not admission control
+    for name in ("LLM_MAX_CONCURRENT", "LLM_MAX_PER_USER", "LLM_QUEUE_SIZE"):
+        os.environ.setdefault(name, "100000")
+
+    import memory.db
+    memory.db.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    conn = memory.db.get_connection()
+    with open("memory/schema.sql") as f:
+        conn.executescript(f.read())
+    conn.close()
+
+    from auth import register_user, update_user_profile
+    register_user("bench", "bench@example.com", "bench-password")
+    update_user_profile(1, income=90000, emi=10000, emergency_fund=150000, age=32,
+                        risk_tolerance="moderate", investment_experience="beginner")
+    return server
+
+
+def summarize(label, latencies, elapsed):
+    latencies = sorted(latencies)
+    p = lambda q: latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000
+    print(f"{label:<6} {len(latencies)} requests in {elapsed:.2f}s  "
+          f"{len(latencies) / elapsed:7.1f} req/s  "
+          f"p50 {p(0.50):7.0f}ms  p95 {p(0.95):7.0f}ms  p99 {p(0.99):7.0f}ms")
+
+
+def run_sync(endpoint, requests, threads):
+    from app import app
+    method, path, body = ENDPOINTS[endpoint]
+
+    def one(_):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["user_id"] = 1
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        assert response.status_code == 200, response.status_code
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        latencies = list(pool.map(one, range(requests)))
+    summarize("sync", latencies, time.perf_counter() - started)
+
+
+async def run_async(endpoint, requests, concurrency):
+    import json
+    from app import app
+    from asgi import application
+    from llm.local_llm import llm
+
+    method, path, body = ENDPOINTS[endpoint]
+    cookie = app.session_interface.get_signing_serializer(app).dumps({"user_id": 1})
+    payload = json.dumps(body).encode("utf-8")
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with limit:
+            sent = []
+            received = False
+
+            async def receive():
+                nonlocal received
+                if received:
+                    await asyncio.sleep(3600)
+                received = True
+                return {"type": "http.request", "body": payload, "more_body": False}
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {
+                "type": "http", "method": method, "path": path, "query_string": b"",
+                "headers": [(b"cookie", f"{app.config['SESSION_COOKIE_NAME']}={cookie}".encode()),
+                            (b"content-type", b"application/json")],
+            }
+            started = time.perf_counter()
+            await application(scope, receive, send)
+            assert sent[0]["status"] == 200, sent[0]["status"]
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(requests)))
+    summarize("async", latencies, time.perf_counter() - started)
+    await llm.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync vs async serving under a slow LLM")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="ask")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200, help="in-flight requests (async)")
+    parser.add_argument("--threads", type=int, default=8, help="WSGI worker threads (sync)")
+    parser.add_argument("--delay", type=float, default=0.5, help="fake LLM latency in seconds")
+    args = parser.parse_args()
+
+    server = setup(args.delay)
+    try:
+        print(f"{args.requests} x {args.endpoint}, fake LLM delay {args.delay}s")
+        run_sync(args.endpoint, args.requests, args.threads)
+        asyncio.run(run_async(args.endpoint, args.requests, args.concurrency))
+    finally:
+        server.terminate()
@@ -0,0 +1,292 @@
+"""
+Local fake LLM server for benchmarks
+Answers Ollama (/api/generate) and Hugging Face Inference (/models/<name>)
+requests the way the real services do, streaming included (Ollama NDJSON
+chunks when "stream" is true, text-generation-inference server-sent events for
+Hugging Face), so load tests measure the app rather than a remote model.
+Runs on asyncio, so thousands of requests can wait at once.
+
+Shape of each response:
+- time to first token: --delay, scaled by a lognormal factor with sigma --jitter
+- generation: --tokens words (default: a fixed paragraph) at --tokens-per-second
+- capacity: at most --concurrency generations at once, the rest queue (like one
+  GPU serving N sequences)
+- failures: --error-rate of requests get the service's own error (HF 503
+  "model loading", Ollama 500)
+
+Record/replay: with --record FILE --upstream URL every request is forwarded to
+the real service and its answer appended to FILE (JSON lines keyed by the
+prompt); --replay FILE answers from those recordings, so load tests get real
+response text without the network. GET /_stats reports request counters.
+
+    python -m benchmarks.fake_llm_server --port 11435 --delay 0.5
+    OLLAMA_URL=http://127.0.0.1:11435 LLM_PROVIDER=ollama ...
+    HUGGINGFACE_API_URL=http://127.0.0.1:11435/models HUGGINGFACE_API_KEY=x ...
+
+    python -m benchmarks.fake_llm_server --record llm.jsonl --upstream http://localhost:11434
+    python -m benchmarks.fake_llm_server --replay llm.jsonl --tokens-per-second 40
+"""
+from http import HTTPStatus
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+
+ADVICE = (
+    "Build your emergency fund to six months of expenses first, then start a "
+    "monthly SIP in a diversified index fund and review your budget every month."
+)
+
+
+def prompt_key(api, prompt):
+    """Recording key for one prompt"""
+    return hashlib.sha1(f"{api}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+def tokenize(text):
+    """Words with their leading whitespace, so the pieces join back to `text`"""
+    return re.findall(r"\s*\S+", text) or [text]
+
+
+class FakeLLMServer:
+    def __init__(self, host="127.0.0.1", port=11435, delay=0.5, jitter=0.0, tokens=None,
+                 tokens_per_second=None, concurrency=None, error_rate=0.0, seed=None,
+                 replay=None, record=None, upstream=None):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.jitter = jitter
+        self.tokens = tokens
+        self.tokens_per_second = tokens_per_second
+        self.concurrency = concurrency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.record = record
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.recordings = {}
+        if replay:
+            with open(replay) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.recordings[entry["key"]] = entry["text"]
+        self.stats = {"requests": 0, "in_flight": 0, "queued": 0, "streamed": 0, "errors": 0,
+                      "replayed": 0, "replay_misses": 0, "recorded": 0}
+        self._slots = None
+
+    def text(self):
+        if not self.tokens:
+            return ADVICE
+        words = ADVICE.split()
+        return " ".join(words[i % len(words)] for i in range(self.tokens))
+
+    def first_token_delay(self):
+        if self.jitter:
+            return self.delay * self.rng.lognormvariate(0, self.jitter)
+        return self.delay
+
+    def token_interval(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    # --- request handling ---
+
+    async def dispatch(self, method, path, headers, body, writer):
+        if method == "GET" and path == "/_stats":
+            return await self.send_json(writer, 200, self.stats)
+
+        if path == "/api/generate":
+            api = "ollama"
+        elif path.startswith("/models/"):
+            api = "huggingface"
+        else:
+            return await self.send_json(writer, 404, {"error": "not found"})
+
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            return await self.send_json(writer, 400, {"error": "invalid JSON"})
+        prompt = request.get("prompt") if api == "ollama" else request.get("inputs")
+        stream = bool(request.get("stream"))
+
+        self.stats["requests"] += 1
+        if self.record:
+            status, text = await self.forward(api, path, headers, request, prompt)
+            if status != 200:
+                self.stats["errors"] += 1
+                return await self.send_json(writer, status, {"error": text})
+            return await self.respond(writer, api, request, text, stream, paced=False)
+
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            await asyncio.sleep(self.first_token_delay())
+            if api == "huggingface":
+                return await self.send_json(writer, 503, {
+                    "error": f"Model {path[len('/models/'):]} is currently loading", "estimated_time": 20.0
+                })
+            return await self.send_json(writer, 500, {"error": "model runner has unexpectedly stopped"})
+
+        text = self.text()
+        if self.recordings:
+            recorded = self.recordings.get(prompt_key(api, prompt))
+            if recorded is None:
+                self.stats["replay_misses"] += 1
+            else:
+                self.stats["replayed"] += 1
+                text = recorded
+
+        self.stats["queued"] += 1
+        async with self._slots:
+            self.stats["queued"] -= 1
+            self.stats["in_flight"] += 1
+            try:
+                await asyncio.sleep(self.first_token_delay())
+                return await self.respond(writer, api, request, text, stream)
+            finally:
+                self.stats["in_flight"] -= 1
+
+    async def respond(self, writer, api, request, text, stream, paced=True):
+        tokens = tokenize(text)
+        interval = self.token_interval() if paced else 0.0
+        if not stream:
+            if interval:
+                await asyncio.sleep(interval * len(tokens))
+            if api == "ollama":
+                payload = {"model": request.get("model", "mistral"), "response": text, "done": True,
+                           "eval_count": len(tokens)}
+            else:
+                payload = [{"generated_text": text}]
+            return await self.send_json(writer, 200, payload)
+
+        self.stats["streamed"] += 1
+        content_type = "application/x-ndjson" if api == "ollama" else "text/event-stream"
+        writer.write(self.head(200, content_type, chunked=True))
+        for i, token in enumerate(tokens):
+            if interval:
+                await asyncio.sleep(interval)
+            last = i == len(tokens) - 1
+            if api == "ollama":
+                chunk = json.dumps({"model": request.get("model", "mistral"), "response": token,
+                                    "done": False}) + "\n"
+            else:
+                chunk = "data:" + json.dumps({
+                    "token": {"id": i, "text": token, "logprob": 0.0, "special": False},
+                    "generated_text": text if last else None, "details": None
+                }) + "\n\n"
+            self.write_chunk(writer, chunk.encode("utf-8"))
+            await writer.drain()
+        if api == "ollama":
+            self.write_chunk(writer, (json.dumps({"model": request.get("model", "mistral"), "response": "",
+                                                  "done": True, "eval_count": len(tokens)}) + "\n").encode("utf-8"))
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def forward(self, api, path, headers, request, prompt):
+        """Ask the real service (non-streaming) and append its answer to the recording"""
+        import requests
+
+        url = self.upstream + path
+        upstream_headers = {"Content-Type": "application/json"}
+        if "authorization" in headers:
+            upstream_headers["Authorization"] = headers["authorization"]
+        body = dict(request, stream=False)
+
+        def call():
+            response = requests.post(url, headers=upstream_headers, json=body, timeout=120)
+            if response.status_code != 200:
+                return response.status_code, response.text
+            result = response.json()
+            if api == "ollama":
+                return 200, result.get("response", "")
+            return 200, result[0].get("generated_text", "") if isinstance(result, list) and result else str(result)
+
+        try:
+            status, text = await asyncio.to_thread(call)
+        except Exception as e:
+            return 502, f"upstream error: {e}"
+        if status == 200:
+            with open(self.record, "a") as f:
+                f.write(json.dumps({"key": prompt_key(api, prompt), "api": api, "text": text}) + "\n")
+            self.stats["recorded"] += 1
+        return status, text
+
+    # --- HTTP/1.1 plumbing ---
+
+    @staticmethod
+    def head(status, content_type, length=None, chunked=False):
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", f"Content-Type: {content_type}"]
+        if chunked:
+            lines.append("Transfer-Encoding: chunked")
+        else:
+            lines.append(f"Content-Length: {length}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    @staticmethod
+    def write_chunk(writer, data):
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+    async def send_json(self, writer, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        writer.write(self.head(status, "application/json", len(data)) + data)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                await self.dispatch(method, path.split("?", 1)[0], headers, body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self._slots = asyncio.Semaphore(self.concurrency or 1 << 30)
+        server = await asyncio.start_server(self.handle, self.host, self.port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+
+def add_arguments(parser, prefix=""):
+    """Response-shaping flags, shared with benchmarks/load_test.py (which prefixes them with llm-)"""
+    parser.add_argument(f"--{prefix}delay", type=float, default=0.5, help="seconds to first token")
+    parser.add_argument(f"--{prefix}jitter", type=float, default=0.0,
+                        help="sigma of a lognormal factor applied to the delay (0 = fixed)")
+    parser.add_argument(f"--{prefix}tokens", type=int, default=None, help="words per response")
+    parser.add_argument(f"--{prefix}tokens-per-second", type=float, default=None,
+                        help="generation speed per response (default: instant)")
+    parser.add_argument(f"--{prefix}concurrency", type=int, default=None,
+                        help="generations served at once; the rest queue (default: unlimited)")
+    parser.add_argument(f"--{prefix}error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument(f"--{prefix}replay", help="answer from a file written by --record")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama / Hugging Face server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--seed", type=int, default=None, help="seed for jitter and errors")
+    add_arguments(parser)
+    parser.add_argument("--record", help="forward to --upstream and append its answers to this file")
+    parser.add_argument("--upstream", help="real Ollama or Hugging Face base URL (with --record)")
+    args = parser.parse_args()
+    if args.record and not args.upstream:
+        parser.error("--record needs --upstream")
+
+    server = FakeLLMServer(args.host, args.port, args.delay, args.jitter, args.tokens, args.tokens_per_second,
+                           args.concurrency, args.error_rate, args.seed, args.replay, args.record, args.upstream)
+    mode = f"recording {args.upstream}" if args.record else f"delay {args.delay}s"
+    print(f"Fake LLM listening on http://{args.host}:{args.port} ({mode})")
+    asyncio.run(server.serve())
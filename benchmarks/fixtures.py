@@ -0,0 +1,194 @@
+"""
+Deterministic benchmark fixtures
+A throwaway database and market-data directory seeded from a fixed random
+seed: one fully populated benchmark user (two years of expenses with recurring
+charges, investments, a profile) and a population of peers for the cohort
+sketches. attach() uses an existing database instead, such as one written by
+benchmarks/generate_dataset.py. Call either before importing app or the agents -
+MARKET_DATA_DIR is read at import time.
+"""
+from datetime import date, timedelta
+import os
+import random
+import tempfile
+
+BENCH_USERNAME = "bench"
+BENCH_PASSWORD = "bench-password"
+
+CATEGORIES = {
+    "Food": (150, 1500),
+    "Transport": (50, 600),
+    "Shopping": (300, 4000),
+    "Entertainment": (200, 1500),
+    "Health": (200, 3000),
+    "Utilities": (500, 2500),
+}
+
+# (category, description, amount) charged on the same day every month
+RECURRING = [
+    ("Housing", "Rent", 18000),
+    ("Utilities", "Broadband", 999),
+    ("Entertainment", "Streaming subscription", 649),
+    ("Health", "Gym membership", 1500),
+]
+
+INVESTMENTS = [
+    ("Mutual Fund", 150000, 12.0, "moderate"),
+    ("Fixed Deposit", 100000, 7.0, "low"),
+    ("ELSS", 50000, 13.0, "moderate"),
+]
+
+
+def write_market_data(directory, rng, years=6):
+    """Random-walk index and NAV series, one close per weekday"""
+    os.makedirs(directory, exist_ok=True)
+    series = {
+        "nifty50": (18000, 0.0004, 0.011),
+        "nav_equity": (100, 0.0005, 0.012),
+        "nav_hybrid": (50, 0.0004, 0.007),
+        "nav_debt": (30, 0.0003, 0.001),
+        "nav_elss": (80, 0.0005, 0.013),
+    }
+    start = date.today() - timedelta(days=365 * years)
+    for name, (price, drift, volatility) in series.items():
+        with open(os.path.join(directory, f"{name}.csv"), "w") as f:
+            f.write("date,close\n")
+            day = start
+            while day <= date.today():
+                if day.weekday() < 5:
+                    price *= 1 + rng.gauss(drift, volatility)
+                    f.write(f"{day.isoformat()},{price:.4f}\n")
+                day += timedelta(days=1)
+
+
+def _month_days(months):
+    """First day of each of the last `months` months, oldest first"""
+    first = date.today().replace(day=1)
+    days = []
+    for _ in range(months):
+        days.append(first)
+        first = (first - timedelta(days=1)).replace(day=1)
+    return days[::-1]
+
+
+def seed_bench_user(rng, months=24):
+    """The benchmarked user, created through the app's own write paths"""
+    from agents.expense_tracker import ExpenseTrackerAgent
+    from agents.investment_advisor import InvestmentAdvisorAgent
+    from auth import authenticate_user, register_user, update_user_profile
+
+    register_user(BENCH_USERNAME, "bench@example.com", BENCH_PASSWORD, "Bench User")
+    _, user_id, _ = authenticate_user(BENCH_USERNAME, BENCH_PASSWORD)
+    update_user_profile(user_id, income=120000, emi=15000, emergency_fund=250000, age=34,
+                        occupation="Engineer", risk_tolerance="moderate",
+                        investment_experience="intermediate", financial_goals="Buy a house")
+
+    expenses = ExpenseTrackerAgent()
+    for first in _month_days(months):
+        month = first.strftime("%Y-%m")
+        for category, description, amount in RECURRING:
+            day = first.replace(day=5)
+            if day <= date.today():
+                expenses.add_expense(user_id, category, amount, month, description,
+                                     date=day.isoformat(), is_recurring=True)
+        for _ in range(30):
+            day = first.replace(day=rng.randint(1, 28))
+            if day > date.today():
+                continue
+            category = rng.choice(list(CATEGORIES))
+            low, high = CATEGORIES[category]
+            expenses.add_expense(user_id, category, round(rng.uniform(low, high), 2), month,
+                                 f"{category} purchase", date=day.isoformat(),
+                                 payment_method=rng.choice(["UPI", "Card", "Cash"]))
+
+    investments = InvestmentAdvisorAgent()
+    for investment_type, amount, expected_return, risk_level in INVESTMENTS:
+        investments.add_investment(user_id, investment_type, amount, expected_return, risk_level)
+    return user_id
+
+
+def seed_peers(rng, count):
+    """Peer profiles and monthly totals written directly (no per-user password hash)"""
+    from memory.db import get_connection
+
+    months = [day.strftime("%Y-%m") for day in _month_days(6)]
+    conn = get_connection()
+    cur = conn.cursor()
+    for i in range(count):
+        cur.execute(
+            "INSERT INTO users (username, email, password_hash, created_at) VALUES (?, ?, ?, datetime('now'))",
+            (f"peer{i}", f"peer{i}@example.com", "!")
+        )
+        user_id = cur.lastrowid
+        income = rng.choice([30000, 60000, 90000, 150000, 250000]) * rng.uniform(0.8, 1.2)
+        cur.execute("""
+            INSERT INTO user_profile (user_id, monthly_income, emergency_fund, total_emi, age, updated_at)
+            VALUES (?, ?, ?, ?, ?, datetime('now'))
+        """, (user_id, income, income * rng.uniform(0, 8), income * rng.uniform(0, 0.5), rng.randint(22, 60)))
+        cur.executemany("""
+            INSERT INTO category_monthly_totals (user_id, category, month, total, transaction_count)
+            VALUES (?, 'Food', ?, ?, 20)
+        """, [(user_id, month, income * rng.uniform(0.3, 0.9)) for month in months])
+    conn.commit()
+    conn.close()
+
+
+def attach(db_path, user_id=1, password="password123", seed=42, directory=None):
+    """
+    Point the app at an existing database (e.g. from benchmarks/generate_dataset.py)
+    and benchmark one of its users; market data is still generated.
+    """
+    rng = random.Random(seed)
+    directory = directory or tempfile.mkdtemp(prefix="finance-bench-")
+    os.environ["MARKET_DATA_DIR"] = os.path.join(directory, "market")
+    os.environ.setdefault("LLM_PROVIDER", "none")
+    write_market_data(os.environ["MARKET_DATA_DIR"], rng)
+
+    import memory.db
+    memory.db.DB_PATH = db_path
+    conn = memory.db.get_connection()
+    row = conn.execute("SELECT username FROM users WHERE id = ?", (user_id,)).fetchone()
+    conn.close()
+    if row is None:
+        raise ValueError(f"No user {user_id} in {db_path}")
+
+    return {
+        "dir": directory,
+        "db_path": db_path,
+        "user_id": user_id,
+        "username": row["username"],
+        "password": password
+    }
+
+
+def prepare(seed=42, peers=300, directory=None):
+    """
+    Build the fixture and point the app at it. Returns
+    {"dir", "db_path", "user_id", "username", "password"}.
+    """
+    rng = random.Random(seed)
+    directory = directory or tempfile.mkdtemp(prefix="finance-bench-")
+    os.environ["MARKET_DATA_DIR"] = os.path.join(directory, "market")
+    os.environ.setdefault("LLM_PROVIDER", "none")
+    write_market_data(os.environ["MARKET_DATA_DIR"], rng)
+
+    import memory.db
+    memory.db.DB_PATH = os.path.join(directory, "finance.db")
+    conn = memory.db.get_connection()
+    with open(os.path.join(os.path.dirname(os.path.dirname(__file__)), "memory", "schema.sql")) as f:
+        conn.executescript(f.read())
+    conn.close()
+
+    user_id = seed_bench_user(rng)
+    seed_peers(rng, peers)
+
+    from agents.peer_benchmark import PeerBenchmarkAgent
+    PeerBenchmarkAgent().rebuild()
+
+    return {
+        "dir": directory,
+        "db_path": memory.db.DB_PATH,
+        "user_id": user_id,
+        "username": BENCH_USERNAME,
+        "password": BENCH_PASSWORD
+    }
@@ -0,0 +1,374 @@
+"""
+Synthetic dataset generator for scale testing
+Writes a production-shaped finance.db: users with profiles, debts and
+investments, and months of expenses with per-category seasonality, recurring
+charges (monthly rent and subscriptions, quarterly maintenance, yearly
+insurance, weekly deliveries) and income-scaled amounts.
+
+    python -m benchmarks.generate_dataset --users 5000 --months 36 --out /tmp/finance_10m.db
+
+Every user is generated from its own seed (--seed, user id), so the output is
+identical for any --workers count. Workers write expenses into per-chunk shard
+databases; the parent copies each shard in with one INSERT ... SELECT, creates
+the indexes once at the end and rebuilds the derived tables (category totals
+and baselines, anomaly statistics, peer sketches) exactly as fix_db.py would.
+Every user's password is --password.
+"""
+from datetime import date, timedelta
+from multiprocessing import Pool
+import argparse
+import calendar
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+# Users generated per worker task (and per shard)
+CHUNK_USERS = 50
+
+# category: (share of transactions, typical amount, subcategories, monthly seasonality Jan..Dec)
+CATEGORIES = {
+    "Food": (0.30, 450, ["Groceries", "Restaurants", "Delivery"],
+             [1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.1, 1.1, 1.2]),
+    "Transport": (0.15, 300, ["Fuel", "Cab", "Metro"],
+                  [1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.1, 1.1, 1.0, 1.0, 1.0, 1.0]),
+    "Shopping": (0.11, 1800, ["Clothing", "Electronics", "Home"],
+                 [1.1, 0.9, 0.9, 0.9, 0.9, 1.0, 1.1, 1.0, 1.0, 1.6, 1.5, 1.2]),
+    "Entertainment": (0.08, 700, ["Movies", "Events", "Games"],
+                      [1.0, 1.0, 1.0, 1.1, 1.1, 1.0, 0.9, 0.9, 1.0, 1.1, 1.1, 1.3]),
+    "Health": (0.06, 1200, ["Pharmacy", "Doctor", "Lab tests"],
+               [1.1, 1.0, 1.0, 1.0, 1.0, 1.0, 1.2, 1.2, 1.2, 1.0, 1.0, 1.0]),
+    "Utilities": (0.08, 1500, ["Electricity", "Water", "Gas"],
+                  [0.9, 0.9, 1.0, 1.3, 1.4, 1.4, 1.1, 1.0, 1.0, 1.0, 0.9, 0.9]),
+    "Travel": (0.04, 6000, ["Flights", "Hotels", "Trains"],
+               [0.8, 0.7, 0.8, 1.0, 1.6, 1.6, 0.8, 0.8, 0.9, 1.3, 1.1, 1.5]),
+    "Education": (0.03, 4000, ["Courses", "Books", "School fees"],
+                  [0.8, 0.8, 0.9, 1.0, 1.0, 2.0, 2.0, 1.0, 0.9, 0.8, 0.8, 0.8]),
+    "Personal Care": (0.07, 600, ["Salon", "Cosmetics"],
+                      [1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.2, 1.2, 1.1]),
+    "Gifts": (0.03, 1500, ["Family", "Friends", "Donations"],
+              [0.8, 0.9, 0.8, 0.8, 0.8, 0.8, 0.8, 1.0, 1.0, 2.0, 2.0, 1.3]),
+    "Other": (0.05, 800, ["Miscellaneous"],
+              [1.0] * 12),
+}
+
+# (category, description, cadence, share of income or fixed range, probability a user has it)
+RECURRING = [
+    ("Housing", "Rent", "monthly", (0.18, 0.32), 0.55),
+    ("Utilities", "Mobile plan", "monthly", (399, 999), 0.9),
+    ("Utilities", "Broadband", "monthly", (599, 1499), 0.6),
+    ("Entertainment", "Streaming subscription", "monthly", (149, 649), 0.7),
+    ("Health", "Gym membership", "monthly", (1000, 2500), 0.35),
+    ("Food", "Milk delivery", "weekly", (250, 600), 0.25),
+    ("Housing", "Society maintenance", "quarterly", (3000, 9000), 0.4),
+    ("Insurance", "Health insurance premium", "yearly", (8000, 30000), 0.5),
+    ("Insurance", "Term insurance premium", "yearly", (6000, 20000), 0.3),
+]
+
+LOANS = [
+    # (loan type, share of income, interest rate range, tenure months)
+    ("Home Loan", (0.20, 0.35), (8.0, 9.5), 240),
+    ("Car Loan", (0.08, 0.15), (8.5, 11.0), 60),
+    ("Personal Loan", (0.05, 0.12), (11.0, 16.0), 36),
+    ("Education Loan", (0.05, 0.10), (9.0, 12.0), 84),
+]
+
+INVESTMENT_TYPES = [
+    # (type, expected return, risk level, typical amount)
+    ("Equity Mutual Fund", 12.0, "high", 100000),
+    ("Hybrid Mutual Fund", 10.0, "moderate", 75000),
+    ("Debt Fund", 7.0, "low", 75000),
+    ("ELSS", 12.5, "high", 50000),
+    ("Fixed Deposit", 7.0, "low", 100000),
+    ("PPF", 7.1, "low", 60000),
+    ("Gold", 8.0, "moderate", 40000),
+]
+
+OCCUPATIONS = ["Engineer", "Teacher", "Doctor", "Designer", "Sales", "Accountant",
+               "Consultant", "Business Owner", "Student", "Government Employee"]
+GOALS = ["Buy a house", "Retire early", "Child education", "Emergency fund",
+         "Buy a car", "Travel", "Start a business", ""]
+PAYMENT_METHODS = ["UPI", "UPI", "UPI", "Credit Card", "Debit Card", "Cash", "Net Banking"]
+
+EXPENSE_COLUMNS = ("user_id, category, subcategory, amount, date, month, description, "
+                   "payment_method, is_recurring, tags, created_at")
+
+# Log-normal amount multipliers, drawn once and indexed by 12 random bits
+_MULTIPLIERS = [random.Random(0).lognormvariate(0, 0.6) for _ in range(4096)]
+
+
+def month_starts(months, today):
+    first = today.replace(day=1)
+    starts = []
+    for _ in range(months):
+        starts.append(first)
+        first = (first - timedelta(days=1)).replace(day=1)
+    return starts[::-1]
+
+
+def _profile(rng, user_id):
+    age = rng.randint(21, 65)
+    income = round(25000 * (1 + (age - 21) * 0.04) * rng.lognormvariate(0, 0.5), -3) or 15000
+    if age < 35:
+        risk = rng.choices(["high", "moderate", "low"], [0.4, 0.45, 0.15])[0]
+    elif age < 50:
+        risk = rng.choices(["high", "moderate", "low"], [0.2, 0.55, 0.25])[0]
+    else:
+        risk = rng.choices(["high", "moderate", "low"], [0.05, 0.45, 0.5])[0]
+    experience = rng.choices(["beginner", "intermediate", "advanced"], [0.5, 0.35, 0.15])[0]
+    return {
+        "age": age,
+        "income": income,
+        "emergency_fund": round(income * rng.uniform(0, 10), -2),
+        "occupation": rng.choice(OCCUPATIONS),
+        "risk_tolerance": risk,
+        "investment_experience": experience,
+        "financial_goals": rng.choice(GOALS),
+    }
+
+
+def _debts(rng, user_id, income, starts):
+    debts = []
+    for loan_type, share, rate, tenure in LOANS:
+        if rng.random() < (0.3 if loan_type == "Home Loan" else 0.15):
+            debts.append((user_id, round(income * rng.uniform(*share), -2),
+                          rng.randint(6, tenure), loan_type, round(rng.uniform(*rate), 2),
+                          f"{starts[0].isoformat()} 00:00:00"))
+    return debts
+
+
+def _investments(rng, user_id, income, experience, starts):
+    count = rng.randint(0, {"beginner": 2, "intermediate": 4, "advanced": 6}[experience])
+    rows = []
+    for investment_type, expected, risk_level, typical in rng.sample(INVESTMENT_TYPES, count):
+        amount = round(typical * (income / 60000) * rng.lognormvariate(0, 0.5), -2)
+        day = rng.choice(starts).replace(day=rng.randint(1, 28))
+        rows.append((user_id, investment_type, amount, amount, expected, risk_level,
+                     "", f"{day.isoformat()} 10:00:00"))
+    return rows
+
+
+def _recurring_dates(cadence, first_day, starts, today):
+    """Charge dates for one recurring template over the window"""
+    if cadence == "weekly":
+        day = starts[0] + timedelta(days=first_day % 7)
+        dates = []
+        while day <= today:
+            dates.append(day)
+            day += timedelta(days=7)
+        return dates
+    step = {"monthly": 1, "quarterly": 3, "yearly": 12}[cadence]
+    offset = first_day % step
+    return [start.replace(day=first_day % 28 + 1) for i, start in enumerate(starts)
+            if i % step == offset and start.replace(day=first_day % 28 + 1) <= today]
+
+
+def generate_user(seed, user_id, starts, today, per_month):
+    """(profile, debts, investments, expense rows) for one user"""
+    rng = random.Random(f"{seed}:{user_id}")
+    profile = _profile(rng, user_id)
+    income = profile["income"]
+    debts = _debts(rng, user_id, income, starts)
+    if any(d[3] == "Home Loan" for d in debts):
+        recurring = [r for r in RECURRING if r[1] != "Rent"]
+    else:
+        recurring = RECURRING
+    investments = _investments(rng, user_id, income, profile["investment_experience"], starts)
+
+    rows = []
+    flag_recurring = rng.random() < 0.5  # only some users tick "recurring" themselves
+    for category, description, cadence, (low, high), probability in recurring:
+        if rng.random() >= probability:
+            continue
+        amount = income * rng.uniform(low, high) if high < 1 else rng.uniform(low, high)
+        amount = round(amount, -1 if amount > 1000 else 0)
+        method = rng.choice(PAYMENT_METHODS)
+        for day in _recurring_dates(cadence, rng.randint(0, 400), starts, today):
+            iso = day.isoformat()
+            rows.append((user_id, category, None, amount, iso, iso[:7], description, method,
+                         1 if flag_recurring else 0, "recurring", f"{iso}T09:00:00"))
+
+    # Discretionary spending scales sub-linearly with income
+    scale = (income / 60000) ** 0.6
+    names = list(CATEGORIES)
+    frequency = max(1.0, per_month * rng.uniform(0.6, 1.4))
+    getrandbits = rng.getrandbits
+    for start in starts:
+        month = start.strftime("%Y-%m")
+        last = calendar.monthrange(start.year, start.month)[1]
+        if start.year == today.year and start.month == today.month:
+            last = today.day
+        days = [f"{month}-{d:02d}" for d in range(1, last + 1)]
+        seasonal = [CATEGORIES[name][0] * CATEGORIES[name][3][start.month - 1] for name in names]
+        count = max(1, int(rng.gauss(frequency * last / 30, frequency * 0.15)))
+        for name in rng.choices(names, seasonal, k=count):
+            _, typical, subcategories, season = CATEGORIES[name]
+            day = days[getrandbits(16) % len(days)]
+            amount = round(typical * scale * season[start.month - 1] * _MULTIPLIERS[getrandbits(12)], 2)
+            subcategory = subcategories[getrandbits(8) % len(subcategories)]
+            rows.append((user_id, name, subcategory, amount, day, month, subcategory,
+                         PAYMENT_METHODS[getrandbits(8) % len(PAYMENT_METHODS)], 0, None,
+                         f"{day}T{getrandbits(4) + 8:02d}:00:00"))
+    rows.sort(key=lambda row: row[4])
+    return profile, debts, investments, rows
+
+
+def generate_chunk(task):
+    """Worker: generate users [first, last] into a shard database; returns the small tables"""
+    seed, first, last, months, per_month, today, shard_dir = task
+    starts = month_starts(months, today)
+    shard = os.path.join(shard_dir, f"shard_{first}.db")
+    conn = sqlite3.connect(shard)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute(f"CREATE TABLE expenses ({EXPENSE_COLUMNS})")
+
+    profiles, debts, investments = [], [], []
+    count = 0
+    for user_id in range(first, last + 1):
+        profile, user_debts, user_investments, rows = generate_user(seed, user_id, starts, today, per_month)
+        profiles.append((user_id, profile))
+        debts += user_debts
+        investments += user_investments
+        conn.executemany(f"INSERT INTO expenses VALUES ({', '.join('?' * 11)})", rows)
+        count += len(rows)
+    conn.commit()
+    conn.close()
+    return first, last, profiles, debts, investments, shard, count
+
+
+def _password_hash(password):
+    from werkzeug.security import generate_password_hash
+    from auth import PASSWORD_HASH_METHOD
+    return generate_password_hash(password, PASSWORD_HASH_METHOD)
+
+
+def load_chunk(conn, result, password_hash, created_at):
+    first, last, profiles, debts, investments, shard, count = result
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO users (id, username, email, password_hash, full_name, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        [(user_id, f"user{user_id}", f"user{user_id}@example.com", password_hash, f"User {user_id}", created_at)
+         for user_id, _ in profiles]
+    )
+    cur.executemany("""
+        INSERT INTO user_profile (user_id, monthly_income, emergency_fund, total_emi, age, occupation,
+                                  financial_goals, risk_tolerance, investment_experience, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (user_id, p["income"], p["emergency_fund"],
+         sum(d[1] for d in debts if d[0] == user_id), p["age"], p["occupation"],
+         p["financial_goals"], p["risk_tolerance"], p["investment_experience"], created_at)
+        for user_id, p in profiles
+    ])
+    cur.executemany("""
+        INSERT INTO debts (user_id, emi_amount, remaining_months, loan_type, interest_rate, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, debts)
+    cur.executemany("""
+        INSERT INTO investments (user_id, investment_type, amount, current_value, expected_return,
+                                 risk_level, notes, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, investments)
+    cur.execute("ATTACH DATABASE ? AS shard", (shard,))
+    cur.execute(f"INSERT INTO expenses ({EXPENSE_COLUMNS}) SELECT {EXPENSE_COLUMNS} FROM shard.expenses")
+    conn.commit()
+    cur.execute("DETACH DATABASE shard")
+    os.remove(shard)
+    return count
+
+
+def build_derived(conn, db_path):
+    """Everything fix_db.py backfills, plus the peer sketches"""
+    import memory.db
+    from agents.anomaly_detector import rebuild_expense_stats
+    from agents.recurring_detector import rebuild_recurring_series
+    from memory.category_stats import rebuild_category_stats
+
+    rebuild_category_stats(conn)
+    rebuild_expense_stats(conn)
+    rebuild_recurring_series(conn)
+    conn.commit()
+
+    memory.db.DB_PATH = db_path
+    from agents.peer_benchmark import PeerBenchmarkAgent
+    PeerBenchmarkAgent().rebuild()
+
+
+def generate(out, users, months=36, per_month=55, seed=7, workers=None, password="password123",
+             derived=True, today=None):
+    """Write the dataset to `out` (must not exist); returns a summary dict"""
+    if os.path.exists(out):
+        raise FileExistsError(f"{out} already exists")
+    today = today or date.today()
+    started = time.perf_counter()
+
+    schema_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "memory", "schema.sql")
+    with open(schema_path) as f:
+        schema = f.read()
+    # Indexes are built once after the bulk load rather than maintained row by row
+    statements = [statement.strip() for statement in schema.split(";") if statement.strip()]
+    indexes = [statement for statement in statements if statement.startswith("CREATE INDEX")]
+    tables = [statement for statement in statements if statement not in indexes]
+
+    conn = sqlite3.connect(out)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.executescript(";\n".join(tables) + ";")
+
+    password_hash = _password_hash(password)
+    created_at = f"{month_starts(months, today)[0].isoformat()} 00:00:00"
+    shard_dir = tempfile.mkdtemp(prefix="dataset-shards-", dir=os.path.dirname(os.path.abspath(out)))
+    tasks = [
+        (seed, first, min(first + CHUNK_USERS - 1, users), months, per_month, today, shard_dir)
+        for first in range(1, users + 1, CHUNK_USERS)
+    ]
+
+    rows = 0
+    with Pool(workers or os.cpu_count()) as pool:
+        for done, result in enumerate(pool.imap(generate_chunk, tasks), 1):
+            rows += load_chunk(conn, result, password_hash, created_at)
+            if done % 20 == 0 or done == len(tasks):
+                elapsed = time.perf_counter() - started
+                print(f"  {result[1]}/{users} users, {rows:,} expenses, {rows / elapsed:,.0f} rows/s")
+    os.rmdir(shard_dir)
+
+    load_seconds = time.perf_counter() - started
+    for statement in indexes:
+        conn.execute(statement)
+    if derived:
+        build_derived(conn, out)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.execute("ANALYZE")
+    conn.close()
+
+    return {
+        "users": users,
+        "expenses": rows,
+        "load_seconds": round(load_seconds, 1),
+        "total_seconds": round(time.perf_counter() - started, 1)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic finance.db")
+    parser.add_argument("--out", required=True, help="database file to create")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--months", type=int, default=36, help="months of history ending this month")
+    parser.add_argument("--per-month", type=int, default=55, help="average discretionary expenses per user-month")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=None, help="generator processes (default: CPU count)")
+    parser.add_argument("--password", default="password123", help="password for every generated user")
+    parser.add_argument("--no-derived", action="store_true",
+                        help="skip category totals, baselines, anomaly stats and peer sketches")
+    args = parser.parse_args()
+
+    print(f"Generating {args.users} users x {args.months} months into {args.out}")
+    summary = generate(args.out, args.users, args.months, args.per_month, args.seed, args.workers,
+                       args.password, derived=not args.no_derived)
+    print(f"Done: {summary['expenses']:,} expenses for {summary['users']:,} users; "
+          f"loaded in {summary['load_seconds']}s, {summary['total_seconds']}s with indexes and derived tables")
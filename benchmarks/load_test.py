@@ -0,0 +1,277 @@
+"""
+Load test: concurrent dashboard and ask traffic through a real HTTP server
+Starts the fake LLM (benchmarks/fake_llm_server.py) and the app - uvicorn
+asgi:application, or Werkzeug's threaded server with --server wsgi - as
+separate processes, drives a weighted mix of requests from many users over
+HTTP and reports p50/p95/p99 latency per endpoint.
+
+    python -m benchmarks.load_test --duration 30 --concurrency 50
+    python -m benchmarks.load_test --rate 40 --mix dashboard=3,ask=1,expense=1 --llm-jitter 0.5
+    python -m benchmarks.load_test --db /tmp/finance_10m.db --users 1000 --provider huggingface \\
+        --llm-tokens 200 --llm-tokens-per-second 40 --llm-concurrency 16
+
+Closed loop by default: --concurrency clients each send their next request as
+soon as the previous one returns. With --rate, requests arrive on a Poisson
+schedule whatever the server is doing and latency is measured from the
+scheduled arrival, so queueing in the server is not hidden. Sessions are
+signed with SECRET_KEY instead of logging in (password hashing would dominate).
+With --db the expense writes go into that database.
+"""
+from collections import Counter, defaultdict
+from datetime import date
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import time
+
+from benchmarks.async_load import free_port, start_fake_llm, wait_for_port
+from benchmarks.fake_llm_server import add_arguments as add_llm_arguments
+
+ENDPOINTS = {
+    "dashboard": ("GET", "/dashboard", None),
+    "ask": ("POST", "/api/prompt/ask", {"prompt": "How should I invest my savings?"}),
+    "plan": ("POST", "/api/plan/monthly", {"prompt": "Plan my month"}),
+    "analysis": ("GET", "/api/analysis/full", None),
+    "expense": ("POST", "/api/expenses/add", {"category": "Food", "description": "Load test"}),
+}
+
+
+def parse_mix(text):
+    """"dashboard=3,ask=1" -> {"dashboard": 3.0, "ask": 1.0}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r} (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+# --- server side ---
+
+def serve(db_path, port, server):
+    """Child process: the app on 127.0.0.1:port against db_path"""
+    import memory.db
+    memory.db.DB_PATH = db_path
+    if server == "wsgi":
+        from werkzeug.serving import run_simple
+        from app import create_app
+        run_simple("127.0.0.1", port, create_app(), threaded=True)
+    else:
+        import uvicorn
+        from asgi import application
+        uvicorn.run(application, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def start_app(db_path, server, log_path):
+    """The app in its own process; its output goes to log_path"""
+    port = free_port()
+    with open(log_path, "w") as log:
+        process = subprocess.Popen([
+            sys.executable, "-m", "benchmarks.load_test", "--serve",
+            "--db", db_path, "--port", str(port), "--server", server
+        ], stdout=log, stderr=subprocess.STDOUT)
+    if not wait_for_port(port, timeout=60):
+        process.terminate()
+        raise RuntimeError(f"app server did not start (see {log_path})")
+    return process, f"http://127.0.0.1:{port}"
+
+
+def user_ids(db_path, count):
+    """The first `count` users that have a profile (so /dashboard renders)"""
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT user_id FROM user_profile ORDER BY user_id LIMIT ?", (count,)).fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+
+def session_cookie(user_id):
+    """A Flask session cookie for user_id, signed with SECRET_KEY like the app's own"""
+    from flask import Flask
+    signer = Flask(__name__)
+    signer.secret_key = os.environ["SECRET_KEY"]
+    value = signer.session_interface.get_signing_serializer(signer).dumps(
+        {"user_id": user_id, "username": f"user{user_id}"}
+    )
+    return f"{signer.config['SESSION_COOKIE_NAME']}={value}"
+
+
+# --- client side ---
+
+async def drive(base, users, mix, args):
+    """Returns {endpoint: {"latencies": [...], "statuses": Counter, "degraded": n}}"""
+    import aiohttp
+
+    rng = random.Random(args.seed)
+    cookies = {user_id: session_cookie(user_id) for user_id in users}
+    names, weights = list(mix), list(mix.values())
+    results = defaultdict(lambda: {"latencies": [], "statuses": Counter(), "degraded": 0})
+    loop = asyncio.get_running_loop()
+
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=0),
+        timeout=aiohttp.ClientTimeout(total=args.timeout),
+        cookie_jar=aiohttp.DummyCookieJar()
+    ) as http:
+        async def one(scheduled, measured):
+            name = rng.choices(names, weights)[0]
+            method, path, body = ENDPOINTS[name]
+            if name == "expense":
+                body = dict(body, amount=round(rng.uniform(50, 2000), 2), date=date.today().isoformat())
+            degraded = False
+            try:
+                async with http.request(method, base + path, json=body, allow_redirects=False,
+                                        headers={"Cookie": cookies[rng.choice(users)]}) as response:
+                    await response.read()
+                    status = response.status
+                    degraded = response.headers.get("X-Degraded") == "1"
+            except asyncio.TimeoutError:
+                status = "timeout"
+            except aiohttp.ClientError as e:
+                status = type(e).__name__
+            if measured:
+                result = results[name]
+                result["latencies"].append(loop.time() - scheduled)
+                result["statuses"][status] += 1
+                result["degraded"] += degraded
+
+        started = loop.time()
+        measure_from = started + args.warmup
+        end = measure_from + args.duration
+
+        if args.rate:
+            tasks = []
+            arrival = started
+            while True:
+                arrival += rng.expovariate(args.rate)
+                if arrival >= end:
+                    break
+                await asyncio.sleep(max(arrival - loop.time(), 0))
+                tasks.append(asyncio.create_task(one(arrival, arrival >= measure_from)))
+            await asyncio.gather(*tasks)
+        else:
+            async def client():
+                while loop.time() < end:
+                    sent = loop.time()
+                    await one(sent, sent >= measure_from)
+            await asyncio.gather(*(client() for _ in range(args.concurrency)))
+
+        extras = {}
+        for label, url, headers in [
+            ("llm", args.llm_url + "/_stats", {}),
+            ("admission", base + "/api/metrics/admission", {"Cookie": cookies[users[0]]}),
+        ]:
+            try:
+                async with http.get(url, headers=headers) as response:
+                    extras[label] = await response.json(content_type=None)
+            except Exception as e:
+                extras[label] = {"error": str(e)}
+
+    return results, extras
+
+
+def report(results, extras, duration):
+    print(f"{'endpoint':<10} {'requests':>8} {'req/s':>7} {'errors':>6} {'degraded':>8} "
+          f"{'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    summary = {}
+    for name in sorted(results):
+        result = results[name]
+        latencies = sorted(result["latencies"])
+        errors = sum(n for status, n in result["statuses"].items()
+                     if not isinstance(status, int) or status >= 400)
+        summary[name] = {
+            "requests": len(latencies),
+            "rps": len(latencies) / duration,
+            "errors": errors,
+            "degraded": result["degraded"],
+            "statuses": {str(status): n for status, n in result["statuses"].items()},
+            **{f"p{int(q * 100)}_ms": percentile(latencies, q) * 1000 for q in (0.50, 0.95, 0.99)},
+            "max_ms": latencies[-1] * 1000,
+        }
+        row = summary[name]
+        print(f"{name:<10} {row['requests']:>8} {row['rps']:>7.1f} {errors:>6} {row['degraded']:>8} "
+              f"{row['p50_ms']:>6.0f}ms {row['p95_ms']:>6.0f}ms {row['p99_ms']:>6.0f}ms {row['max_ms']:>6.0f}ms")
+        if errors:
+            print(f"{'':<10} statuses: {dict(result['statuses'])}")
+    print(f"fake LLM:  {extras.get('llm')}")
+    print(f"admission: {extras.get('admission')}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent dashboard/ask load against the app and a fake LLM")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--server", choices=["asgi", "wsgi"], default="asgi")
+    parser.add_argument("--db", help="run against this database (see benchmarks/generate_dataset.py)")
+    parser.add_argument("--users", type=int, default=50, help="distinct users sending traffic")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("dashboard=3,ask=1"),
+                        help=f"weighted endpoints, e.g. dashboard=3,ask=1,expense=1 ({', '.join(ENDPOINTS)})")
+    parser.add_argument("--concurrency", type=int, default=32, help="closed-loop clients")
+    parser.add_argument("--rate", type=float, default=None, help="open loop: mean arrivals per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds first")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--provider", choices=["ollama", "huggingface"], default="ollama",
+                        help="which API the app uses to reach the fake LLM")
+    parser.add_argument("--out", help="write the summary as JSON")
+    add_llm_arguments(parser, prefix="llm-")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.db, args.port, args.server)
+        return 0
+
+    os.environ.setdefault("SECRET_KEY", secrets.token_hex(16))
+    options = ["--seed", str(args.seed), "--jitter", str(args.llm_jitter), "--error-rate", str(args.llm_error_rate)]
+    for flag, value in [("--tokens", args.llm_tokens), ("--tokens-per-second", args.llm_tokens_per_second),
+                        ("--concurrency", args.llm_concurrency), ("--replay", args.llm_replay)]:
+        if value is not None:
+            options += [flag, str(value)]
+    llm_server, args.llm_url = start_fake_llm(args.llm_delay, *options)
+    os.environ["LLM_PROVIDER"] = args.provider
+    os.environ["OLLAMA_URL"] = args.llm_url
+    os.environ["HUGGINGFACE_API_URL"] = args.llm_url + "/models"
+    os.environ.setdefault("HUGGINGFACE_API_KEY", "fake")
+
+    app_server = None
+    try:
+        from benchmarks.fixtures import attach, prepare
+        fixture = attach(args.db, seed=args.seed) if args.db else prepare(seed=args.seed)
+        users = user_ids(fixture["db_path"], args.users)
+        log_path = os.path.join(fixture["dir"], "server.log")
+        app_server, base = start_app(fixture["db_path"], args.server, log_path)
+
+        mode = f"open loop {args.rate}/s" if args.rate else f"{args.concurrency} clients"
+        print(f"{args.server} server, {len(users)} users, {mode}, mix {args.mix}, "
+              f"fake {args.provider} delay {args.llm_delay}s, {args.duration:.0f}s measured")
+        results, extras = asyncio.run(drive(base, users, args.mix, args))
+        summary = report(results, extras, args.duration)
+        print(f"Server log: {log_path}")
+    finally:
+        for process in (app_server, llm_server):
+            if process is not None:
+                process.terminate()
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k not in ("serve", "port")},
+                       "generated": time.strftime("%Y-%m-%dT%H:%M:%S"), "endpoints": summary}, f, indent=2)
+        print(f"Summary written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+Benchmark suite
+Micro-benchmarks for every agent, utils/calculations.py and the LLM prompt
+helpers, plus end-to-end route benchmarks through Flask's test client. The LLM
+is held in rule-based mode, so nothing touches the network, and everything runs
+against the deterministic fixture in benchmarks/fixtures.py.
+
+    python -m benchmarks.run                                  # print a table
+    python -m benchmarks.run --filter route.                  # only matching names
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --threshold 0.3
+    python -m benchmarks.run --db /tmp/finance_10m.db --user-id 42   # generated dataset
+
+With --baseline the run exits 1 when any benchmark's median is more than
+--threshold (a fraction) slower than the baseline, so it can gate a release.
+Baselines are only comparable on the same machine.
+"""
+from datetime import date, datetime
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+# Writes go last so they don't change what the read benchmarks see
+WRITE_PREFIXES = ("agent.expense_tracker.add_expense", "route.expenses.add", "route.login")
+
+
+class Benchmark:
+    def __init__(self, name, func, setup=None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+
+
+def measure(bench, min_time=0.3, min_runs=5, max_runs=2000):
+    """Time bench.func (setup excluded) until min_time has elapsed; returns stats in ms"""
+    if bench.setup:
+        bench.setup()
+    bench.func()  # warm-up
+
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < min_runs or (time.perf_counter() - started < min_time and len(samples) < max_runs):
+        if bench.setup:
+            bench.setup()
+        t = time.perf_counter()
+        bench.func()
+        samples.append(time.perf_counter() - t)
+
+    samples.sort()
+    ms = lambda q: round(samples[min(int(q * len(samples)), len(samples) - 1)] * 1000, 4)
+    return {"runs": len(samples), "median_ms": ms(0.5), "p95_ms": ms(0.95), "min_ms": round(samples[0] * 1000, 4)}
+
+
+def calculation_benchmarks():
+    from utils import calculations as calc
+
+    rng = random.Random(7)
+    values = [rng.uniform(100, 5000) for _ in range(1000)]
+    monthly = values[:24]
+    prices = [100.0]
+    for _ in range(5000):
+        prices.append(prices[-1] * (1 + rng.gauss(0.0004, 0.01)))
+    cashflows = [(date(2020 + i // 12, i % 12 + 1, 1), -5000) for i in range(48)] + [(date(2024, 6, 1), 290000)]
+    cashflow_sets = [cashflows] * 100
+
+    return [
+        Benchmark("calc.savings_ratio", lambda: calc.savings_ratio(120000, 70000)),
+        Benchmark("calc.emi_ratio", lambda: calc.emi_ratio(120000, 15000)),
+        Benchmark("calc.emergency_runway", lambda: calc.emergency_runway(250000, 70000)),
+        Benchmark("calc.median.1000", lambda: calc.median(values)),
+        Benchmark("calc.percentile.1000", lambda: calc.percentile(values, 90)),
+        Benchmark("calc.linear_trend.24", lambda: calc.linear_trend(monthly)),
+        Benchmark("calc.xirr", lambda: calc.xirr(cashflows)),
+        Benchmark("calc.xirr_batch.100", lambda: calc.xirr_batch(cashflow_sets)),
+        Benchmark("calc.cagr", lambda: calc.cagr(100000, 180000, 5)),
+        Benchmark("calc.max_drawdown.5000", lambda: calc.max_drawdown(prices)),
+    ]
+
+
+def llm_benchmarks(state):
+    from llm.local_llm import llm
+
+    benches = []
+    for question_type in ("general", "investment", "savings", "debt"):
+        benches.append(Benchmark(f"llm.build_prompt.{question_type}",
+                                 lambda q=question_type: llm._build_prompt(state, q)))
+        benches.append(Benchmark(f"llm.rule_based_advice.{question_type}",
+                                 lambda q=question_type: llm._get_rule_based_advice(state, q)))
+    return benches
+
+
+def observe_recurring(pipeline, user_id):
+    """One incremental recurring-series update, rolled back so every call sees the same rows"""
+    from memory.db import get_connection
+
+    conn = get_connection()
+    try:
+        pipeline.recurring_agent.observe(conn.cursor(), user_id, "Housing", "Rent")
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def agent_benchmarks(fixture, pipeline):
+    from agents.market_advisor import MarketAdvisorAgent
+    from memory.category_stats import get_category_baselines
+    from memory.expense_series import expense_series
+
+    user_id = fixture["user_id"]
+    month = datetime.now().strftime("%Y-%m")
+    outputs, _ = pipeline.run(user_id, month)
+    state, risk, profile = outputs["state"], outputs["risk"], outputs["profile"]
+    user_context, critic = outputs["user_context"], outputs["critic"]
+    by_category = outputs["expense_summary"]["by_category"]
+    baselines = outputs["baselines"]
+    market = MarketAdvisorAgent()
+    expense_rng = random.Random(11)
+
+    return [
+        Benchmark("agent.expense_tracker.monthly_summary",
+                  lambda: pipeline.expense_agent.monthly_summary(user_id, month)),
+        Benchmark("agent.expense_tracker.get_detailed_expenses",
+                  lambda: pipeline.expense_agent.get_detailed_expenses(user_id, month)),
+        Benchmark("agent.anomaly_detector.recent_anomalies",
+                  lambda: pipeline.expense_agent.anomaly_detector.recent_anomalies(user_id)),
+        Benchmark("agent.risk_analyzer.run", lambda: pipeline.risk_agent.run(state)),
+        Benchmark("agent.critic.review", lambda: pipeline.critic_agent.review(state, risk)),
+        Benchmark("agent.budget_optimizer.suggest",
+                  lambda: pipeline.optimizer_agent.suggest(by_category, critic.get("confidence", 0),
+                                                           financial_context=state, baselines=baselines)),
+        Benchmark("agent.future_planner.plan",
+                  lambda: pipeline.future_agent.plan(state, [], user_context=user_context)),
+        Benchmark("agent.investment_advisor.analyze_portfolio",
+                  lambda: pipeline.investment_agent.analyze_portfolio(user_id, state)),
+        Benchmark("agent.investment_advisor.portfolio_fingerprint",
+                  lambda: pipeline.investment_agent.portfolio_fingerprint(user_id)),
+        Benchmark("agent.monthly_planner.create_monthly_plan",
+                  lambda: pipeline.monthly_planner.create_monthly_plan(user_id, "Plan my month")),
+        Benchmark("agent.market_advisor.get_market_condition", lambda: market.get_market_condition()),
+        Benchmark("agent.market_advisor.suggest_sip_plan",
+                  lambda: market.suggest_sip_plan(user_id, state, user_context)),
+        Benchmark("agent.market_advisor.backtest_sip_plan",
+                  lambda: market.backtest_sip_plan(20000, "moderate", 34, "intermediate", years=5)),
+        Benchmark("agent.recurring_detector.observe", lambda: observe_recurring(pipeline, user_id)),
+        Benchmark("agent.recurring_detector.forecast",
+                  lambda: pipeline.recurring_agent.forecast(user_id, month)),
+        Benchmark("agent.peer_benchmark.compare",
+                  lambda: pipeline.peer_agent.compare(profile, state["total_expenses"])),
+        Benchmark("agent.pipeline.run.cold", lambda: pipeline.run(user_id, month),
+                  setup=lambda: pipeline.invalidate(user_id)),
+        Benchmark("agent.pipeline.run.memoized", lambda: pipeline.run(user_id, month)),
+        Benchmark("memory.category_baselines", lambda: get_category_baselines(user_id, month)),
+        Benchmark("memory.expense_series.week", lambda: expense_series(user_id, "week", top_n=5)),
+        Benchmark("agent.expense_tracker.add_expense",
+                  lambda: pipeline.expense_agent.add_expense(
+                      user_id, "Food", round(expense_rng.uniform(150, 1500), 2), month, "Lunch")),
+    ]
+
+
+def route_benchmarks(fixture):
+    from app import app, dashboard_pipeline
+    from utils.http_cache import cache_clear
+
+    user_id = fixture["user_id"]
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+        session["username"] = fixture["username"]
+
+    def call(method, path, expect=200, **kwargs):
+        def run():
+            response = client.open(path, method=method, **kwargs)
+            assert response.status_code == expect, f"{method} {path}: {response.status_code}"
+        return run
+
+    def cold():
+        cache_clear()
+        dashboard_pipeline.invalidate(user_id)
+
+    login_ips = (f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(1, 10 ** 7))
+    anonymous = app.test_client()
+
+    def login():
+        response = anonymous.post("/login", data={"username": fixture["username"], "password": fixture["password"]},
+                                  environ_base={"REMOTE_ADDR": next(login_ips)})
+        assert response.status_code == 302, f"POST /login: {response.status_code}"
+
+    return [
+        Benchmark("route.dashboard.cold", call("GET", "/dashboard"), setup=cold),
+        Benchmark("route.dashboard.memoized", call("GET", "/dashboard"), setup=cache_clear),
+        Benchmark("route.dashboard.cached", call("GET", "/dashboard")),
+        Benchmark("route.analysis.full.cold", call("GET", "/api/analysis/full"), setup=cold),
+        Benchmark("route.analysis.full.cached", call("GET", "/api/analysis/full")),
+        Benchmark("route.investment.sip_plan.cold", call("GET", "/api/investment/sip-plan"), setup=cache_clear),
+        Benchmark("route.investment.backtest", call("GET", "/api/investment/backtest?years=5&amount=20000")),
+        Benchmark("route.benchmarks.peers", call("GET", "/api/benchmarks/peers")),
+        Benchmark("route.charts.expenses.month", call("GET", "/api/charts/expenses?granularity=month&start=2000-01"),
+                  setup=cache_clear),
+        Benchmark("route.charts.expenses.day", call("GET", "/api/charts/expenses?granularity=day"), setup=cache_clear),
+        Benchmark("route.plan.monthly", call("POST", "/api/plan/monthly", json={"prompt": "Plan my month"})),
+        Benchmark("route.prompt.ask", call("POST", "/api/prompt/ask", json={"prompt": "How should I invest?"})),
+        Benchmark("route.expenses.add", call("POST", "/api/expenses/add", json={"category": "Food", "amount": 250})),
+        Benchmark("route.login", login),
+    ]
+
+
+def build_suite(fixture):
+    from agents.pipeline import DashboardPipeline
+
+    pipeline = DashboardPipeline()
+    state = {"income": 120000, "total_expenses": 70000, "total_emi": 15000,
+             "emergency_fund": 250000, "age": 34, "risk_tolerance": "moderate"}
+    benches = calculation_benchmarks() + llm_benchmarks(state) + agent_benchmarks(fixture, pipeline) \
+        + route_benchmarks(fixture)
+    # Stable order, writes last
+    return sorted(benches, key=lambda b: b.name.startswith(WRITE_PREFIXES))
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """Benchmarks whose median regressed past the threshold: [(name, base_ms, now_ms, ratio)]"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        limit = base["median_ms"] * (1 + threshold)
+        if result["median_ms"] > limit and result["median_ms"] - base["median_ms"] > min_delta_ms:
+            regressions.append((name, base["median_ms"], result["median_ms"],
+                                result["median_ms"] / base["median_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Agent, calculation and route benchmarks")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.3, help="seconds spent timing each benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="benchmark against this database (see benchmarks/generate_dataset.py); "
+                                     "the write benchmarks add rows to it")
+    parser.add_argument("--user-id", type=int, default=1, help="user to benchmark with --db")
+    parser.add_argument("--password", default="password123", help="that user's password, for route.login")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--save-baseline", help="write results JSON here as the new baseline")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--threshold", type=float, default=0.3, help="allowed median slowdown (0.3 = 30%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="ignore slowdowns smaller than this, in ms (timer noise)")
+    args = parser.parse_args(argv)
+
+    from benchmarks.fixtures import attach, prepare
+    started = time.perf_counter()
+    if args.db:
+        fixture = attach(args.db, args.user_id, args.password, seed=args.seed)
+    else:
+        fixture = prepare(seed=args.seed)
+    print(f"Fixture ready in {time.perf_counter() - started:.1f}s ({fixture['dir']})")
+
+    from llm.local_llm import llm
+
+    results = {}
+    with llm.rule_based():
+        for bench in build_suite(fixture):
+            if args.filter not in bench.name:
+                continue
+            stats = measure(bench, min_time=args.min_time)
+            results[bench.name] = stats
+            print(f"{bench.name:<48} {stats['median_ms']:>10.3f}ms  p95 {stats['p95_ms']:>10.3f}ms  "
+                  f"({stats['runs']} runs)")
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "db": args.db,
+            "min_time": args.min_time
+        },
+        "results": results
+    }
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            print(f"Wrote {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        for name, base_ms, now_ms, ratio in regressions:
+            print(f"REGRESSION {name}: {base_ms:.3f}ms -> {now_ms:.3f}ms ({ratio:.2f}x)")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Serialization benchmark: response encoding time and bytes on the wire
+Fetches the full analysis, monthly plan and SIP plan payloads of the seeded
+benchmark user through the test client, then times encoding each one with the
+json module and with orjson (when installed), and sizes it raw, gzip and
+brotli (when installed) encoded:
+
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --fields risk,budget --repeat 500 --out serialization.json
+
+--fields applies the same selection as ?fields= before encoding.
+"""
+import argparse
+import json
+import os
+import secrets
+import statistics
+import sys
+import time
+
+ENDPOINTS = {
+    "analysis": ("GET", "/api/analysis/full", None),
+    "plan": ("POST", "/api/plan/monthly", {"prompt": "Plan my month and keep savings at 20%"}),
+    "sip": ("GET", "/api/investment/sip-plan", None),
+}
+
+
+def fetch_payloads(fixture):
+    """Each endpoint's decoded JSON body, uncompressed"""
+    from app import create_app
+    client = create_app().test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = fixture["user_id"]
+    payloads = {}
+    for name, (method, path, body) in ENDPOINTS.items():
+        response = client.open(path, method=method, json=body, headers={"Accept-Encoding": "identity"})
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}")
+        payloads[name] = response.get_json()
+    return payloads
+
+
+def timed(function, repeat):
+    """Median ms of `repeat` calls"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def measure(payload, repeat):
+    from utils import responses
+
+    encoders = {"json": lambda: json.dumps(payload, default=str, sort_keys=True, separators=(",", ":"),
+                                           ensure_ascii=False).encode()}
+    if responses.orjson is not None:
+        encoders["orjson"] = lambda: responses.orjson.dumps(payload, default=str,
+                                                            option=responses.orjson.OPT_SORT_KEYS)
+    body = responses.dumps(payload)
+    result = {name: timed(encode, repeat) for name, encode in encoders.items()}
+    result["raw_bytes"] = len(body)
+    result["gzip"] = timed(lambda: responses.compress(body, "gzip"), repeat)
+    result["gzip_bytes"] = len(responses.compress(body, "gzip"))
+    if responses.brotli is not None:
+        result["br"] = timed(lambda: responses.compress(body, "br"), repeat)
+        result["br_bytes"] = len(responses.compress(body, "br"))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON encoding and compression of API responses")
+    parser.add_argument("--fields", help="select fields first, as ?fields= does")
+    parser.add_argument("--repeat", type=int, default=200, help="encodings per measurement")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    from benchmarks.fixtures import prepare
+    os.environ.setdefault("SECRET_KEY", secrets.token_hex(16))
+    fixture = prepare()
+    payloads = fetch_payloads(fixture)
+
+    from utils.responses import apply_fields
+    results = {name: measure(apply_fields(payload, args.fields), args.repeat) for name, payload in payloads.items()}
+
+    columns = [column for column in ("json", "orjson", "gzip", "br") if column in next(iter(results.values()))]
+    print(f"medians of {args.repeat} encodings")
+    print(f"{'endpoint':<10} " + " ".join(f"{column + ' ms':>10}" for column in columns)
+          + f" {'raw B':>9} {'gzip B':>9}" + (f" {'br B':>9}" if "br" in columns else ""))
+    for name, result in results.items():
+        print(f"{name:<10} " + " ".join(f"{result[column]:>10.3f}" for column in columns)
+              + f" {result['raw_bytes']:>9} {result['gzip_bytes']:>9}"
+              + (f" {result['br_bytes']:>9}" if "br" in columns else ""))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"fields": args.fields, "repeat": args.repeat,
+                       "generated": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
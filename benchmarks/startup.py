@@ -0,0 +1,147 @@
+"""
+Startup benchmark: how long a fresh worker takes to serve its first request
+Each run is a new interpreter against the seeded fixture, with and without
+warm-up (WARM_UP / create_app(warm=True)):
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --server asgi --runs 3 --out startup.json
+
+In-process (default): times `import app`, create_app() and the first and
+second /dashboard requests through the test client. With --server, starts the
+real server (uvicorn or Werkzeug, as benchmarks/load_test.py does) and times
+process start to accepting connections, and to the first /dashboard response.
+"""
+import argparse
+import json
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+PHASES = {
+    "process": ["import", "create_app", "ready", "first_request", "second_request", "first_response"],
+    "asgi": ["ready", "first_request", "first_response"],
+    "wsgi": ["ready", "first_request", "first_response"],
+}
+
+
+def child(db_path, user_id, warm):
+    """One fresh interpreter: phase timings in ms as JSON on stdout"""
+    started = time.perf_counter()
+    import memory.db
+    memory.db.DB_PATH = db_path
+    import app as app_module
+    imported = time.perf_counter()
+    app = app_module.create_app(warm=warm)
+    ready = time.perf_counter()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+    timings = {}
+    for name in ("first_request", "second_request"):
+        before = time.perf_counter()
+        response = client.get("/dashboard")
+        timings[name] = (time.perf_counter() - before) * 1000
+        if response.status_code != 200:
+            raise RuntimeError(f"/dashboard returned {response.status_code}")
+    timings.update({
+        "import": (imported - started) * 1000,
+        "create_app": (ready - imported) * 1000,
+        "ready": (ready - started) * 1000,
+        "first_response": (ready - started) * 1000 + timings["first_request"],
+    })
+    print(json.dumps(timings))
+
+
+def run_child(fixture, warm):
+    output = subprocess.run([
+        sys.executable, "-m", "benchmarks.startup", "--child", "--db", fixture["db_path"],
+        "--user-id", str(fixture["user_id"])
+    ] + (["--warm"] if warm else []), capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_server(fixture, server, warm):
+    """Spawn to accepting connections, and to the first /dashboard response, in ms"""
+    from benchmarks.async_load import free_port
+    from benchmarks.load_test import session_cookie
+
+    port = free_port()
+    env = dict(os.environ, WARM_UP="1" if warm else "0")
+    started = time.perf_counter()
+    process = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.load_test", "--serve", "--db", fixture["db_path"],
+        "--port", str(port), "--server", server
+    ], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        import socket
+        deadline = started + 60
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                if time.perf_counter() > deadline or process.poll() is not None:
+                    raise RuntimeError(f"{server} server did not start")
+                time.sleep(0.005)
+        ready = time.perf_counter()
+        request = urllib.request.Request(f"http://127.0.0.1:{port}/dashboard",
+                                         headers={"Cookie": session_cookie(fixture["user_id"])})
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+        done = time.perf_counter()
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        "ready": (ready - started) * 1000,
+        "first_request": (done - ready) * 1000,
+        "first_response": (done - started) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start to first request, with and without warm-up")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--warm", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--user-id", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per configuration")
+    parser.add_argument("--server", choices=["asgi", "wsgi"], help="time a real server instead of the test client")
+    parser.add_argument("--out", help="write the medians as JSON")
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.db, args.user_id, args.warm)
+        return 0
+
+    from benchmarks.fixtures import prepare
+    os.environ.setdefault("SECRET_KEY", secrets.token_hex(16))
+    fixture = prepare()
+    mode = args.server or "process"
+    phases = PHASES[mode]
+    print(f"{mode}: {args.runs} runs per configuration, medians in ms")
+    print(f"{'warm-up':<8} " + " ".join(f"{phase:>15}" for phase in phases))
+
+    results = {}
+    for warm in (False, True):
+        runs = [run_server(fixture, args.server, warm) if args.server else run_child(fixture, warm)
+                for _ in range(args.runs)]
+        medians = {phase: statistics.median(run[phase] for run in runs) for phase in phases}
+        results["warm" if warm else "cold"] = medians
+        print(f"{'on' if warm else 'off':<8} " + " ".join(f"{medians[phase]:>15.1f}" for phase in phases))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"mode": mode, "runs": args.runs, "generated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "results": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+"""
+Rebuild peer-benchmark sketches for every (age band, income band) cohort
+Run periodically (e.g. nightly from cron); the web app only reads the results
+"""
+from agents.peer_benchmark import PeerBenchmarkAgent
+import time
+
+
+def build_peer_sketches():
+    started = time.perf_counter()
+    result = PeerBenchmarkAgent().rebuild()
+    elapsed = time.perf_counter() - started
+    print(f"Built {result['sketches']} sketches from {result['users']} users in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    build_peer_sketches()
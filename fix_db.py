@@ -2,6 +2,9 @@
 Fix database schema - add missing columns and update structure
 """
 from memory.db import get_connection
+from memory.category_stats import rebuild_category_stats
+from agents.anomaly_detector import rebuild_expense_stats
+from agents.recurring_detector import rebuild_recurring_series
 
 def fix_database():
     """Add missing columns to existing tables"""
@@ -77,6 +80,62 @@ def fix_database():
             cur.execute("ALTER TABLE expenses ADD COLUMN tags TEXT")
             print("Added tags column to expenses")
         
+        # Check investments table
+        cur.execute("PRAGMA table_info(investments)")
+        inv_columns = [row[1] for row in cur.fetchall()]
+        
+        if "units" not in inv_columns:
+            cur.execute("ALTER TABLE investments ADD COLUMN units REAL")
+            print("Added units column to investments")
+        
+        if "nav_series" not in inv_columns:
+            cur.execute("ALTER TABLE investments ADD COLUMN nav_series TEXT")
+            print("Added nav_series column to investments")
+        
+        if "valued_at" not in inv_columns:
+            cur.execute("ALTER TABLE investments ADD COLUMN valued_at TEXT")
+            print("Added valued_at column to investments")
+        
+        if "xirr" not in inv_columns:
+            cur.execute("ALTER TABLE investments ADD COLUMN xirr REAL")
+            print("Added xirr column to investments")
+        
+        # Snapshots stored before they were keyed by data version never match one,
+        # so they are rebuilt on the next dashboard view
+        cur.execute("PRAGMA table_info(dashboard_snapshots)")
+        snapshot_columns = [row[1] for row in cur.fetchall()]
+        
+        if snapshot_columns and "data_version" not in snapshot_columns:
+            cur.execute("ALTER TABLE dashboard_snapshots ADD COLUMN data_version TEXT NOT NULL DEFAULT ''")
+            print("Added data_version column to dashboard_snapshots")
+        
+        # Recurring series are matched on a stored key (filled in by the rebuild below);
+        # they used to be re-scanned per user and tracked in recurring_scans
+        cur.execute("PRAGMA table_info(recurring_series)")
+        series_columns = [row[1] for row in cur.fetchall()]
+        
+        if series_columns and "match_key" not in series_columns:
+            cur.execute("ALTER TABLE recurring_series ADD COLUMN match_key TEXT")
+            print("Added match_key column to recurring_series")
+        
+        cur.execute("DROP TABLE IF EXISTS recurring_scans")
+        
+        # Create any tables added since the database was initialized
+        with open("memory/schema.sql", "r") as f:
+            conn.executescript(f.read())
+        
+        # Backfill per-category daily and monthly totals and baselines
+        rebuild_category_stats(conn)
+        print("Rebuilt category daily and monthly totals and baselines")
+        
+        # Backfill running statistics used for anomaly detection
+        rebuild_expense_stats(conn)
+        print("Rebuilt expense anomaly statistics")
+        
+        # Backfill recurring series (new expenses update them as they are recorded)
+        rebuild_recurring_series(conn)
+        print("Rebuilt recurring expense series")
+        
         conn.commit()
         print("Database schema updated successfully!")
         
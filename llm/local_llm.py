@@ -5,11 +5,19 @@ Supports multiple free LLM options:
 2. Ollama (local, completely free)
 3. Fallback to rule-based responses
 """
+import asyncio
+import contextvars
+from contextlib import contextmanager
+import hashlib
 import os
 import json
-import requests
+import threading
+import time
 from typing import Dict, Any, Optional
 
+from utils.metrics import llm_advice, llm_errors, llm_request_duration
+from utils.tracing import span
+
 
 class FinancialLLM:
     """Wrapper for LLM services to provide financial advice"""
@@ -17,56 +25,95 @@ class FinancialLLM:
     def __init__(self):
         self.provider = os.getenv("LLM_PROVIDER", "huggingface")  # huggingface, ollama, or none
         self.hf_api_key = os.getenv("HUGGINGFACE_API_KEY", "")
+        self.hf_api_url = os.getenv("HUGGINGFACE_API_URL", "https://api-inference.huggingface.co/models").rstrip("/")
         self.ollama_url = os.getenv("OLLAMA_URL", "http://localhost:11434")
         self.model_name = os.getenv("LLM_MODEL", "mistralai/Mistral-7B-Instruct-v0.2")
+        self._async_sessions = {}
+    
+    def _huggingface_request(self, prompt: str):
+        """(url, headers, payload, timeout) for the Hugging Face Inference API"""
+        api_url = f"{self.hf_api_url}/{self.model_name}"
+        headers = {
+            "Authorization": f"Bearer {self.hf_api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "inputs": prompt,
+            "parameters": {
+                "max_new_tokens": 500,
+                "temperature": 0.7,
+                "return_full_text": False
+            }
+        }
+        return api_url, headers, payload, 30
+    
+    def _ollama_request(self, prompt: str):
+        """(url, headers, payload, timeout) for a local Ollama instance"""
+        payload = {
+            "model": "mistral",  # or llama2, codellama, etc.
+            "prompt": prompt,
+            "stream": False
+        }
+        return f"{self.ollama_url}/api/generate", {}, payload, 60
+    
+    def _parse_huggingface(self, result) -> str:
+        if isinstance(result, list) and len(result) > 0:
+            return result[0].get("generated_text", "")
+        return str(result)
+    
+    def _parse_ollama(self, result) -> str:
+        return result.get("response", "")
+    
+    def _record_call(self, provider: str, started: float, error: Optional[str] = None):
+        """Latency and failure metrics for one LLM HTTP call"""
+        llm_request_duration.observe(time.perf_counter() - started, provider, "error" if error else "ok")
+        if error:
+            llm_errors.inc(provider, error)
+    
+    @staticmethod
+    def _error_reason(e: Exception) -> str:
+        import requests
+        if isinstance(e, (requests.Timeout, asyncio.TimeoutError)):
+            return "timeout"
+        if isinstance(e, (requests.ConnectionError, ConnectionError)) or "Connect" in type(e).__name__:
+            return "connection"
+        return "exception"
     
     def _call_huggingface(self, prompt: str) -> str:
         """Call Hugging Face Inference API (free tier available)"""
         if not self.hf_api_key:
+            llm_errors.inc("huggingface", "no_api_key")
             return None
         
+        import requests  # imported on first use, not at startup
+        started = time.perf_counter()
         try:
-            api_url = f"https://api-inference.huggingface.co/models/{self.model_name}"
-            headers = {
-                "Authorization": f"Bearer {self.hf_api_key}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "inputs": prompt,
-                "parameters": {
-                    "max_new_tokens": 500,
-                    "temperature": 0.7,
-                    "return_full_text": False
-                }
-            }
-            
-            response = requests.post(api_url, headers=headers, json=payload, timeout=30)
+            api_url, headers, payload, timeout = self._huggingface_request(prompt)
+            response = requests.post(api_url, headers=headers, json=payload, timeout=timeout)
             if response.status_code == 200:
-                result = response.json()
-                if isinstance(result, list) and len(result) > 0:
-                    return result[0].get("generated_text", "")
-                return str(result)
+                self._record_call("huggingface", started)
+                return self._parse_huggingface(response.json())
+            self._record_call("huggingface", started, f"http_{response.status_code}")
             return None
         except Exception as e:
+            self._record_call("huggingface", started, self._error_reason(e))
             print(f"Hugging Face API error: {e}")
             return None
     
     def _call_ollama(self, prompt: str) -> str:
         """Call local Ollama instance"""
+        import requests
+        started = time.perf_counter()
         try:
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json={
-                    "model": "mistral",  # or llama2, codellama, etc.
-                    "prompt": prompt,
-                    "stream": False
-                },
-                timeout=60
-            )
+            url, headers, payload, timeout = self._ollama_request(prompt)
+            response = requests.post(url, json=payload, timeout=timeout)
             if response.status_code == 200:
-                return response.json().get("response", "")
+                self._record_call("ollama", started)
+                return self._parse_ollama(response.json())
+            self._record_call("ollama", started, f"http_{response.status_code}")
             return None
         except Exception as e:
+            self._record_call("ollama", started, self._error_reason(e))
             print(f"Ollama API error: {e}")
             return None
     
@@ -78,18 +125,108 @@ class FinancialLLM:
             context: User's financial data (income, expenses, savings, etc.)
             question_type: Type of advice needed (investment, savings, debt, planning)
         """
+        if _rule_based_only.get():
+            return self._finish_advice(None, context, question_type)
+        
+        # Inside run_deferred the call is recorded and answered later on the event loop
+        batch = _deferred_advice.get()
+        if batch is not None:
+            return batch.defer(context, question_type)
+        
         # Build comprehensive prompt
         prompt = self._build_prompt(context, question_type)
         
         # Try to get LLM response
         response = None
-        if self.provider == "huggingface":
-            response = self._call_huggingface(prompt)
-        elif self.provider == "ollama":
-            response = self._call_ollama(prompt)
+        with span("llm", provider=self.provider, question_type=question_type, prompt_chars=len(prompt)) as s:
+            if self.provider == "huggingface":
+                response = self._call_huggingface(prompt)
+            elif self.provider == "ollama":
+                response = self._call_ollama(prompt)
+            s.set(response_chars=len(response or ""), fallback=not response)
+        
+        return self._finish_advice(response, context, question_type)
+    
+    async def aget_financial_advice(self, context: Dict[str, Any], question_type: str = "general") -> str:
+        """Async get_financial_advice - waits on the LLM without holding a thread"""
+        if _rule_based_only.get():
+            return self._finish_advice(None, context, question_type)
+        
+        prompt = self._build_prompt(context, question_type)
+        
+        response = None
+        with span("llm", provider=self.provider, question_type=question_type, prompt_chars=len(prompt)) as s:
+            if self.provider == "huggingface" and self.hf_api_key:
+                response = await self._acall(
+                    self._huggingface_request(prompt), self._parse_huggingface, "Hugging Face"
+                )
+            elif self.provider == "ollama":
+                response = await self._acall(self._ollama_request(prompt), self._parse_ollama, "Ollama")
+            s.set(response_chars=len(response or ""), fallback=not response)
+        
+        return self._finish_advice(response, context, question_type)
+    
+    async def _acall(self, request, parse, label: str) -> Optional[str]:
+        url, headers, payload, timeout = request
+        started = time.perf_counter()
+        try:
+            async with self._async_session().post(url, headers=headers, json=payload, timeout=timeout) as response:
+                if response.status == 200:
+                    self._record_call(self.provider, started)
+                    return parse(await response.json(content_type=None))
+                self._record_call(self.provider, started, f"http_{response.status}")
+                return None
+        except Exception as e:
+            self._record_call(self.provider, started, self._error_reason(e))
+            print(f"{label} API error: {e}")
+            return None
+    
+    def warm_up(self):
+        """Load the configured provider's HTTP client now rather than on the first advice request"""
+        if self.provider in ("huggingface", "ollama"):
+            import requests  # noqa: F401
+    
+    def _async_session(self):
+        """One pooled aiohttp session per event loop (aiohttp is only needed for async serving)"""
+        import aiohttp
+        loop = asyncio.get_running_loop()
+        session = self._async_sessions.get(loop)
+        if session is None or session.closed:
+            # No cap on connections - each waiting request costs a socket, not a thread
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+            self._async_sessions[loop] = session
+        return session
+    
+    @contextmanager
+    def rule_based(self):
+        """Answer every advice request in the block with the rule-based fallback (load shedding)"""
+        token = _rule_based_only.set(True)
+        try:
+            yield
+        finally:
+            _rule_based_only.reset(token)
+    
+    def rule_based_active(self) -> bool:
+        return _rule_based_only.get()
+    
+    async def aclose(self):
+        """Close the running loop's HTTP session (call on server shutdown)"""
+        session = self._async_sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+    
+    def _finish_advice(self, response: Optional[str], context: Dict[str, Any], question_type: str) -> str:
+        usable = bool(response) and len(response.strip()) >= 10
+        if _rule_based_only.get():
+            source = "shed"
+        elif self.provider not in ("huggingface", "ollama"):
+            source = "rule_based"
+        else:
+            source = "llm" if usable else "fallback"
+        llm_advice.inc(self.provider, source)
         
         # Fallback to rule-based advice if LLM fails
-        if not response or len(response.strip()) < 10:
+        if not usable:
             response = self._get_rule_based_advice(context, question_type)
         
         return response.strip()
@@ -180,6 +317,67 @@ Advice:"""
         return " ".join(advice_parts) if advice_parts else "Review your financial goals and create a monthly budget plan."
 
 
+class AdviceBatch:
+    """
+    LLM calls recorded while a sync agent runs under run_deferred.
+    Each call returns a placeholder that resolve() swaps for the real advice.
+    """
+    
+    def __init__(self):
+        self.requests = {}
+        self._lock = threading.Lock()
+    
+    def defer(self, context: Dict[str, Any], question_type: str) -> str:
+        text = json.dumps([context, question_type], sort_keys=True, default=str)
+        placeholder = f"\x00advice:{hashlib.sha1(text.encode('utf-8')).hexdigest()}\x00"
+        with self._lock:
+            self.requests.setdefault(placeholder, (context, question_type))
+        return placeholder
+    
+    def resolve(self, value, answers: Dict[str, str]):
+        """Replace placeholders anywhere in a result of dicts/lists/strings"""
+        if isinstance(value, str):
+            return answers.get(value, value)
+        if isinstance(value, dict):
+            return {k: self.resolve(v, answers) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return type(value)(self.resolve(v, answers) for v in value)
+        return value
+
+
+_deferred_advice = contextvars.ContextVar("deferred_advice", default=None)
+_rule_based_only = contextvars.ContextVar("rule_based_only", default=False)
+
+
+async def run_deferred(func, *args, **kwargs):
+    """
+    Async version of any sync agent entry point: the agent's DB and CPU work
+    runs on a worker thread with its LLM calls deferred, then every recorded
+    LLM call is awaited concurrently on the event loop.
+    """
+    from memory.db import run_in_db_thread
+    
+    batch = AdviceBatch()
+    
+    def call():
+        token = _deferred_advice.set(batch)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _deferred_advice.reset(token)
+    
+    # Carry the caller's context (e.g. rule-based mode) into the worker thread
+    result = await run_in_db_thread(contextvars.copy_context().run, call)
+    if not batch.requests:
+        return result
+    
+    placeholders = list(batch.requests)
+    advice = await asyncio.gather(*(
+        llm.aget_financial_advice(*batch.requests[p]) for p in placeholders
+    ))
+    return batch.resolve(result, dict(zip(placeholders, advice)))
+
+
 # Global instance
 llm = FinancialLLM()
 
@@ -0,0 +1,155 @@
+"""
+Per-category spending baselines
+Daily and monthly category totals are kept up to date as expenses are recorded,
+and each (user, category) baseline is derived from those totals - never from raw
+expense rows. The daily totals also back the chart series (memory/expense_series.py).
+"""
+from datetime import datetime
+from memory.db import get_connection
+from utils.calculations import median, percentile, linear_trend
+
+# Number of past months a baseline looks back over
+BASELINE_WINDOW = 12
+
+
+def record_expense(cur, user_id, category, month, amount, day=None):
+    """
+    Fold a new expense into the daily and monthly category totals.
+    Runs on the caller's cursor so it commits with the expense itself.
+    """
+    if day:
+        cur.execute("""
+            INSERT INTO category_daily_totals (user_id, category, day, total, transaction_count)
+            VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT (user_id, day, category)
+            DO UPDATE SET total = total + excluded.total,
+                          transaction_count = transaction_count + 1
+        """, (user_id, category, day[:10], amount))
+
+    cur.execute("""
+        INSERT INTO category_monthly_totals (user_id, category, month, total, transaction_count)
+        VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT (user_id, category, month)
+        DO UPDATE SET total = total + excluded.total,
+                      transaction_count = transaction_count + 1
+    """, (user_id, category, month, amount))
+
+    # An empty as_of_month marks the baseline as stale; it is rebuilt on next read
+    if month < datetime.now().strftime("%Y-%m"):
+        cur.execute("""
+            INSERT INTO category_baselines (user_id, category, as_of_month) VALUES (?, ?, '')
+            ON CONFLICT (user_id, category) DO UPDATE SET as_of_month = ''
+        """, (user_id, category))
+    else:
+        cur.execute("""
+            INSERT OR IGNORE INTO category_baselines (user_id, category, as_of_month)
+            VALUES (?, ?, '')
+        """, (user_id, category))
+
+
+def _month_index(month):
+    """"YYYY-MM" -> months since year 0, for counting calendar months"""
+    year, number = month[:7].split("-")
+    return int(year) * 12 + int(number) - 1
+
+
+def _refresh_baseline(cur, user_id, category, month):
+    """
+    Recompute one baseline over the calendar months since the first spend in
+    the category (at most BASELINE_WINDOW); months without spending count as 0.
+    """
+    cur.execute("""
+        SELECT month, total FROM category_monthly_totals
+        WHERE user_id = ? AND category = ? AND month < ?
+        ORDER BY month DESC LIMIT ?
+    """, (user_id, category, month, BASELINE_WINDOW))
+    by_month = {_month_index(row["month"]): row["total"] for row in cur.fetchall()}
+    end = _month_index(month)
+    start = max(min(by_month), end - BASELINE_WINDOW) if by_month else end
+    totals = [by_month.get(index, 0) for index in range(start, end)]
+
+    baseline = {
+        "months_observed": len(totals),
+        "median": round(float(median(totals)), 2),
+        "p25": round(float(percentile(totals, 25)), 2),
+        "p75": round(float(percentile(totals, 75)), 2),
+        "p90": round(float(percentile(totals, 90)), 2),
+        "trend": round(float(linear_trend(totals)), 2)
+    }
+    cur.execute("""
+        UPDATE category_baselines
+        SET as_of_month = ?, months_observed = ?, median = ?, p25 = ?, p75 = ?,
+            p90 = ?, trend = ?, updated_at = ?
+        WHERE user_id = ? AND category = ?
+    """, (month, baseline["months_observed"], baseline["median"], baseline["p25"],
+          baseline["p75"], baseline["p90"], baseline["trend"],
+          datetime.utcnow().isoformat(), user_id, category))
+    return baseline
+
+
+def get_category_baselines(user_id, month):
+    """
+    Get baselines for every category the user has spent in, relative to `month`.
+    Reads one row per category; only baselines that are stale for `month`
+    (first read after a month rollover or a back-dated expense) are rebuilt.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute("""
+            SELECT category, as_of_month, months_observed, median, p25, p75, p90, trend
+            FROM category_baselines WHERE user_id = ?
+        """, (user_id,))
+        rows = cur.fetchall()
+
+        baselines = {}
+        refreshed = False
+        for row in rows:
+            if row["as_of_month"] == month:
+                baselines[row["category"]] = {
+                    "months_observed": row["months_observed"],
+                    "median": row["median"],
+                    "p25": row["p25"],
+                    "p75": row["p75"],
+                    "p90": row["p90"],
+                    "trend": row["trend"]
+                }
+            else:
+                baselines[row["category"]] = _refresh_baseline(cur, user_id, row["category"], month)
+                refreshed = True
+
+        if refreshed:
+            conn.commit()
+        return baselines
+    except Exception as e:
+        print(f"Error getting category baselines: {e}")
+        return {}
+    finally:
+        conn.close()
+
+
+def rebuild_category_stats(conn):
+    """Backfill daily and monthly totals and baselines from existing expense rows"""
+    cur = conn.cursor()
+    cur.execute("DELETE FROM category_daily_totals")
+    cur.execute("""
+        INSERT INTO category_daily_totals (user_id, category, day, total, transaction_count)
+        SELECT user_id, category, substr(date, 1, 10), SUM(amount), COUNT(*)
+        FROM expenses
+        WHERE user_id IS NOT NULL AND category IS NOT NULL AND date IS NOT NULL
+        GROUP BY user_id, category, substr(date, 1, 10)
+    """)
+    cur.execute("DELETE FROM category_monthly_totals")
+    cur.execute("""
+        INSERT INTO category_monthly_totals (user_id, category, month, total, transaction_count)
+        SELECT user_id, category, month, SUM(amount), COUNT(*)
+        FROM expenses
+        WHERE user_id IS NOT NULL AND category IS NOT NULL AND month IS NOT NULL
+        GROUP BY user_id, category, month
+    """)
+    cur.execute("DELETE FROM category_baselines")
+    cur.execute("""
+        INSERT INTO category_baselines (user_id, category, as_of_month)
+        SELECT DISTINCT user_id, category, '' FROM category_monthly_totals
+    """)
@@ -1,9 +1,227 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import re
 import sqlite3
+import time
+
+from utils import metrics
+from utils.logs import json_logger, log_event
+from utils.metrics import METRICS, registry
+from utils.tracing import TRACING, current_trace, statement
 
 DB_PATH = "memory/finance.db"
 
+# Worker threads for SQLite work from async code (asgi.py)
+ASYNC_DB_THREADS = int(os.getenv("ASYNC_DB_THREADS", "16"))
+# Statements slower than this are logged with their query plan (0 = off)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# Warn when one request runs the same statement shape this many times (0 = off)
+QUERY_REPEAT_WARN = int(os.getenv("QUERY_REPEAT_WARN", "3"))
+
+# Cached statement shapes / query plans before the caches are reset
+SHAPE_CACHE_SIZE = 1024
+PLAN_CACHE_SIZE = 256
+
+_db_executor = None
+
+logger = json_logger("finance.db")
+
+
+# --- statement shapes ---
+
+_shapes = {}
+_plans = {}
+_reported = set()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_PROJECTION = re.compile(r"^SELECT\s+.*?\s+FROM\b", re.IGNORECASE | re.DOTALL)
+
+
+def query_shape(sql):
+    """
+    A statement with its literals, IN lists and SELECT column list folded away,
+    so the same lookup written with different values or columns counts as one
+    """
+    shape = _shapes.get(sql)
+    if shape is None:
+        shape = " ".join(sql.split())
+        shape = _STRING.sub("?", shape)
+        shape = _NUMBER.sub("?", shape)
+        shape = _IN_LIST.sub("IN (...)", shape)
+        shape = _PROJECTION.sub("SELECT ... FROM", shape)
+        if len(_shapes) >= SHAPE_CACHE_SIZE:
+            _shapes.clear()
+        _shapes[sql] = shape
+    return shape
+
+
+class QueryTally:
+    """Statements run while serving one request"""
+    __slots__ = ("route", "queries", "seconds", "shapes")
+
+    def __init__(self, route):
+        self.route = route
+        self.queries = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def add(self, sql, seconds):
+        self.queries += 1
+        self.seconds += seconds
+        if QUERY_REPEAT_WARN:
+            self.shapes[query_shape(sql)] += 1
+
+
+# Tally for the request being served; copied into DB worker threads with the context
+request_queries = ContextVar("request_queries", default=None)
+
+
+def begin_request(route):
+    """Start counting statements for a request; pass the result to end_request()"""
+    if not (METRICS or QUERY_REPEAT_WARN):
+        return None
+    return request_queries.set(QueryTally(route))
+
+
+def end_request(token):
+    """Record the request's statement count and time, and flag repeated statement shapes"""
+    if token is None:
+        return
+    tally = request_queries.get()
+    try:
+        request_queries.reset(token)
+    except ValueError:
+        request_queries.set(None)  # finished from another context
+    if tally is None:
+        return
+    if METRICS:
+        metrics.db_queries_per_request.observe(tally.queries, tally.route)
+        metrics.db_seconds_per_request.observe(tally.seconds, tally.route)
+    if QUERY_REPEAT_WARN:
+        for shape, count in tally.shapes.items():
+            if count < QUERY_REPEAT_WARN:
+                continue
+            metrics.db_repeated_queries.inc(tally.route)
+            # Each route/shape pair is logged once per process; the counter keeps counting
+            if (tally.route, shape) not in _reported:
+                _reported.add((tally.route, shape))
+                log_event(logger, "repeated_query", logging.WARNING, route=tally.route, count=count,
+                          queries=tally.queries, sql=shape)
+
+
+def _explain(connection, sql, parameters):
+    """EXPLAIN QUERY PLAN rows as text, cached per statement shape"""
+    shape = query_shape(sql)
+    plan = _plans.get(shape)
+    if plan is None:
+        try:
+            rows = connection.cursor(sqlite3.Cursor).execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+            plan = [row[-1] for row in rows]
+        except sqlite3.Error as e:
+            plan = [f"unavailable: {e}"]
+        if len(_plans) >= PLAN_CACHE_SIZE:
+            _plans.clear()
+        _plans[shape] = plan
+    return plan
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Times each statement: counts it towards the current request (see
+    begin_request), records a "db" span while a trace is active and logs it
+    with its query plan when slower than SLOW_QUERY_MS
+    """
+
+    def _timed(self, run, sql, parameters, attrs):
+        tally, trace = request_queries.get(), current_trace()
+        if tally is None and trace is None and not SLOW_QUERY_MS:
+            return run()
+        started = time.perf_counter()
+        if trace is None:
+            run()
+        else:
+            with trace.span("db", sql=statement(sql), **attrs) as s:
+                run()
+                if self.rowcount >= 0:
+                    s.set(rows=self.rowcount)
+        elapsed = time.perf_counter() - started
+        if tally is not None:
+            tally.add(sql, elapsed)
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+            self._log_slow(sql, parameters, attrs, elapsed, tally, trace)
+        return self
+
+    def _log_slow(self, sql, parameters, attrs, elapsed, tally, trace):
+        try:
+            shape = statement(sql) if "script" in attrs else query_shape(sql)
+            fields = {"duration_ms": round(elapsed * 1000, 3), "sql": shape, **attrs}
+            if tally is not None:
+                fields["route"] = tally.route
+            if trace is not None:
+                fields["trace_id"] = trace.id
+            if not attrs:  # a single statement: its parameters are at hand
+                fields["plan"] = _explain(self.connection, sql, parameters)
+            log_event(logger, "slow_query", logging.WARNING, **fields)
+        except Exception as e:
+            print(f"Error logging slow query: {e}")
+
+    def execute(self, sql, parameters=()):
+        return self._timed(lambda: super(InstrumentedCursor, self).execute(sql, parameters),
+                           sql, parameters, {})
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(lambda: super(InstrumentedCursor, self).executemany(sql, seq_of_parameters),
+                           sql, None, {"many": True})
+
+    def executescript(self, script):
+        return self._timed(lambda: super(InstrumentedCursor, self).executescript(script),
+                           script, None, {"script": True})
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (and conn.execute shortcuts) are InstrumentedCursors"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
 
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
+    # Instrumented only when something reads the timings
+    instrumented = METRICS or TRACING or SLOW_QUERY_MS or QUERY_REPEAT_WARN
+    factory = InstrumentedConnection if instrumented else sqlite3.Connection
+    conn = sqlite3.connect(DB_PATH, factory=factory)
     conn.row_factory = sqlite3.Row
     return conn
+
+
+async def run_in_db_thread(func, *args):
+    """Run blocking database code on the bounded DB thread pool, in the caller's context"""
+    global _db_executor
+    if _db_executor is None:
+        _db_executor = ThreadPoolExecutor(ASYNC_DB_THREADS, thread_name_prefix="db")
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args)
+    return await loop.run_in_executor(_db_executor, call)
+
+
+registry.callback(
+    "finance_db_pool_queue", "SQLite jobs waiting for a DB thread (async mode)",
+    lambda: _db_executor._work_queue.qsize() if _db_executor else 0
+)
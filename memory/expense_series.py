@@ -0,0 +1,155 @@
+"""
+Bucketed expense series for charts
+Daily, weekly and monthly per-category totals read from the materialized
+category_daily_totals table (primary-key range scans), never from raw expense
+rows. Every granularity buckets on the expense date, so an expense lands in the
+same period whichever view shows it (the stored `month` can disagree with it).
+The top-N categories get their own series and the rest are folded into "Other",
+so a multi-year view stays a few KB.
+"""
+from datetime import date, datetime, timedelta
+
+from memory.db import get_connection
+
+GRANULARITIES = ("day", "week", "month")
+
+# Default window when no start is given, in buckets
+DEFAULT_SPAN = {"day": 30, "week": 26, "month": 12}
+
+# Largest window served in one response (about 3 years of days)
+MAX_BUCKETS = 1100
+
+MAX_TOP_N = 12
+
+
+def _month_start(value):
+    return datetime.strptime(value[:7], "%Y-%m").date()
+
+
+def _add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _align(day, granularity):
+    """First day of the bucket containing `day`"""
+    if granularity == "month":
+        return day.replace(day=1)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def _step(day, granularity, count=1):
+    if granularity == "month":
+        return _add_months(day, count)
+    return day + timedelta(days=count * (7 if granularity == "week" else 1))
+
+
+def _label(day, granularity):
+    return day.strftime("%Y-%m") if granularity == "month" else day.isoformat()
+
+
+def _parse(value, granularity):
+    if granularity == "month":
+        return _month_start(value)
+    return datetime.strptime(value[:10], "%Y-%m-%d").date()
+
+
+def bucket_range(granularity, start=None, end=None):
+    """Bucket start dates from start to end inclusive; raises ValueError on bad input"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+    last = _align(_parse(end, granularity) if end else date.today(), granularity)
+    if start:
+        first = _align(_parse(start, granularity), granularity)
+    else:
+        first = _step(last, granularity, 1 - DEFAULT_SPAN[granularity])
+    if first > last:
+        raise ValueError("start is after end")
+
+    buckets = []
+    day = first
+    while day <= last:
+        buckets.append(day)
+        if len(buckets) > MAX_BUCKETS:
+            raise ValueError(f"range spans more than {MAX_BUCKETS} {granularity} buckets")
+        day = _step(day, granularity)
+    return buckets
+
+
+def _rows(cur, user_id, granularity, first, after_last):
+    """(bucket label, category, total) rows for [first, after_last)"""
+    if granularity == "month":
+        cur.execute("""
+            SELECT substr(day, 1, 7) AS bucket, category, SUM(total) AS total
+            FROM category_daily_totals
+            WHERE user_id = ? AND day >= ? AND day < ?
+            GROUP BY bucket, category
+        """, (user_id, first.isoformat(), after_last.isoformat()))
+    elif granularity == "week":
+        # Monday of each day's week
+        cur.execute("""
+            SELECT date(day, '-' || ((CAST(strftime('%w', day) AS INTEGER) + 6) % 7) || ' days') AS bucket,
+                   category, SUM(total) AS total
+            FROM category_daily_totals
+            WHERE user_id = ? AND day >= ? AND day < ?
+            GROUP BY bucket, category
+        """, (user_id, first.isoformat(), after_last.isoformat()))
+    else:
+        cur.execute("""
+            SELECT day AS bucket, category, total FROM category_daily_totals
+            WHERE user_id = ? AND day >= ? AND day < ?
+        """, (user_id, first.isoformat(), after_last.isoformat()))
+    return cur.fetchall()
+
+
+def expense_series(user_id, granularity="month", start=None, end=None, top_n=5, categories=None):
+    """
+    Per-category spend per bucket, top `top_n` categories plus "Other".
+    Passing `categories` pins the named series (used when a chart fetches only
+    new buckets and must keep the grouping it already drew).
+    """
+    buckets = bucket_range(granularity, start, end)
+    top_n = min(max(int(top_n), 1), MAX_TOP_N)
+    labels = [_label(day, granularity) for day in buckets]
+    position = {label: i for i, label in enumerate(labels)}
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        rows = _rows(cur, user_id, granularity, buckets[0], _step(buckets[-1], granularity))
+    finally:
+        conn.close()
+
+    totals = {}
+    for row in rows:
+        totals[row["category"]] = totals.get(row["category"], 0) + row["total"]
+
+    if categories:
+        named = [c for c in categories if c != "Other"][:MAX_TOP_N]
+    else:
+        named = sorted(totals, key=totals.get, reverse=True)[:top_n]
+    index = {category: i for i, category in enumerate(named)}
+
+    values = [[0.0] * len(labels) for _ in range(len(named) + 1)]
+    for row in rows:
+        i = position.get(row["bucket"])
+        if i is not None:
+            values[index.get(row["category"], len(named))][i] += row["total"]
+
+    series = [
+        {"category": category, "values": [round(v, 2) for v in values[i]]}
+        for i, category in enumerate(named)
+    ]
+    if any(values[-1]):
+        series.append({"category": "Other", "values": [round(v, 2) for v in values[-1]]})
+
+    return {
+        "granularity": granularity,
+        "start": labels[0],
+        "end": labels[-1],
+        "buckets": labels,
+        "series": series
+    }
@@ -57,6 +57,10 @@ CREATE TABLE IF NOT EXISTS investments (
     expected_return REAL,
     risk_level TEXT,
     notes TEXT,
+    units REAL,
+    nav_series TEXT,
+    valued_at TEXT,
+    xirr REAL,
     created_at TEXT DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
@@ -70,3 +74,131 @@ CREATE TABLE IF NOT EXISTS risk_reports (
     created_at TEXT DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
+
+CREATE TABLE IF NOT EXISTS category_monthly_totals (
+    user_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    month TEXT NOT NULL,
+    total REAL DEFAULT 0,
+    transaction_count INTEGER DEFAULT 0,
+    PRIMARY KEY (user_id, category, month),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS category_daily_totals (
+    user_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    day TEXT NOT NULL,
+    total REAL DEFAULT 0,
+    transaction_count INTEGER DEFAULT 0,
+    PRIMARY KEY (user_id, day, category),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS category_baselines (
+    user_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    as_of_month TEXT NOT NULL,
+    months_observed INTEGER DEFAULT 0,
+    median REAL DEFAULT 0,
+    p25 REAL DEFAULT 0,
+    p75 REAL DEFAULT 0,
+    p90 REAL DEFAULT 0,
+    trend REAL DEFAULT 0,
+    updated_at TEXT,
+    PRIMARY KEY (user_id, category),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS expense_stats (
+    user_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    count INTEGER DEFAULT 0,
+    mean REAL DEFAULT 0,
+    m2 REAL DEFAULT 0,
+    recent TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (user_id, category),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS expense_anomalies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    expense_id INTEGER,
+    category TEXT,
+    amount REAL,
+    anomaly_type TEXT,
+    score REAL,
+    message TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (expense_id) REFERENCES expenses(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_expense_anomalies_user ON expense_anomalies(user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS recurring_series (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    category TEXT,
+    description TEXT,
+    match_key TEXT,
+    amount REAL,
+    cadence TEXT,
+    period_days INTEGER,
+    occurrences INTEGER,
+    last_date TEXT,
+    next_date TEXT,
+    source TEXT,
+    updated_at TEXT,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_recurring_series_user ON recurring_series(user_id);
+CREATE INDEX IF NOT EXISTS idx_expenses_user_month ON expenses(user_id, month);
+
+CREATE TABLE IF NOT EXISTS portfolio_returns (
+    user_id INTEGER PRIMARY KEY,
+    invested REAL,
+    current_value REAL,
+    xirr REAL,
+    cagr REAL,
+    valued_at TEXT,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS peer_sketches (
+    cohort TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    sketch TEXT NOT NULL,
+    population INTEGER,
+    built_at TEXT,
+    PRIMARY KEY (cohort, metric)
+);
+
+CREATE TABLE IF NOT EXISTS data_versions (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS dashboard_snapshots (
+    user_id INTEGER PRIMARY KEY,
+    month TEXT NOT NULL,
+    data_version TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    built_at TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS precompute_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    month TEXT NOT NULL,
+    last_user_id INTEGER DEFAULT 0,
+    users_done INTEGER DEFAULT 0,
+    errors INTEGER DEFAULT 0,
+    started_at TEXT,
+    updated_at TEXT,
+    finished_at TEXT
+);
@@ -0,0 +1,54 @@
+"""
+Precomputed dashboard snapshots
+precompute_dashboards.py stores each user's finished dashboard payload here;
+/dashboard serves it while it is fresh. Each snapshot records the user's data
+version read before it was built, so any later write makes it stale.
+"""
+from datetime import datetime, timedelta
+import json
+import os
+
+from memory.db import get_connection
+
+# Snapshots older than this are ignored and the dashboard is computed live
+SNAPSHOT_MAX_AGE_HOURS = float(os.getenv("DASHBOARD_SNAPSHOT_MAX_AGE_HOURS", "24"))
+
+
+def save_snapshots(cur, month, payloads):
+    """Upsert (user_id, data_version, payload dict) triples built for `month`"""
+    now = datetime.utcnow().isoformat()
+    cur.executemany("""
+        INSERT INTO dashboard_snapshots (user_id, month, data_version, payload, built_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET month = excluded.month,
+            data_version = excluded.data_version, payload = excluded.payload,
+            built_at = excluded.built_at
+    """, [
+        (user_id, month, version, json.dumps(payload, default=str), now)
+        for user_id, version, payload in payloads
+    ])
+
+
+def load_snapshot(user_id, month, data_version):
+    """
+    The user's payload if it was built for `month` at `data_version`
+    within the max age, else None
+    """
+    conn = get_connection()
+
+    try:
+        row = conn.execute(
+            "SELECT month, data_version, payload, built_at FROM dashboard_snapshots WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        if not row or row["month"] != month or row["data_version"] != data_version:
+            return None
+        built_at = datetime.fromisoformat(row["built_at"])
+        if datetime.utcnow() - built_at > timedelta(hours=SNAPSHOT_MAX_AGE_HOURS):
+            return None
+        return json.loads(row["payload"])
+    except Exception as e:
+        print(f"Error loading dashboard snapshot: {e}")
+        return None
+    finally:
+        conn.close()
@@ -0,0 +1,36 @@
+"""
+Per-user data versions
+Every write path bumps the user's counter in the same transaction as the write,
+so anything derived from a user's data (dashboard snapshots, HTTP caches) can be
+keyed on the version and goes stale in every worker process at once.
+Row 0 is a global version, bumped by batch jobs that change every user's view.
+"""
+from datetime import datetime
+
+from memory.db import get_connection
+
+GLOBAL_VERSION = 0
+
+
+def bump_data_version(cur, user_id=GLOBAL_VERSION):
+    """Increment a user's (or the global) version; call inside the write's transaction"""
+    cur.execute("""
+        INSERT INTO data_versions (user_id, version, updated_at) VALUES (?, 1, ?)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1,
+            updated_at = excluded.updated_at
+    """, (user_id, datetime.utcnow().isoformat()))
+
+
+def get_data_version(user_id):
+    """Current version of everything a user sees, as "<user>.<global>" """
+    conn = get_connection()
+
+    try:
+        rows = conn.execute(
+            "SELECT user_id, version FROM data_versions WHERE user_id IN (?, ?)",
+            (user_id, GLOBAL_VERSION)
+        ).fetchall()
+        versions = {row["user_id"]: row["version"] for row in rows}
+        return f"{versions.get(user_id, 0)}.{versions.get(GLOBAL_VERSION, 0)}"
+    finally:
+        conn.close()
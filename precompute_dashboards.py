@@ -0,0 +1,130 @@
+"""
+Precompute every user's dashboard into dashboard_snapshots
+Run nightly after revalue_investments.py and build_peer_sketches.py so morning
+dashboard loads are served from snapshots. Users are processed in chunks on a
+process pool; each finished chunk is saved together with a checkpoint, so an
+interrupted run continues where it stopped with --resume.
+"""
+from datetime import datetime
+from multiprocessing import Pool
+import argparse
+import os
+import time
+
+from memory.db import get_connection
+from memory.snapshots import save_snapshots
+from memory.versions import get_data_version
+
+CHUNK_SIZE = 200
+
+# One pipeline per worker process, created by the pool initializer
+_pipeline = None
+
+
+def _init_worker():
+    global _pipeline
+    from agents.pipeline import DashboardPipeline
+    _pipeline = DashboardPipeline()
+
+
+def _build_chunk(task):
+    """Build the payloads for one chunk of user ids (runs in a worker)"""
+    month, user_ids = task
+    payloads = []
+    errors = 0
+    for user_id in user_ids:
+        try:
+            # Read the version first so a write during the build leaves the snapshot stale
+            version = get_data_version(user_id)
+            payload, _ = _pipeline.dashboard_payload(user_id, month)
+            if payload is not None:
+                payloads.append((user_id, version, payload))
+        except Exception as e:
+            print(f"Error precomputing dashboard for user {user_id}: {e}")
+            errors += 1
+    return user_ids[-1], len(user_ids), payloads, errors
+
+
+def _start_run(cur, month, resume):
+    """Latest unfinished run for this month when resuming, else a new run"""
+    if resume:
+        cur.execute("""
+            SELECT id, last_user_id, users_done, errors FROM precompute_runs
+            WHERE finished_at IS NULL AND month = ?
+            ORDER BY id DESC LIMIT 1
+        """, (month,))
+        row = cur.fetchone()
+        if row:
+            return row["id"], row["last_user_id"], row["users_done"], row["errors"]
+
+    cur.execute("""
+        INSERT INTO precompute_runs (month, started_at, updated_at) VALUES (?, ?, ?)
+    """, (month, datetime.utcnow().isoformat(), datetime.utcnow().isoformat()))
+    return cur.lastrowid, 0, 0, 0
+
+
+def precompute_dashboards(workers=None, chunk_size=CHUNK_SIZE, resume=False):
+    month = datetime.now().strftime("%Y-%m")
+    conn = get_connection()
+    cur = conn.cursor()
+
+    try:
+        run_id, last_user_id, users_done, errors = _start_run(cur, month, resume)
+        conn.commit()
+
+        cur.execute("""
+            SELECT user_id FROM user_profile WHERE user_id > ? ORDER BY user_id
+        """, (last_user_id,))
+        user_ids = [row["user_id"] for row in cur.fetchall()]
+        chunks = [
+            (month, user_ids[i:i + chunk_size])
+            for i in range(0, len(user_ids), chunk_size)
+        ]
+        if last_user_id:
+            print(f"Resuming run {run_id} after user {last_user_id} ({users_done} users done)")
+        print(f"Precomputing {len(user_ids)} dashboards in {len(chunks)} chunks "
+              f"on {workers or os.cpu_count()} workers")
+
+        started = time.perf_counter()
+        processed = 0
+        saved = 0
+        with Pool(workers, initializer=_init_worker) as pool:
+            # imap keeps chunk order, so the checkpoint only ever moves forward
+            for last_id, count, payloads, chunk_errors in pool.imap(_build_chunk, chunks):
+                save_snapshots(cur, month, payloads)
+                processed += count
+                saved += len(payloads)
+                errors += chunk_errors
+                cur.execute("""
+                    UPDATE precompute_runs
+                    SET last_user_id = ?, users_done = ?, errors = ?, updated_at = ?
+                    WHERE id = ?
+                """, (last_id, users_done + processed, errors,
+                      datetime.utcnow().isoformat(), run_id))
+                conn.commit()
+
+                elapsed = time.perf_counter() - started
+                print(f"  {processed}/{len(user_ids)} users, "
+                      f"{processed / elapsed:.1f} users/s, {errors} errors")
+
+        cur.execute(
+            "UPDATE precompute_runs SET finished_at = ? WHERE id = ?",
+            (datetime.utcnow().isoformat(), run_id)
+        )
+        conn.commit()
+
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed else 0
+        print(f"Saved {saved} snapshots for {processed} users in {elapsed:.2f}s "
+              f"({rate:.1f} users/s, {errors} errors)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute dashboard snapshots")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="users per chunk")
+    parser.add_argument("--resume", action="store_true", help="continue the last unfinished run")
+    args = parser.parse_args()
+    precompute_dashboards(args.workers, args.chunk_size, args.resume)
@@ -0,0 +1,23 @@
+"""
+Mark investments to market from local NAV history
+Run after the NAV files in MARKET_DATA_DIR are refreshed (e.g. nightly from cron)
+"""
+from agents.investment_advisor import InvestmentAdvisorAgent
+import time
+
+
+def revalue_investments():
+    """Revalue every holding and refresh portfolio returns"""
+    started = time.perf_counter()
+    result = InvestmentAdvisorAgent().revalue_holdings()
+    elapsed = time.perf_counter() - started
+    print(
+        f"Revalued {result['holdings']} holdings for {result['users']} users "
+        f"({result['marked_to_market']} marked to market) in {elapsed:.2f}s"
+    )
+    if result["before_history"]:
+        print(f"{result['before_history']} holdings predate their NAV history and were left at their last value")
+
+
+if __name__ == "__main__":
+    revalue_investments()
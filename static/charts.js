@@ -30,3 +30,140 @@ function renderExpenseChart(expenses) {
         }
     });
 }
+
+// Spending history from /api/charts/expenses: stacked bars per bucket, fetched
+// only once the chart scrolls into view and then extended a window at a time
+const HISTORY_COLORS = ["#667eea", "#764ba2", "#f093fb", "#4facfe", "#43e97b", "#fbbf24", "#f87171", "#9ca3af"];
+
+class ExpenseHistoryChart {
+    constructor(canvasId, granularity = "month") {
+        this.canvas = document.getElementById(canvasId);
+        this.granularity = granularity;
+        this.chart = null;
+        this.loaded = {};  // granularity -> {buckets, series: {category: values}}
+    }
+
+    // Fetch the first window when the canvas becomes visible
+    lazyLoad() {
+        if (!this.canvas) return;
+        if (!("IntersectionObserver" in window)) {
+            this.show(this.granularity);
+            return;
+        }
+        const observer = new IntersectionObserver((entries) => {
+            if (entries.some((entry) => entry.isIntersecting)) {
+                observer.disconnect();
+                this.show(this.granularity);
+            }
+        });
+        observer.observe(this.canvas);
+    }
+
+    async fetchSeries(params) {
+        const query = new URLSearchParams({ granularity: this.granularity, ...params });
+        const response = await fetch(`/api/charts/expenses?${query}`);
+        if (!response.ok) throw new Error(`chart data: ${response.status}`);
+        return response.json();
+    }
+
+    async show(granularity) {
+        this.granularity = granularity;
+        if (!this.loaded[granularity]) {
+            const data = await this.fetchSeries({});
+            this.loaded[granularity] = { buckets: [], series: {} };
+            this.merge(data);
+        }
+        this.draw();
+    }
+
+    // Re-fetch from the newest bucket on, keeping the categories already drawn
+    async refresh() {
+        const state = this.loaded[this.granularity];
+        if (!state) return;
+        const data = await this.fetchSeries({
+            start: state.buckets[state.buckets.length - 1],
+            categories: Object.keys(state.series).join(",")
+        });
+        this.merge(data);
+        this.draw();
+    }
+
+    // Extend the window back by another default span
+    async loadEarlier() {
+        const state = this.loaded[this.granularity];
+        if (!state || state.buckets.length === 0) return;
+        const data = await this.fetchSeries({
+            end: this.before(state.buckets[0]),
+            categories: Object.keys(state.series).join(",")
+        });
+        this.merge(data);
+        this.draw();
+    }
+
+    before(bucket) {
+        if (this.granularity === "month") {
+            const [year, month] = bucket.split("-").map(Number);
+            const date = new Date(Date.UTC(year, month - 2, 1));
+            return date.toISOString().slice(0, 7);
+        }
+        const date = new Date(`${bucket}T00:00:00Z`);
+        date.setUTCDate(date.getUTCDate() - 1);
+        return date.toISOString().slice(0, 10);
+    }
+
+    // Fold a response into the cached buckets: overlapping buckets are replaced
+    merge(data) {
+        const state = this.loaded[data.granularity];
+        const buckets = Array.from(new Set([...state.buckets, ...data.buckets])).sort();
+        const oldIndex = new Map(state.buckets.map((bucket, i) => [bucket, i]));
+        const newIndex = new Map(data.buckets.map((bucket, i) => [bucket, i]));
+        const incoming = Object.fromEntries(data.series.map((s) => [s.category, s.values]));
+        const categories = Array.from(new Set([...Object.keys(state.series), ...Object.keys(incoming)]));
+
+        const series = {};
+        for (const category of categories) {
+            series[category] = buckets.map((bucket) => {
+                if (newIndex.has(bucket)) {
+                    return incoming[category] ? incoming[category][newIndex.get(bucket)] : 0;
+                }
+                const values = state.series[category];
+                return values ? values[oldIndex.get(bucket)] : 0;
+            });
+        }
+        state.buckets = buckets;
+        state.series = series;
+    }
+
+    draw() {
+        const state = this.loaded[this.granularity];
+        const datasets = Object.entries(state.series).map(([category, values], i) => ({
+            label: category,
+            data: values,
+            backgroundColor: category === "Other" ? "#d1d5db" : HISTORY_COLORS[i % HISTORY_COLORS.length]
+        }));
+
+        if (!this.chart) {
+            this.chart = new Chart(this.canvas, {
+                type: "bar",
+                data: { labels: state.buckets, datasets: datasets },
+                options: {
+                    responsive: true,
+                    maintainAspectRatio: false,
+                    scales: { x: { stacked: true }, y: { stacked: true } },
+                    plugins: { legend: { position: "bottom" } }
+                }
+            });
+            return;
+        }
+        // Update the existing datasets in place rather than rebuilding the chart
+        const existing = new Map(this.chart.data.datasets.map((dataset) => [dataset.label, dataset]));
+        this.chart.data.labels = state.buckets;
+        this.chart.data.datasets = datasets.map((dataset) => {
+            const current = existing.get(dataset.label);
+            if (!current) return dataset;
+            current.data = dataset.data;
+            return current;
+        });
+        this.chart.update("none");
+    }
+}
@@ -0,0 +1,78 @@
+"""
+Recurring series regression tests:
+
+    python -m unittest discover tests
+"""
+from datetime import date
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from memory import db
+
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "memory", "schema.sql")
+
+
+def months_back(count):
+    """The 1st of each of the last `count` months, oldest first, ending this month"""
+    today = date.today()
+    index = today.year * 12 + today.month - 1
+    return [date((index - back) // 12, (index - back) % 12 + 1, 1) for back in reversed(range(count))]
+
+
+class RecurringSeriesTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.saved_path, db.DB_PATH = db.DB_PATH, self.path
+        conn = sqlite3.connect(self.path)
+        with open(SCHEMA) as f:
+            conn.executescript(f.read())
+        conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('test', 'test@example.com', 'x')")
+        conn.commit()
+        conn.close()
+        self.user_id = 1
+
+    def tearDown(self):
+        db.DB_PATH = self.saved_path
+        os.remove(self.path)
+
+    def add_rent(self, descriptions):
+        from agents.expense_tracker import ExpenseTrackerAgent
+
+        tracker = ExpenseTrackerAgent()
+        for day, description in zip(months_back(len(descriptions)), descriptions):
+            tracker.add_expense(self.user_id, "Housing", 18000, day.strftime("%Y-%m"), description,
+                                date=day.isoformat())
+        return tracker
+
+    def series_count(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM recurring_series WHERE user_id = ?",
+                                (self.user_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_expenses_without_description_keep_one_series(self):
+        tracker = self.add_rent([None, "", None, "", None, "", None])
+        self.assertEqual(self.series_count(), 1)
+        self.assertEqual(tracker.recurring.forecast(self.user_id)["committed_spend"], 18000)
+
+    def test_observe_matches_rebuild(self):
+        from agents.recurring_detector import rebuild_recurring_series
+
+        tracker = self.add_rent(["", "Rent - Jan", "", "Rent - Feb", "", "Rent - Mar", ""])
+        observed = tracker.recurring.forecast(self.user_id)
+        conn = db.get_connection()
+        try:
+            rebuild_recurring_series(conn)
+            conn.commit()
+        finally:
+            conn.close()
+        self.assertEqual(tracker.recurring.forecast(self.user_id), observed)
+
+
+if __name__ == "__main__":
+    unittest.main()
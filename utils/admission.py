@@ -0,0 +1,227 @@
+"""
+Admission control for LLM-backed work
+A global cap on concurrent LLM requests, a per-user cap, and a bounded FIFO
+wait queue. When the queue is full (or a wait times out) the request is shed:
+by default it still gets an answer, but a rule-based one (LLM_SHED_MODE=degrade);
+with LLM_SHED_MODE=reject it gets a fast 429. A user over their own cap is
+always rejected, except on pages (degrade_only) where a rule-based answer beats
+an error. Works for both Flask threads and asyncio tasks.
+"""
+from collections import Counter, deque
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+import os
+import threading
+import time
+
+from llm.local_llm import llm
+from utils.metrics import registry
+
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "8"))
+LLM_MAX_PER_USER = int(os.getenv("LLM_MAX_PER_USER", "2"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "5"))
+LLM_SHED_MODE = os.getenv("LLM_SHED_MODE", "degrade")  # degrade or reject
+
+
+class Rejected(Exception):
+    """Request refused by admission control (reason: user_limit, queue_full or timeout)"""
+
+    def __init__(self, reason, retry_after=1):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, user_id, loop=None):
+        self.user_id = user_id
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.enqueued = time.monotonic()
+
+    def wake(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(
+                lambda: self.future.done() or self.future.set_result(True)
+            )
+        else:
+            self.event.set()
+
+
+class AdmissionController:
+    """Slots for LLM work; see the module docstring for the policy"""
+
+    def __init__(self, max_concurrent=LLM_MAX_CONCURRENT, max_per_user=LLM_MAX_PER_USER,
+                 queue_size=LLM_QUEUE_SIZE, queue_timeout=LLM_QUEUE_TIMEOUT,
+                 shed_mode=LLM_SHED_MODE):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.shed_mode = shed_mode
+        self._lock = threading.Lock()
+        self._active = 0
+        self._per_user = Counter()  # active + queued per user
+        self._waiters = deque()
+        self._stats = Counter()
+        self._max_wait = 0.0
+
+    @contextmanager
+    def slot(self, user_id, degrade_only=False):
+        """
+        Hold an LLM slot for the block. Yields True when admitted; when shed in
+        degrade mode yields False with the LLM switched to rule-based answers.
+        Raises Rejected otherwise.
+        """
+        waiter = self._enter(user_id, None, degrade_only)
+        admitted = waiter is None or self._wait(waiter)
+        with self._settle(user_id, admitted) as result:
+            yield result
+
+    @asynccontextmanager
+    async def aslot(self, user_id, degrade_only=False):
+        """Async slot(): waiting in the queue doesn't hold a thread"""
+        waiter = self._enter(user_id, asyncio.get_running_loop(), degrade_only)
+        admitted = waiter is None or await self._await(waiter)
+        with self._settle(user_id, admitted) as result:
+            yield result
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "active": self._active,
+                "queued": len(self._waiters),
+                "users_active": len(self._per_user),
+                "max_concurrent": self.max_concurrent,
+                "max_per_user": self.max_per_user,
+                "queue_size": self.queue_size,
+                "shed_mode": self.shed_mode,
+                "admitted": self._stats["admitted"],
+                "queued_total": self._stats["queued"],
+                "degraded": self._stats["degraded"],
+                "rejected": {
+                    reason: self._stats[f"rejected_{reason}"]
+                    for reason in ("user_limit", "queue_full", "timeout")
+                },
+                "max_queue_wait_ms": round(self._max_wait * 1000, 1)
+            }
+
+    def _enter(self, user_id, loop, degrade_only):
+        """Admit now (returns None), queue (returns a waiter) or shed (returns False)"""
+        with self._lock:
+            if self._per_user[user_id] >= self.max_per_user:
+                return self._shed("user_limit", reject=not degrade_only)
+
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                self._per_user[user_id] += 1
+                self._stats["admitted"] += 1
+                return None
+
+            if len(self._waiters) >= self.queue_size:
+                return self._shed("queue_full", reject=self.shed_mode == "reject" and not degrade_only)
+
+            waiter = _Waiter(user_id, loop)
+            waiter.degrade_only = degrade_only
+            self._waiters.append(waiter)
+            self._per_user[user_id] += 1
+            self._stats["queued"] += 1
+            return waiter
+
+    def _wait(self, waiter):
+        if waiter is False:
+            return False
+        if waiter.event.wait(self.queue_timeout):
+            return self._granted(waiter)
+        return self._timed_out(waiter)
+
+    async def _await(self, waiter):
+        if waiter is False:
+            return False
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+            return self._granted(waiter)
+        except asyncio.TimeoutError:
+            return self._timed_out(waiter)
+        except BaseException:
+            self._abandon(waiter)  # Cancelled (client gone, shutdown, an outer timeout)
+            raise
+
+    def _granted(self, waiter):
+        with self._lock:
+            self._max_wait = max(self._max_wait, time.monotonic() - waiter.enqueued)
+        return True
+
+    def _timed_out(self, waiter):
+        with self._lock:
+            if waiter not in self._waiters:
+                # Granted between the timeout and taking the lock
+                self._max_wait = max(self._max_wait, time.monotonic() - waiter.enqueued)
+                return True
+            self._waiters.remove(waiter)
+            self._release_user(waiter.user_id)
+            return self._shed("timeout", reject=self.shed_mode == "reject" and not waiter.degrade_only)
+
+    def _abandon(self, waiter):
+        """Give up a wait: leave the queue, or hand back a slot granted meanwhile"""
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._release_user(waiter.user_id)
+                return
+        self._release(waiter.user_id)
+
+    def _shed(self, reason, reject):
+        """Called with the lock held: reject, or degrade (returns False)"""
+        if reject:
+            self._stats[f"rejected_{reason}"] += 1
+            raise Rejected(reason)
+        self._stats["degraded"] += 1
+        return False
+
+    @contextmanager
+    def _settle(self, user_id, admitted):
+        if not admitted:
+            with llm.rule_based():
+                yield False
+            return
+        try:
+            yield True
+        finally:
+            self._release(user_id)
+
+    def _release(self, user_id):
+        with self._lock:
+            self._active -= 1
+            self._release_user(user_id)
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                self._active += 1
+                self._stats["admitted"] += 1
+                waiter.wake()
+
+    def _release_user(self, user_id):
+        self._per_user[user_id] -= 1
+        if self._per_user[user_id] <= 0:
+            del self._per_user[user_id]
+
+
+# Process-wide gate for LLM-backed endpoints
+llm_gate = AdmissionController()
+
+
+def _decision_counts():
+    stats = llm_gate.metrics()
+    counts = {("admitted",): stats["admitted"], ("queued",): stats["queued_total"], ("degraded",): stats["degraded"]}
+    counts.update({(f"rejected_{reason}",): n for reason, n in stats["rejected"].items()})
+    return counts
+
+
+registry.callback("finance_llm_admission_active", "LLM-backed requests holding a slot",
+                  lambda: llm_gate.metrics()["active"])
+registry.callback("finance_llm_admission_queued", "LLM-backed requests waiting for a slot",
+                  lambda: llm_gate.metrics()["queued"])
+registry.callback("finance_llm_admission_total", "Admission decisions", _decision_counts,
+                  kind="counter", labels=("outcome",))
@@ -0,0 +1,197 @@
+"""
+SIP backtesting over local NAV history
+Replays a monthly SIP across fund buckets (equity, hybrid, debt, ELSS) on the
+NAV files in MARKET_DATA_DIR. NAVs are aligned once into per-bucket arrays on a
+monthly schedule, so each strategy is a single pass over the months (a few
+array operations when NumPy is installed).
+"""
+from datetime import datetime
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from utils.calculations import xirr, max_drawdown
+from utils.market_data import load_price_series, market_condition_at
+
+BUCKETS = ("equity", "hybrid", "debt", "elss")
+
+# NAV file per bucket (data/market/<name>.csv)
+BUCKET_SERIES = {
+    bucket: os.getenv(f"NAV_SERIES_{bucket.upper()}", f"nav_{bucket}")
+    for bucket in BUCKETS
+}
+
+# ELSS units are locked in for 3 years, so rebalancing leaves them alone
+REBALANCE_EXCLUDED = ("elss",)
+
+# Shorter schedules are replayed in pure Python (NumPy's setup overhead dominates)
+BACKTEST_VECTOR_MIN = 24
+
+
+def load_bucket_series():
+    """NAV series for every bucket that has a local file"""
+    series = {}
+    for bucket, name in BUCKET_SERIES.items():
+        loaded = load_price_series(name)
+        if loaded and len(loaded):
+            series[bucket] = loaded
+    return series
+
+
+def monthly_schedule(series, years, end=None):
+    """
+    First trading day of each month over the last `years` years that every
+    series covers, with each bucket's as-of NAV aligned to those days
+    """
+    first = max(s.dates[0] for s in series.values())
+    last = min(s.dates[-1] for s in series.values())
+    if end:
+        last = min(last, end)
+    start = f"{int(last[:4]) - years}{last[4:]}"
+    start = max(start, first)
+
+    reference = next(iter(series.values()))
+    dates = []
+    seen_months = set()
+    for day in reference.dates:
+        if day < start or day > last or day[:7] in seen_months:
+            continue
+        seen_months.add(day[:7])
+        dates.append(day)
+
+    navs = {}
+    for bucket, s in series.items():
+        navs[bucket] = [s.closes[s.index_as_of(day)] for day in dates]
+    return dates, navs
+
+
+def run_backtest(dates, navs, allocations_by_month, rebalance=None):
+    """
+    Replay a monthly SIP.
+
+    allocations_by_month: list (one per date) of {bucket: amount}
+    rebalance: None or "annual" - reset non-ELSS holdings to the month's target
+    weights every January
+
+    With NumPy installed and at least BACKTEST_VECTOR_MIN months, holdings are
+    cumulative sums over the whole schedule (one per year when rebalancing);
+    otherwise the months are replayed one by one in pure Python.
+    """
+    if not dates:
+        return None
+
+    replay = _replay_numpy if np is not None and len(dates) >= BACKTEST_VECTOR_MIN else _replay_python
+    units, values, growth_index, month_totals, invested = replay(dates, navs, allocations_by_month, rebalance)
+
+    cashflows = [(datetime.strptime(day, "%Y-%m-%d").date(), -total) for day, total in zip(dates, month_totals)]
+    final_value = values[-1]
+    cashflows.append((cashflows[-1][0], final_value))
+    rate = xirr(cashflows)
+
+    yearly = [
+        {"date": day, "value": round(value, 2)}
+        for day, value in zip(dates, values) if day[5:7] == dates[0][5:7]
+    ]
+    return {
+        "start": dates[0],
+        "end": dates[-1],
+        "months": len(dates),
+        "total_invested": round(invested, 2),
+        "final_value": round(final_value, 2),
+        "absolute_return_pct": round((final_value / invested - 1) * 100, 2) if invested else 0,
+        "xirr_pct": round(rate * 100, 2) if rate is not None else None,
+        "max_drawdown_pct": round(max_drawdown(growth_index) * 100, 2),
+        "final_holdings": {b: round(units[b] * navs[b][-1], 2) for b in units},
+        "yearly_values": yearly
+    }
+
+
+def _replay_python(dates, navs, allocations_by_month, rebalance):
+    """Final units, month-end values, growth index, monthly contributions and total invested"""
+    units = {bucket: 0.0 for bucket in navs}
+    values = []
+    month_totals = []
+    growth_index = [1.0]  # Time-weighted value of ₹1, unaffected by contributions
+    invested = 0.0
+    previous_value = 0.0
+
+    for m, day in enumerate(dates):
+        value_before = sum(units[b] * navs[b][m] for b in units)
+        if previous_value > 0:
+            growth_index.append(growth_index[-1] * value_before / previous_value)
+
+        allocation = allocations_by_month[m]
+        for bucket, amount in allocation.items():
+            if amount > 0 and bucket in units:
+                units[bucket] += amount / navs[bucket][m]
+                invested += amount
+        month_totals.append(sum(a for b, a in allocation.items() if b in units))
+
+        if rebalance == "annual" and m > 0 and day[5:7] == "01":
+            movable = [b for b in units if b not in REBALANCE_EXCLUDED]
+            target_total = sum(allocation.get(b, 0) for b in movable)
+            pool = sum(units[b] * navs[b][m] for b in movable)
+            if target_total > 0:
+                for b in movable:
+                    units[b] = pool * allocation.get(b, 0) / target_total / navs[b][m]
+
+        previous_value = sum(units[b] * navs[b][m] for b in units)
+        values.append(previous_value)
+
+    return units, values, growth_index, month_totals, invested
+
+
+def _replay_numpy(dates, navs, allocations_by_month, rebalance):
+    """_replay_python over a (bucket x month) array, returning the same plain values"""
+    buckets = list(navs)
+    prices = np.array([navs[b] for b in buckets], dtype=float)
+    amounts = np.array([[allocation.get(b, 0) for allocation in allocations_by_month] for b in buckets],
+                       dtype=float).reshape(len(buckets), len(dates))
+    bought = np.where(amounts > 0, amounts / prices, 0.0)
+
+    # Rebalancing resets holdings after that month's purchase, so units are a
+    # cumulative sum of purchases from the last reset on
+    resets = []
+    if rebalance == "annual":
+        resets = [m for m, day in enumerate(dates) if m > 0 and day[5:7] == "01"]
+    movable = np.array([b not in REBALANCE_EXCLUDED for b in buckets])
+
+    units = np.empty_like(prices)
+    held = np.zeros(len(buckets))
+    start = 0
+    for end in resets + [len(dates) - 1]:
+        units[:, start:end + 1] = held[:, None] + np.cumsum(bought[:, start:end + 1], axis=1)
+        held = units[:, end].copy()
+        if end in resets:
+            targets = np.where(movable, amounts[:, end], 0.0)
+            if targets.sum() > 0:
+                pool = (held * prices[:, end])[movable].sum()
+                held[movable] = (pool * targets / targets.sum() / prices[:, end])[movable]
+                units[:, end] = held
+        start = end + 1
+
+    values = (units * prices).sum(axis=0)
+    # Value of last month's holdings at this month's prices, before buying
+    values_before = (units[:, :-1] * prices[:, 1:]).sum(axis=0)
+    grown = values[:-1] > 0
+    growth = np.cumprod(values_before[grown] / values[:-1][grown])
+
+    return (
+        dict(zip(buckets, units[:, -1].tolist())),
+        values.tolist(),
+        [1.0] + growth.tolist(),
+        amounts.sum(axis=0).tolist(),
+        float(amounts[amounts > 0].sum())
+    )
+
+
+def conditions_for_dates(index_series, dates):
+    """Market condition on each schedule date (None before enough history)"""
+    conditions = []
+    for day in dates:
+        i = index_series.index_as_of(day) if index_series else -1
+        conditions.append(market_condition_at(index_series, i)["condition"] if i >= 0 else None)
+    return conditions
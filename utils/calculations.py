@@ -1,3 +1,12 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Fewer cash flow sets than this are solved in pure Python (NumPy's overhead dominates)
+XIRR_VECTOR_MIN = 4
+
+
 def savings_ratio(income, expenses):
     if income == 0:
         return 0
@@ -14,3 +23,179 @@ def emergency_runway(emergency_fund, monthly_expenses):
     if monthly_expenses == 0:
         return float("inf")
     return emergency_fund / monthly_expenses
+
+
+def median(values):
+    return percentile(values, 50)
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile (0-100) of a list of numbers"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def linear_trend(values):
+    """Least-squares slope of values taken as an evenly spaced series"""
+    n = len(values)
+    if n < 2:
+        return 0
+    mean_x = (n - 1) / 2
+    mean_y = sum(values) / n
+    num = sum((i - mean_x) * (y - mean_y) for i, y in enumerate(values))
+    den = sum((i - mean_x) ** 2 for i in range(n))
+    return num / den
+
+
+def xirr(cashflows, guess=0.1, tolerance=1e-7, max_iterations=100):
+    """
+    Annualized internal rate of return for irregular cash flows.
+    cashflows: list of (date, amount) with investments negative and
+    withdrawals/final value positive. Returns None if there is no solution.
+    """
+    return xirr_batch([cashflows], guess, tolerance, max_iterations)[0]
+
+
+def xirr_batch(cashflow_sets, guess=0.1, tolerance=1e-7, max_iterations=100):
+    """
+    XIRR for many cash flow sets at once (one result per set, None if unsolvable).
+    With NumPy installed and at least XIRR_VECTOR_MIN sets, every set is padded
+    into one array and each Newton step (and the bisection fallback) runs over
+    all of them in a single pass; otherwise the sets are solved one after
+    another in pure Python.
+    """
+    problems = []
+    for cashflows in cashflow_sets:
+        amounts = [amount for _, amount in cashflows]
+        if not (any(a < 0 for a in amounts) and any(a > 0 for a in amounts)):
+            problems.append(None)
+            continue
+        start = min(day for day, _ in cashflows)
+        years = [(day - start).days / 365.0 for day, _ in cashflows]
+        if max(years) == 0:
+            problems.append(None)
+            continue
+        problems.append((amounts, years))
+
+    if np is not None and sum(problem is not None for problem in problems) >= XIRR_VECTOR_MIN:
+        return _xirr_numpy(problems, guess, tolerance, max_iterations)
+    return _xirr_python(problems, guess, tolerance, max_iterations)
+
+
+def _xirr_python(problems, guess, tolerance, max_iterations):
+    def npv(problem, rate):
+        return sum(a / (1 + rate) ** t for a, t in zip(*problem))
+
+    def d_npv(problem, rate):
+        return sum(-t * a / (1 + rate) ** (t + 1) for a, t in zip(*problem))
+
+    results = [None] * len(problems)
+    for i, problem in enumerate(problems):
+        if problem is None:
+            continue
+        rate = guess
+        for _ in range(max_iterations):
+            try:
+                slope = d_npv(problem, rate)
+                next_rate = rate - npv(problem, rate) / slope if slope else None
+            except (OverflowError, ZeroDivisionError):
+                next_rate = None
+            if next_rate is None or next_rate <= -1 or next_rate != next_rate:
+                break  # Diverged - leave for bisection
+            if abs(next_rate - rate) < tolerance:
+                results[i] = next_rate
+                break
+            rate = next_rate
+
+        if results[i] is not None:
+            continue
+        low, high = -0.9999, 10.0
+        try:
+            if npv(problem, low) * npv(problem, high) > 0:
+                continue
+            while high - low >= tolerance:
+                mid = (low + high) / 2
+                if npv(problem, low) * npv(problem, mid) <= 0:
+                    high = mid
+                else:
+                    low = mid
+        except OverflowError:
+            continue
+        results[i] = (low + high) / 2
+
+    return results
+
+
+def _xirr_numpy(problems, guess, tolerance, max_iterations):
+    """Vectorized xirr_batch: rows are cash flow sets, zero-padded to the longest one"""
+    valid = [i for i, problem in enumerate(problems) if problem is not None]
+    width = max(len(problems[i][0]) for i in valid)
+    amounts = np.zeros((len(valid), width))
+    years = np.zeros((len(valid), width))
+    for row, i in enumerate(valid):
+        amounts[row, :len(problems[i][0])] = problems[i][0]
+        years[row, :len(problems[i][1])] = problems[i][1]
+
+    def npv(rows, rates):
+        return (amounts[rows] * (1 + rates[:, None]) ** -years[rows]).sum(axis=1)
+
+    solved = np.full(len(valid), np.nan)
+    rates = np.full(len(valid), float(guess))
+    active = np.arange(len(valid))
+    with np.errstate(all="ignore"):
+        for _ in range(max_iterations):
+            if not active.size:
+                break
+            rate = rates[active][:, None]
+            discounted = amounts[active] * (1 + rate) ** -years[active]
+            slope = (-years[active] * discounted / (1 + rate)).sum(axis=1)
+            next_rate = rate[:, 0] - discounted.sum(axis=1) / slope
+            diverged = ~np.isfinite(next_rate) | (next_rate <= -1)  # left for bisection
+            converged = ~diverged & (np.abs(next_rate - rate[:, 0]) < tolerance)
+            solved[active[converged]] = next_rate[converged]
+            rates[active] = np.where(diverged, rates[active], next_rate)
+            active = active[~(diverged | converged)]
+
+        rows = np.flatnonzero(np.isnan(solved))
+        low = np.full(rows.size, -0.9999)
+        high = np.full(rows.size, 10.0)
+        npv_low = npv(rows, low)
+        bracketed = npv_low * npv(rows, high) <= 0
+        rows, low, high, npv_low = rows[bracketed], low[bracketed], high[bracketed], npv_low[bracketed]
+        while rows.size and (high - low).max() >= tolerance:
+            mid = (low + high) / 2
+            npv_mid = npv(rows, mid)
+            left = npv_low * npv_mid <= 0
+            high = np.where(left, mid, high)
+            low = np.where(left, low, mid)
+            npv_low = np.where(left, npv_low, npv_mid)
+        solved[rows] = (low + high) / 2
+
+    results = [None] * len(problems)
+    for row, i in enumerate(valid):
+        if not np.isnan(solved[row]):
+            results[i] = float(solved[row])
+    return results
+
+
+def cagr(start_value, end_value, years):
+    if start_value <= 0 or end_value < 0 or years <= 0:
+        return None
+    return (end_value / start_value) ** (1 / years) - 1
+
+
+def max_drawdown(values):
+    """Largest peak-to-trough fall of a series, as a negative fraction"""
+    peak = None
+    worst = 0.0
+    for value in values:
+        if peak is None or value > peak:
+            peak = value
+        if peak > 0:
+            worst = min(worst, value / peak - 1)
+    return worst
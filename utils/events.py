@@ -0,0 +1,141 @@
+"""
+In-process pub/sub for live dashboard updates
+Write paths publish small per-user deltas after they commit; each open
+/api/events stream holds a Subscription. A subscription is a short bounded
+buffer plus a wake-up flag - no thread or task of its own - so thousands of
+idle streams on the async server cost a few KB each. When a slow client lets
+its buffer overflow the oldest events are dropped and it is told to resync.
+Only streams connected to the process that handled the write are notified.
+"""
+from collections import defaultdict, deque
+import asyncio
+import itertools
+import json
+import os
+import threading
+
+from utils.metrics import registry
+
+# Undelivered events kept per stream before the oldest are dropped
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "32"))
+# Seconds between keep-alive comments on an idle stream
+EVENT_HEARTBEAT = float(os.getenv("EVENT_HEARTBEAT", "20"))
+
+
+class Subscription:
+    """One open event stream; woken from any thread, read by its own thread or loop"""
+
+    def __init__(self, user_id, loop=None, size=EVENT_BUFFER_SIZE):
+        self.user_id = user_id
+        self.loop = loop
+        self.size = size
+        self.closed = False
+        self._events = deque()
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event() if loop else threading.Event()
+
+    def push(self, event):
+        with self._lock:
+            if len(self._events) >= self.size:
+                self._events.popleft()
+                self._dropped += 1
+            self._events.append(event)
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def get(self, timeout=EVENT_HEARTBEAT):
+        """Pending events, or [] after `timeout` seconds (blocking)"""
+        self._ready.wait(timeout)
+        return self._drain()
+
+    async def aget(self, timeout=EVENT_HEARTBEAT):
+        """Pending events, or [] after `timeout` seconds"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._drain()
+
+    def _wake(self):
+        if self.loop:
+            try:
+                self.loop.call_soon_threadsafe(self._ready.set)
+            except RuntimeError:
+                pass  # loop already closed
+        else:
+            self._ready.set()
+
+    def _drain(self):
+        self._ready.clear()
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            events.insert(0, {"id": events[0]["id"] - 1 if events else 0,
+                              "event": "resync", "data": {"dropped": dropped}})
+        return events
+
+
+class EventHub:
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, user_id, loop=None):
+        """Pass the running loop for an async stream, None for a blocking one"""
+        subscription = Subscription(user_id, loop)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def has_subscribers(self, user_id):
+        """Lets publishers skip building a delta nobody will receive"""
+        return bool(self._subscribers.get(user_id))
+
+    def publish(self, user_id, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        message = {"id": next(self._ids), "event": event, "data": data}
+        for subscription in subscribers:
+            subscription.push(message)
+        return len(subscribers)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._subscribers),
+                "streams": sum(len(s) for s in self._subscribers.values())
+            }
+
+
+def format_sse(message):
+    """One event in text/event-stream framing"""
+    return (
+        f"id: {message['id']}\n"
+        f"event: {message['event']}\n"
+        f"data: {json.dumps(message['data'], default=str)}\n\n"
+    ).encode("utf-8")
+
+
+# Retry delay for reconnecting browsers, then a comment so proxies flush the headers
+STREAM_PREAMBLE = b"retry: 5000\n: connected\n\n"
+HEARTBEAT = b": ping\n\n"
+
+# Process-wide hub
+events = EventHub()
+registry.callback("finance_sse_streams", "Open /api/events streams", lambda: events.stats()["streams"])
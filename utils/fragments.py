@@ -0,0 +1,99 @@
+"""
+Template fragment cache and compiled-template cache
+A block of a template wrapped in
+
+    {% cache "budget", versions.budget %} ... {% endcache %}
+
+is rendered once per distinct key and then served from an in-process LRU.
+The key values are the versions (content hashes) of the data the block reads,
+so a request re-renders only the panels whose inputs changed; every input a
+block uses must be in its key. A key part that is missing (None/undefined)
+renders the block uncached.
+
+Compiled templates are written to a bytecode cache on disk, so a new worker
+loads them instead of compiling them again.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+
+from jinja2 import FileSystemBytecodeCache, nodes, Undefined
+from jinja2.ext import Extension
+
+from utils.metrics import registry
+
+FRAGMENT_CACHE = os.getenv("FRAGMENT_CACHE", "1") == "1"
+# Rendered fragments kept per process (LRU)
+FRAGMENT_CACHE_ENTRIES = int(os.getenv("FRAGMENT_CACHE_ENTRIES", "5000"))
+# Compiled templates on disk (empty: the system temp directory); TEMPLATE_BYTECODE_CACHE=0 turns it off
+TEMPLATE_BYTECODE_CACHE = os.getenv("TEMPLATE_BYTECODE_CACHE", "1") == "1"
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", "")
+
+_fragments = OrderedDict()
+_lock = threading.Lock()
+
+fragment_requests = registry.counter(
+    "finance_template_fragments_total", "Template fragments served from cache or rendered", ("fragment", "result"))
+registry.callback("finance_template_fragment_entries", "Rendered template fragments cached",
+                  lambda: len(_fragments))
+
+
+def _part(value):
+    """A key part: version strings as they are, anything else by content hash"""
+    if isinstance(value, (str, int, float, bool)):
+        return str(value)
+    text = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class FragmentCacheExtension(Extension):
+    """The {% cache name, key... %} tag"""
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render", [nodes.Const(parser.name), nodes.List(args)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, template, parts, caller):
+        name = str(parts[0])
+        if not FRAGMENT_CACHE or any(part is None or isinstance(part, Undefined) for part in parts[1:]):
+            return caller()
+        key = (template, name) + tuple(_part(part) for part in parts[1:])
+        with _lock:
+            html = _fragments.get(key)
+            if html is not None:
+                _fragments.move_to_end(key)
+        if html is not None:
+            fragment_requests.inc(name, "hit")
+            return html
+
+        html = caller()
+        fragment_requests.inc(name, "miss")
+        with _lock:
+            _fragments[key] = html
+            _fragments.move_to_end(key)
+            while len(_fragments) > FRAGMENT_CACHE_ENTRIES:
+                _fragments.popitem(last=False)
+        return html
+
+
+def fragment_cache_clear():
+    with _lock:
+        _fragments.clear()
+
+
+def bytecode_cache():
+    """Jinja bytecode cache for Flask's jinja_options, or None when turned off"""
+    if not TEMPLATE_BYTECODE_CACHE:
+        return None
+    if TEMPLATE_CACHE_DIR:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+        return FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+    return FileSystemBytecodeCache()
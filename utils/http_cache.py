@@ -0,0 +1,97 @@
+"""
+Versioned HTTP response cache
+Responses are keyed on (user, endpoint, data version, day, query string). The
+data version lives in the database (memory/versions.py), so a write in any
+worker process changes the key everywhere. The ETag is derived from the key
+(and the JSON encoder, whose bytes differ slightly) alone, which lets a
+matching If-None-Match be answered with 304 before any agent runs.
+"""
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+import hashlib
+import os
+import threading
+
+from flask import g, make_response, request, session
+
+from memory.versions import get_data_version
+from utils.metrics import http_cache_requests, registry
+from utils.responses import ENCODER
+
+# Cached bodies kept per process (LRU)
+HTTP_CACHE_ENTRIES = int(os.getenv("HTTP_CACHE_ENTRIES", "5000"))
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def cache_key(user_id, endpoint, version, query_string=""):
+    """(key, etag) - outputs also depend on today's date (current month, forecasts, market data)"""
+    key = (user_id, endpoint, version, date.today().isoformat(), query_string)
+    return key, hashlib.sha1(repr((key, ENCODER)).encode("utf-8")).hexdigest()
+
+
+def cache_get(key, endpoint=None):
+    """(body, mimetype) or None; counted as a hit or miss for `endpoint`"""
+    with _lock:
+        cached = _cache.get(key)
+        if cached:
+            _cache.move_to_end(key)
+    if endpoint:
+        http_cache_requests.inc(endpoint, "hit" if cached else "miss")
+    return cached
+
+
+def cache_put(key, body, mimetype):
+    with _lock:
+        _cache[key] = (body, mimetype)
+        _cache.move_to_end(key)
+        while len(_cache) > HTTP_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def cache_clear():
+    with _lock:
+        _cache.clear()
+
+
+def http_cached(endpoint):
+    """Cache a login_required view's 200 responses per user and data version"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = session['user_id']
+            version = get_data_version(user_id)
+            g.data_version = version
+            key, etag = cache_key(user_id, endpoint, version, request.query_string.decode("utf-8"))
+
+            # Weak comparison: compressed responses carry the ETag as W/"..." (utils/responses.py)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response("", 304)
+                status = "REVALIDATED"
+                http_cache_requests.inc(endpoint, "revalidated")
+            else:
+                cached = cache_get(key, endpoint)
+                if cached:
+                    body, mimetype = cached
+                    response = make_response(body)
+                    response.mimetype = mimetype
+                    status = "HIT"
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or g.get("degraded"):
+                        # Rule-based stand-ins for shed LLM calls are not worth keeping
+                        return response
+                    cache_put(key, response.get_data(), response.mimetype)
+                    status = "MISS"
+
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "private, no-cache"
+            response.headers["X-Cache"] = status
+            return response
+        return wrapper
+    return decorator
+
+
+registry.callback("finance_http_cache_entries", "Responses held in the HTTP cache", lambda: len(_cache))
@@ -0,0 +1,39 @@
+"""
+Lazily built singletons
+A module-level name can stand for an object that is only built (and its
+modules only imported) on first use, so importing the app stays cheap and a
+new worker can bind its port before every agent exists. Building happens once,
+under a lock, even when the first requests arrive together.
+"""
+import threading
+
+
+class Lazy:
+    """Proxy for factory(): built on first attribute access, then forwards everything to it"""
+    __slots__ = ("_factory", "_value", "_lock", "_name")
+
+    def __init__(self, factory, name=None):
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+        self._name = name or getattr(factory, "__name__", "lazy")
+
+    def resolve(self):
+        """The built object (built now if needed)"""
+        value = self._value
+        if value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+                value = self._value
+        return value
+
+    @property
+    def ready(self):
+        return self._value is not None
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __repr__(self):
+        return f"<Lazy {self._name}: {self._value!r}>" if self.ready else f"<Lazy {self._name} (not built)>"
@@ -0,0 +1,25 @@
+"""
+Structured (JSON lines) operational logs
+Traces, slow queries and repeated-query warnings are written one JSON object
+per line to stderr, under loggers named finance.<area>, so they can be shipped
+and filtered without parsing free text.
+"""
+import json
+import logging
+import sys
+
+
+def json_logger(name):
+    """Logger `name` writing bare messages to stderr (configured once)"""
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def log_event(logger, event, level=logging.INFO, **fields):
+    logger.log(level, json.dumps({"event": event, **fields}, default=str))
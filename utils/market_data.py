@@ -0,0 +1,226 @@
+"""
+Local market history and technical indicators
+Price files are CSVs of `date,close` rows (YYYY-MM-DD, header optional) kept in
+MARKET_DATA_DIR, e.g. data/market/nifty50.csv for the index and one file per NAV
+series. Each file is parsed once per modification time; rolling windows are
+computed with prefix sums so every indicator is a single O(n) pass (one array
+operation each when NumPy is installed).
+"""
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+import math
+import os
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MARKET_DATA_DIR = os.getenv("MARKET_DATA_DIR", "data/market")
+INDEX_SERIES = os.getenv("MARKET_INDEX_SERIES", "nifty50")
+
+TRADING_DAYS = 252
+SHORT_WINDOW = 50
+LONG_WINDOW = 200
+VOLATILITY_WINDOW = 20
+
+# Market regime thresholds
+BEAR_DRAWDOWN = -0.20
+VOLATILE_LEVEL = 0.25
+MEDIUM_VOLATILITY = 0.15
+
+# Shorter series are computed in pure Python (NumPy's conversion overhead dominates)
+INDICATOR_VECTOR_MIN = 64
+
+_series_cache = {}
+_lock = threading.Lock()
+
+
+class PriceSeries:
+    """Date-sorted closing prices with lazily computed indicator arrays"""
+
+    def __init__(self, name, dates, closes, version=None):
+        self.name = name
+        self.version = version
+        self.dates = dates
+        self.closes = closes
+        self._indicators = None
+
+    def __len__(self):
+        return len(self.closes)
+
+    def index_as_of(self, day):
+        """Index of the last close on or before `day` (YYYY-MM-DD), or -1"""
+        return bisect_right(self.dates, day) - 1
+
+    @property
+    def indicators(self):
+        if self._indicators is None:
+            self._indicators = compute_indicators(self.closes)
+        return self._indicators
+
+
+def series_path(name):
+    return os.path.join(MARKET_DATA_DIR, f"{name}.csv")
+
+
+def load_price_series(name):
+    """Load a price series by name, reusing the parsed copy until the file changes"""
+    path = series_path(name)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _lock:
+        cached = _series_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    rows = []
+    with open(path, "r") as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) < 2:
+                continue
+            try:
+                rows.append((parts[0].strip()[:10], float(parts[1])))
+            except ValueError:
+                continue  # Header or malformed row
+    rows.sort()
+
+    series = PriceSeries(name, [r[0] for r in rows], array("d", (r[1] for r in rows)), version=mtime)
+    with _lock:
+        _series_cache[path] = (mtime, series)
+    return series
+
+
+def rolling_mean(values, window):
+    """Trailing mean over `window` points; None until the window is full"""
+    sums = [0.0, *accumulate(values)]
+    return [
+        (sums[i + 1] - sums[i + 1 - window]) / window if i + 1 >= window else None
+        for i in range(len(values))
+    ]
+
+
+def rolling_volatility(closes, window, periods=TRADING_DAYS):
+    """Annualized standard deviation of log returns over a trailing window"""
+    returns = [0.0] + [
+        math.log(closes[i] / closes[i - 1]) if closes[i - 1] > 0 and closes[i] > 0 else 0.0
+        for i in range(1, len(closes))
+    ]
+    sums = [0.0, *accumulate(returns)]
+    squares = [0.0, *accumulate(r * r for r in returns)]
+
+    result = []
+    for i in range(len(closes)):
+        # returns[0] is a placeholder, so a full window needs window + 1 closes
+        if i < window:
+            result.append(None)
+            continue
+        total = sums[i + 1] - sums[i + 1 - window]
+        total_sq = squares[i + 1] - squares[i + 1 - window]
+        variance = max(total_sq - total * total / window, 0) / (window - 1)
+        result.append(math.sqrt(variance * periods))
+    return result
+
+
+def drawdowns(values):
+    """Fractional distance below the running peak (0 at a new high)"""
+    return [v / peak - 1 if peak > 0 else 0.0 for v, peak in zip(values, accumulate(values, max))]
+
+
+def compute_indicators(closes):
+    """
+    Indicator lists aligned with `closes` (None where a window is not full yet).
+    With NumPy installed and at least INDICATOR_VECTOR_MIN closes, each one is
+    computed with array operations; otherwise in pure Python.
+    """
+    if np is not None and len(closes) >= INDICATOR_VECTOR_MIN:
+        return _indicators_numpy(closes)
+    return {
+        "sma_short": rolling_mean(closes, SHORT_WINDOW),
+        "sma_long": rolling_mean(closes, LONG_WINDOW),
+        "drawdown": drawdowns(closes),
+        "volatility": rolling_volatility(closes, VOLATILITY_WINDOW)
+    }
+
+
+def _indicators_numpy(closes, periods=TRADING_DAYS):
+    """compute_indicators over an ndarray, returned as plain lists like the Python path"""
+    values = np.asarray(closes, dtype=float)
+    n = len(values)
+
+    def padded(tail):
+        return [None] * (n - len(tail)) + tail.tolist()
+
+    def window_sums(x, window):
+        # Sum of each full trailing window, one per index from window - 1 on
+        sums = np.concatenate(([0.0], np.cumsum(x)))
+        return sums[window:] - sums[:max(n + 1 - window, 0)]
+
+    with np.errstate(all="ignore"):
+        peaks = np.maximum.accumulate(values) if n else values
+        drawdown = np.where(peaks > 0, values / peaks - 1, 0.0)
+
+        valid = (values[1:] > 0) & (values[:-1] > 0)
+        returns = np.zeros(n)
+        returns[1:] = np.where(valid, np.log(np.where(valid, values[1:] / values[:-1], 1.0)), 0.0)
+
+    # returns[0] is a placeholder, so a full window needs window + 1 closes
+    window = VOLATILITY_WINDOW
+    total = window_sums(returns, window)[1:]
+    total_sq = window_sums(returns * returns, window)[1:]
+    variance = np.maximum(total_sq - total * total / window, 0) / (window - 1)
+
+    return {
+        "sma_short": padded(window_sums(values, SHORT_WINDOW) / SHORT_WINDOW),
+        "sma_long": padded(window_sums(values, LONG_WINDOW) / LONG_WINDOW),
+        "drawdown": drawdown.tolist(),
+        "volatility": padded(np.sqrt(variance * periods))
+    }
+
+
+def classify_market(close, sma_short, sma_long, drawdown, volatility):
+    """Deterministic market regime from one point of the indicator arrays"""
+    if sma_long is None or volatility is None:
+        return None
+    if drawdown <= BEAR_DRAWDOWN or (close < sma_long and sma_short < sma_long):
+        return "bear"
+    if volatility >= VOLATILE_LEVEL:
+        return "volatile"
+    if close > sma_short > sma_long:
+        return "bull"
+    return "stable"
+
+
+def market_condition_at(series, index):
+    """Regime and indicator snapshot at one index of a series"""
+    ind = series.indicators
+    close = series.closes[index]
+    condition = classify_market(
+        close, ind["sma_short"][index], ind["sma_long"][index],
+        ind["drawdown"][index], ind["volatility"][index]
+    )
+    return {
+        "condition": condition,
+        "as_of": series.dates[index],
+        "close": close,
+        "sma_short": ind["sma_short"][index],
+        "sma_long": ind["sma_long"][index],
+        "drawdown": ind["drawdown"][index],
+        "volatility": ind["volatility"][index]
+    }
+
+
+def volatility_label(volatility):
+    if volatility is None:
+        return "medium"
+    if volatility >= VOLATILE_LEVEL:
+        return "high"
+    if volatility >= MEDIUM_VOLATILITY:
+        return "medium"
+    return "low"
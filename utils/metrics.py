@@ -0,0 +1,273 @@
+"""
+In-process metrics in the Prometheus text format (GET /metrics)
+Counters, gauges and histograms are sharded per thread: each thread updates
+its own dict without taking a lock, and a scrape sums the shards. Shards of
+threads that have exited are folded into one retired shard, so per-request
+threads (Werkzeug) don't accumulate. Gauges whose value lives elsewhere
+(admission queue, open event streams, pool queues) are read by callback at
+scrape time. Values are per process; scrape every worker.
+"""
+from bisect import bisect_left
+import math
+import hmac
+import os
+import threading
+import time
+
+METRICS = os.getenv("METRICS", "1") == "1"
+# Bearer token required by /metrics; without one it is served to loopback clients only
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Live shards before exited threads' shards are folded together
+SHARD_COMPACT_AT = 64
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+DB_TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _merge(into, values):
+    for key, value in values.items():
+        if isinstance(value, list):
+            total = into.get(key)
+            if total is None:
+                into[key] = list(value)
+            else:
+                for i, v in enumerate(value):
+                    total[i] += v
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._local = threading.local()
+        self._shards = []  # (thread, values)
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    # --- definition ---
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(self, name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Gauge(self, name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self, name, help, labels, buckets))
+
+    def callback(self, name, help, func, kind="gauge", labels=()):
+        """A metric read at scrape time: func() returns a number or {label values tuple: number}"""
+        return self._add(Callback(self, name, help, labels, func, kind))
+
+    def _add(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    # --- sharded storage ---
+
+    def shard(self):
+        """This thread's values dict (updated without a lock)"""
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+                if len(self._shards) > SHARD_COMPACT_AT:
+                    self._compact()
+            return values
+
+    def _compact(self):
+        live = []
+        for thread, values in self._shards:
+            if thread.is_alive():
+                live.append((thread, values))
+            else:
+                _merge(self._retired, values)
+        self._shards = live
+
+    def snapshot(self):
+        """All shards summed: {(metric name, label values): value}"""
+        with self._lock:
+            self._compact()
+            totals = {}
+            _merge(totals, self._retired)
+            shards = [values for _, values in self._shards]
+        for values in shards:
+            _merge(totals, dict(values))
+        return totals
+
+    # --- exposition ---
+
+    def render(self):
+        totals = self.snapshot()
+        by_metric = {}
+        for (name, labels), value in totals.items():
+            by_metric.setdefault(name, []).append((labels, value))
+
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            samples = metric.collect(sorted(by_metric.get(metric.name, []), key=lambda s: s[0]))
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{metric.name}{suffix}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, registry, name, help, labels):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+
+    def _pairs(self, values):
+        return list(zip(self.labelnames, values))
+
+    def collect(self, samples):
+        return [("", self._pairs(labels), value) for labels, value in samples]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        values = self.registry.shard()
+        key = (self.name, labels)
+        values[key] = values.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    """Up/down gauge (e.g. in-flight requests); inc and dec may happen on different threads"""
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labels, buckets):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        values = self.registry.shard()
+        key = (self.name, labels)
+        counts = values.get(key)
+        if counts is None:
+            counts = values[key] = [0] * (len(self.buckets) + 3)
+        counts[bisect_left(self.buckets, value)] += 1  # last slot before sum/count is +Inf
+        counts[-2] += value
+        counts[-1] += 1
+
+    def collect(self, samples):
+        out = []
+        for labels, counts in samples:
+            pairs = self._pairs(labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                out.append(("_bucket", pairs + [("le", "+Inf" if bound == math.inf else repr(float(bound)))],
+                            cumulative))
+            out.append(("_sum", pairs, counts[-2]))
+            out.append(("_count", pairs, counts[-1]))
+        return out
+
+
+class Callback(_Metric):
+    def __init__(self, registry, name, help, labels, func, kind):
+        super().__init__(registry, name, help, labels)
+        self.func = func
+        self.kind = kind
+
+    def collect(self, samples):
+        try:
+            value = self.func()
+        except Exception as e:
+            print(f"Metric {self.name} callback error: {e}")
+            return []
+        if isinstance(value, dict):
+            return [("", self._pairs(labels if isinstance(labels, tuple) else (labels,)), v)
+                    for labels, v in sorted(value.items())]
+        return [("", [], value)]
+
+
+# Process-wide registry
+registry = MetricsRegistry()
+
+http_requests_in_flight = registry.gauge(
+    "finance_http_requests_in_flight", "Requests being served")
+http_request_duration = registry.histogram(
+    "finance_http_request_duration_seconds", "Request latency by route", ("route", "method", "status"))
+http_cache_requests = registry.counter(
+    "finance_http_cache_requests_total", "Versioned HTTP cache lookups", ("endpoint", "result"))
+db_queries_per_request = registry.histogram(
+    "finance_db_queries_per_request", "SQLite statements executed per request", ("route",), COUNT_BUCKETS)
+db_seconds_per_request = registry.histogram(
+    "finance_db_query_seconds_per_request", "Time spent in SQLite statements per request", ("route",),
+    DB_TIME_BUCKETS)
+db_repeated_queries = registry.counter(
+    "finance_db_repeated_queries_total",
+    "Statement shapes run QUERY_REPEAT_WARN or more times in one request (likely N+1)", ("route",))
+llm_request_duration = registry.histogram(
+    "finance_llm_request_duration_seconds", "LLM HTTP call latency", ("provider", "outcome"))
+llm_errors = registry.counter(
+    "finance_llm_errors_total", "Failed LLM calls", ("provider", "reason"))
+llm_advice = registry.counter(
+    "finance_llm_advice_total", "Advice answers by source (llm, fallback after a failed call, shed)",
+    ("provider", "source"))
+agent_memo = registry.counter(
+    "finance_agent_memo_total", "Dashboard pipeline nodes served from memo or computed", ("node", "result"))
+
+
+def request_started():
+    """Call when a request starts; pass the result to request_finished()"""
+    if not METRICS:
+        return None
+    http_requests_in_flight.inc()
+    return time.perf_counter()
+
+
+def request_finished(started, route, method, status):
+    if started is None:
+        return
+    http_requests_in_flight.dec()
+    http_request_duration.observe(time.perf_counter() - started, route, method, str(status))
+
+
+def scrape_allowed(authorization, remote_addr):
+    """Whether a /metrics request may be served (see METRICS_TOKEN)"""
+    if METRICS_TOKEN:
+        return hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}")
+    return remote_addr in ("127.0.0.1", "::1")
@@ -0,0 +1,362 @@
+"""
+On-demand profiling of live requests
+An admin (ADMIN_USERS) profiles one request by adding ?profile=cprofile (or
+sample, optionally ",memory") to a /dashboard or /api/* URL, or the same value
+in an X-Profile header. Admins can also switch on sampling at runtime (POST
+/admin/profiles/settings), which profiles that fraction of everyone's requests
+on those routes until it is switched off again. Settings are per process: each
+worker has its own, and they reset to the PROFILE_* variables on restart.
+
+Modes:
+- cprofile: deterministic, every call in the request's thread; saved as a
+  .prof file (pstats, snakeviz)
+- sample: a background thread records the request thread's stack every
+  PROFILE_INTERVAL_MS; much cheaper, saved as folded stacks (flamegraph.pl,
+  speedscope)
+- memory: tracemalloc snapshots before and after; the allocation growth by
+  line is added to the profile's metadata (process-wide, so concurrent
+  requests show up too)
+
+Each profile is saved under PROFILE_DIR with a JSON summary of its hotspots and
+listed per route at /admin/profiles; an admin's flagged request also gets them
+back in X-Profile-Id / X-Profile-Hotspots headers (sampled users' responses
+carry nothing).
+"""
+from collections import Counter
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+import uuid
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "memory/profiles")
+# Profiles kept on disk (oldest deleted first)
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+# Stack sampling interval for the "sample" mode
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+
+MODES = ("cprofile", "sample")
+# Functions listed per profile / in the response header
+HOTSPOTS = 10
+HEADER_HOTSPOTS = 3
+# Frames kept per tracemalloc allocation
+TRACEMALLOC_FRAMES = 10
+
+# WSGI environ key under which the async server hands Flask the choice it made
+CHOICE_ENVIRON = "finance.profile_choice"
+
+_ID = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$")
+_BUILTIN_ADDRESS = re.compile(r" at 0x[0-9a-f]+")
+
+
+class Settings:
+    """Sampled profiling of all traffic on eligible routes; changed at runtime by admins (this process only)"""
+
+    def __init__(self):
+        self.sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        self.mode = os.getenv("PROFILE_MODE", "sample")
+        self.memory = False
+        self._lock = threading.Lock()
+
+    def update(self, sample_rate=None, mode=None, memory=None):
+        with self._lock:
+            if sample_rate is not None:
+                sample_rate = float(sample_rate)
+                if not 0 <= sample_rate <= 1:
+                    raise ValueError("sample_rate must be between 0 and 1")
+                self.sample_rate = sample_rate
+            if mode is not None:
+                if mode not in MODES:
+                    raise ValueError(f"mode must be one of {', '.join(MODES)}")
+                self.mode = mode
+            if memory is not None:
+                self.memory = bool(memory)
+        return self.to_dict()
+
+    def to_dict(self):
+        return {"sample_rate": self.sample_rate, "mode": self.mode, "memory": self.memory}
+
+
+settings = Settings()
+
+
+def eligible(path):
+    """Routes that can be profiled (the event stream outlives its request hooks)"""
+    return path == "/dashboard" or (path.startswith("/api/") and path != "/api/events")
+
+
+def parse_flag(value):
+    """"cprofile,memory" -> ("cprofile", True); None for anything else"""
+    parts = {part.strip().lower() for part in (value or "").split(",") if part.strip()}
+    memory = "memory" in parts
+    modes = parts & set(MODES)
+    if len(modes) > 1 or parts - set(MODES) - {"memory", "1"}:
+        return None
+    if modes:
+        return modes.pop(), memory
+    if parts:
+        return settings.mode, memory
+    return None
+
+
+def choose(path, flag, is_admin):
+    """(mode, memory) to profile this request with, or None; is_admin is called only for flagged requests"""
+    if not eligible(path):
+        return None
+    if flag:
+        choice = parse_flag(flag)
+        if choice and is_admin():
+            return choice
+    rate = settings.sample_rate
+    if rate and random.random() < rate:
+        return settings.mode, settings.memory
+    return None
+
+
+# --- profilers ---
+
+class _StackSampler:
+    """Samples one thread's stack from a background thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({_short(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        """flamegraph.pl / speedscope input: "outer;inner count" per line"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def hotspots(self):
+        """Functions by samples on top of the stack (self) and anywhere in it (total)"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for name in set(stack):
+                total[name] += count
+        ms = self.interval * 1000
+        return [
+            {"function": name, "self_ms": round(count * ms, 1), "total_ms": round(total[name] * ms, 1),
+             "samples": count}
+            for name, count in own.most_common(HOTSPOTS)
+        ]
+
+
+def _short(filename):
+    """Path relative to the working directory, site-packages or the standard library"""
+    if filename.startswith(os.getcwd()):
+        return os.path.relpath(filename)
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    if filename.startswith(_STDLIB):
+        return os.path.relpath(filename, _STDLIB)
+    return filename
+
+
+_STDLIB = sysconfig.get_paths()["stdlib"]
+
+
+_tracemalloc_users = 0
+_tracemalloc_started = False  # by us, so ours to stop
+_tracemalloc_lock = threading.Lock()
+
+
+def _tracemalloc_start():
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            _tracemalloc_started = True
+        _tracemalloc_users += 1
+    return tracemalloc.take_snapshot()
+
+
+def _tracemalloc_stop(before):
+    global _tracemalloc_users, _tracemalloc_started
+    after = tracemalloc.take_snapshot()
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_started:
+            tracemalloc.stop()
+            _tracemalloc_started = False
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    return [
+        {"line": f"{_short(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+         "size_kb": round(stat.size_diff / 1024, 1), "count": stat.count_diff}
+        for stat in diff[:HOTSPOTS] if stat.size_diff > 0
+    ]
+
+
+class RequestProfile:
+    """One profiled request: start() in a before-request hook, stop() when the response is ready"""
+
+    def __init__(self, mode, memory=False):
+        self.mode = mode
+        self.memory = memory
+        self._profiler = None
+        self._sampler = None
+        self._snapshot = None
+
+    def start(self):
+        if self.memory:
+            self._snapshot = _tracemalloc_start()
+        if self.mode == "cprofile":
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                self._profiler = profiler
+            except ValueError:
+                self.mode = "sample"  # another profiler is active (Python 3.12+ allows only one)
+        if self.mode == "sample":
+            self._sampler = _StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+            self._sampler.start()
+        self.started = time.perf_counter()
+        return self
+
+    def stop(self, **info):
+        """Stop profiling and save the result; returns its summary"""
+        duration = time.perf_counter() - self.started
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        allocations = _tracemalloc_stop(self._snapshot) if self._snapshot is not None else None
+
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        summary = {
+            "id": profile_id,
+            "mode": self.mode,
+            "created": round(time.time(), 3),
+            "duration_ms": round(duration * 1000, 3),
+            **info,
+        }
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if self._profiler is not None:
+            summary["artifact"] = f"{profile_id}.prof"
+            summary["hotspots"] = _pstats_hotspots(self._profiler)
+            self._profiler.dump_stats(os.path.join(PROFILE_DIR, summary["artifact"]))
+        else:
+            summary["artifact"] = f"{profile_id}.folded"
+            summary["samples"] = self._sampler.samples
+            summary["hotspots"] = self._sampler.hotspots()
+            with open(os.path.join(PROFILE_DIR, summary["artifact"]), "w") as f:
+                f.write(self._sampler.folded())
+        if allocations is not None:
+            summary["allocations"] = allocations
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        _prune()
+        return summary
+
+
+def _pstats_hotspots(profiler):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:HOTSPOTS]
+    return [
+        {"function": _BUILTIN_ADDRESS.sub("", name) if filename == "~" else f"{name} ({_short(filename)}:{line})",
+         "self_ms": round(tottime * 1000, 3),
+         "total_ms": round(cumtime * 1000, 3), "calls": calls}
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in rows
+    ]
+
+
+def header_hotspots(summary):
+    """X-Profile-Hotspots value: the top functions by own time"""
+    return ", ".join(f"{spot['function']};self={spot['self_ms']}ms"
+                     for spot in summary["hotspots"][:HEADER_HOTSPOTS])
+
+
+# --- stored profiles ---
+
+def _summaries():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = sorted((name for name in os.listdir(PROFILE_DIR) if name.endswith(".json")), reverse=True)
+    summaries = []
+    for name in names:
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                summaries.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Error reading profile {name}: {e}")
+    return summaries
+
+
+def _prune():
+    try:
+        for summary in _summaries()[PROFILE_KEEP:]:
+            for name in (f"{summary['id']}.json", summary.get("artifact")):
+                if name:
+                    os.remove(os.path.join(PROFILE_DIR, name))
+    except OSError as e:
+        print(f"Error pruning profiles: {e}")
+
+
+def list_profiles(route=None):
+    """Stored profiles, newest first, and the latest hotspots per route"""
+    summaries = [s for s in _summaries() if route is None or s.get("route") == route]
+    routes = {}
+    for summary in summaries:
+        routes.setdefault(summary.get("route"), {
+            "profile": summary["id"],
+            "duration_ms": summary["duration_ms"],
+            "hotspots": summary["hotspots"][:HEADER_HOTSPOTS],
+        })
+    return {
+        "settings": settings.to_dict(),
+        "routes": routes,
+        "profiles": [{k: v for k, v in s.items() if k not in ("hotspots", "allocations")} for s in summaries],
+    }
+
+
+def load_profile(profile_id):
+    """A stored profile's summary, or None"""
+    if not _ID.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def artifact_path(profile_id):
+    """Absolute path of a stored profile's .prof / .folded file, or None"""
+    summary = load_profile(profile_id)
+    if summary is None:
+        return None
+    path = os.path.abspath(os.path.join(PROFILE_DIR, summary["artifact"]))
+    return path if os.path.exists(path) else None
@@ -0,0 +1,103 @@
+"""
+Login throttling
+Checked before any password hash is computed, so brute-force traffic is turned
+away for the price of a dict lookup:
+- per client IP, a token bucket over all login and registration attempts
+- per account, a lockout after repeated failures that doubles on each relapse
+State is per process and bounded (least recently seen keys are evicted).
+"""
+from collections import OrderedDict
+import os
+import threading
+import time
+
+LOGIN_ATTEMPTS_PER_IP_MINUTE = float(os.getenv("LOGIN_ATTEMPTS_PER_IP_MINUTE", "30"))
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "5"))
+LOGIN_LOCKOUT_SECONDS = float(os.getenv("LOGIN_LOCKOUT_SECONDS", "30"))
+LOGIN_LOCKOUT_MAX_SECONDS = float(os.getenv("LOGIN_LOCKOUT_MAX_SECONDS", "900"))
+
+# Keys (IPs or accounts) tracked per limiter
+THROTTLE_KEYS = 100000
+
+
+class Throttled(Exception):
+    """Attempt refused before hashing (reason: ip, account or busy)"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(int(retry_after + 0.999), 1)
+
+
+class _BoundedState:
+    def __init__(self, max_keys=THROTTLE_KEYS):
+        self.max_keys = max_keys
+        self._state = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, default):
+        state = self._state.get(key)
+        if state is None:
+            state = self._state[key] = default
+            while len(self._state) > self.max_keys:
+                self._state.popitem(last=False)
+        else:
+            self._state.move_to_end(key)
+        return state
+
+
+class RateLimiter(_BoundedState):
+    """Token bucket per key: `per_minute` sustained, bursts up to `burst`"""
+
+    def __init__(self, per_minute, burst=None, max_keys=THROTTLE_KEYS):
+        super().__init__(max_keys)
+        self.rate = per_minute / 60.0
+        self.burst = burst or max(per_minute / 4, 1)
+
+    def hit(self, key, reason="ip"):
+        """Take a token or raise Throttled"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._get(key, [self.burst, now])
+            tokens = min(self.burst, state[0] + (now - state[1]) * self.rate)
+            state[1] = now
+            if tokens < 1:
+                state[0] = tokens
+                raise Throttled(reason, (1 - tokens) / self.rate)
+            state[0] = tokens - 1
+
+
+class FailureLockout(_BoundedState):
+    """Locks a key out after `max_failures` consecutive failures"""
+
+    def __init__(self, max_failures=LOGIN_MAX_FAILURES, lockout=LOGIN_LOCKOUT_SECONDS,
+                 lockout_max=LOGIN_LOCKOUT_MAX_SECONDS, max_keys=THROTTLE_KEYS):
+        super().__init__(max_keys)
+        self.max_failures = max_failures
+        self.lockout = lockout
+        self.lockout_max = lockout_max
+
+    def check(self, key, reason="account"):
+        with self._lock:
+            state = self._state.get(key)
+            if state and state["locked_until"] > time.monotonic():
+                raise Throttled(reason, state["locked_until"] - time.monotonic())
+
+    def failed(self, key):
+        with self._lock:
+            state = self._get(key, {"failures": 0, "lockouts": 0, "locked_until": 0.0})
+            state["failures"] += 1
+            if state["failures"] >= self.max_failures:
+                delay = min(self.lockout * 2 ** state["lockouts"], self.lockout_max)
+                state["locked_until"] = time.monotonic() + delay
+                state["lockouts"] += 1
+                state["failures"] = 0
+
+    def succeeded(self, key):
+        with self._lock:
+            self._state.pop(key, None)
+
+
+# Process-wide limiters used by auth.py
+ip_limiter = RateLimiter(LOGIN_ATTEMPTS_PER_IP_MINUTE)
+account_lockout = FailureLockout()
@@ -0,0 +1,221 @@
+"""
+JSON API responses: fast encoding, field selection and compression
+- Encoding: orjson when installed (JSON_ENCODER=auto), else the standard
+  library; installed as Flask's JSON provider so every jsonify() uses it, and
+  used by asgi.py's native routes. Both write compact UTF-8 with sorted keys,
+  non-ASCII text unescaped, NaN/Infinity as null and Flask's date format, so
+  a body decodes to the same values either way. Float exponents are spelled
+  differently (1e16 / 1e+16), so ENCODER is part of the HTTP cache's ETag.
+- Field selection: ?fields=risk,budget.suggestions keeps only those sections
+  (dotted paths reach into nested objects and lists of objects); error
+  payloads are always sent whole.
+- Compression: bodies of at least COMPRESS_MIN_BYTES are sent brotli (when the
+  Brotli package is installed) or gzip encoded, whichever the client prefers.
+  Responses with an ETag (the HTTP cache) keep their compressed bytes, so a
+  cache hit isn't compressed again; the ETag is made weak, as the bytes
+  differ per encoding.
+"""
+from collections import OrderedDict
+import gzip
+import json
+import math
+import os
+import threading
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import parse_accept_header
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# auto (orjson if installed), orjson or json
+JSON_ENCODER = os.getenv("JSON_ENCODER", "auto")
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "1") == "1"
+# Smaller bodies are sent as they are
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+# Compressed bodies of cacheable (ETag) responses kept per process (LRU)
+COMPRESSED_CACHE_ENTRIES = int(os.getenv("COMPRESSED_CACHE_ENTRIES", "2000"))
+
+COMPRESSIBLE = ("application/json", "text/html", "text/plain", "text/css", "application/javascript",
+                "text/javascript", "image/svg+xml")
+
+_compressed = OrderedDict()
+_lock = threading.Lock()
+
+if JSON_ENCODER == "orjson" and orjson is None:
+    print("JSON_ENCODER=orjson but orjson is not installed - using the json module")
+_use_orjson = orjson is not None and JSON_ENCODER in ("auto", "orjson")
+ENCODER = "orjson" if _use_orjson else "json"
+if _use_orjson:
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def _default(value):
+    """Whatever Flask's provider serializes (dates as HTTP dates, Decimal, UUID, dataclasses), else str"""
+    try:
+        return DefaultJSONProvider.default(value)
+    except TypeError:
+        return str(value)
+
+
+def _finite(value):
+    """value with NaN/Infinity floats replaced by None, as orjson writes them"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _json_dumps(value):
+    return json.dumps(value, default=_default, sort_keys=True, separators=(",", ":"),
+                      ensure_ascii=False, allow_nan=False)
+
+
+def dumps(value):
+    """Compact UTF-8 JSON bytes with sorted keys"""
+    if _use_orjson:
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+    try:
+        text = _json_dumps(value)
+    except ValueError:
+        text = _json_dumps(_finite(value))  # NaN/Infinity somewhere - rare, so only then walk it
+    return text.encode("utf-8")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider encoding with dumps() (app.json = FastJSONProvider(app))"""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode("utf-8")
+
+    def response(self, *args, **kwargs):
+        if self._app.debug:
+            return super().response(*args, **kwargs)  # indented, for reading
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+
+# --- field selection ---
+
+def parse_fields(text):
+    """"risk,budget.suggestions" -> {"risk": None, "budget": {"suggestions": None}} (None: keep all); None when empty"""
+    tree = {}
+    for path in (text or "").split(","):
+        parts = [part.strip() for part in path.split(".") if part.strip()]
+        if not parts:
+            continue
+        node = tree
+        for part in parts[:-1]:
+            if part in node and node[part] is None:
+                break  # an ancestor is kept whole already
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = None
+    return tree or None
+
+
+def select_fields(value, fields):
+    """Keep only the `fields` tree (from parse_fields) of value; lists are filtered element by element"""
+    if fields is None:
+        return value
+    if isinstance(value, list):
+        return [select_fields(item, fields) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {key: value[key] if sub is None else select_fields(value[key], sub)
+            for key, sub in fields.items() if key in value}
+
+
+def apply_fields(payload, text):
+    """?fields= selection (text: the parameter's value) for a response payload; error payloads stay whole"""
+    fields = parse_fields(text)
+    if fields is None or (isinstance(payload, dict) and ("error" in payload or payload.get("status") == "error")):
+        return payload
+    return select_fields(payload, fields)
+
+
+def api_response(payload, status=200):
+    """jsonify() honouring ?fields= for a Flask view"""
+    response = current_app.json.response(apply_fields(payload, request.args.get("fields")))
+    response.status_code = status
+    return response
+
+
+# --- compression ---
+
+def negotiate(accept_encoding):
+    """"br", "gzip" or None for an Accept-Encoding header value"""
+    if not RESPONSE_COMPRESSION or not accept_encoding:
+        return None
+    offered = ("br", "gzip") if brotli is not None else ("gzip",)
+    return parse_accept_header(accept_encoding).best_match(offered)
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compressible(mimetype, length):
+    return length >= COMPRESS_MIN_BYTES and (mimetype or "").split(";")[0].strip() in COMPRESSIBLE
+
+
+def encode_body(body, mimetype, accept_encoding, etag=None):
+    """(body, encoding or None) for a buffered response; etag lets the compressed bytes be reused"""
+    if not compressible(mimetype, len(body)):
+        return body, None
+    encoding = negotiate(accept_encoding)
+    if encoding is None:
+        return body, None
+    if etag is None:
+        return compress(body, encoding), encoding
+    key = (etag, encoding)
+    with _lock:
+        cached = _compressed.get(key)
+        if cached is not None:
+            _compressed.move_to_end(key)
+            return cached, encoding
+    cached = compress(body, encoding)
+    with _lock:
+        _compressed[key] = cached
+        while len(_compressed) > COMPRESSED_CACHE_ENTRIES:
+            _compressed.popitem(last=False)
+    return cached, encoding
+
+
+def weak_etag(etag):
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+def compress_response(response):
+    """Flask after_request hook: encode the body when the client accepts it"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers):
+        return response
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    etag = response.headers.get("ETag")
+    encoded, encoding = encode_body(body, response.mimetype, request.headers.get("Accept-Encoding"), etag)
+    if encoding is None:
+        return response
+    response.set_data(encoded)
+    response.headers["Content-Encoding"] = encoding
+    if etag:
+        response.headers["ETag"] = weak_etag(etag)
+    return response
@@ -0,0 +1,67 @@
+"""
+Fixed-bin quantile sketches
+A sketch is a histogram over a known value range stored as cumulative counts,
+so it is a few hundred integers regardless of population size and answers
+"what share of values is below x" with one array lookup.
+"""
+import json
+
+
+class HistogramSketch:
+    """Cumulative histogram over [low, high] with `bins` equal-width bins"""
+
+    def __init__(self, low, high, bins, cumulative=None):
+        self.low = low
+        self.high = high
+        self.bins = bins
+        self.counts = [0] * bins if cumulative is None else None
+        self.cumulative = cumulative
+
+    @property
+    def total(self):
+        if self.cumulative is not None:
+            return self.cumulative[-1] if self.cumulative else 0
+        return sum(self.counts)
+
+    def _bin(self, value):
+        if value <= self.low:
+            return 0
+        if value >= self.high:
+            return self.bins - 1
+        return int((value - self.low) / (self.high - self.low) * self.bins)
+
+    def add(self, value):
+        self.counts[self._bin(value)] += 1
+
+    def freeze(self):
+        """Turn counts into cumulative form for O(1) lookups"""
+        running = 0
+        self.cumulative = []
+        for count in self.counts:
+            running += count
+            self.cumulative.append(running)
+        self.counts = None
+        return self
+
+    def percentile_of(self, value):
+        """Share (0-100) of values below `value`, interpolated inside its bin"""
+        total = self.total
+        if not total:
+            return None
+        index = self._bin(value)
+        below = self.cumulative[index - 1] if index > 0 else 0
+        in_bin = self.cumulative[index] - below
+        width = (self.high - self.low) / self.bins
+        offset = min(max((value - self.low) / width - index, 0), 1)
+        return round((below + in_bin * offset) / total * 100, 1)
+
+    def to_json(self):
+        return json.dumps({
+            "low": self.low, "high": self.high, "bins": self.bins,
+            "cumulative": self.cumulative
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        return cls(data["low"], data["high"], data["bins"], data["cumulative"])
@@ -0,0 +1,230 @@
+"""
+Per-request tracing
+A trace is opened for each request (Flask hooks in app.py, natively served
+routes in asgi.py) and held in a context variable, so it follows the request
+into worker threads (run_in_db_thread) and asyncio tasks. Agent methods
+(@traced_methods), SQLite statements (memory/db.py) and LLM calls record
+spans into it. When the request ends the spans are summed per name into a
+Server-Timing header and, with TRACE_LOG, written as one JSON log line.
+
+Off unless TRACING=1. Disabled, the decorators return the original methods, so
+there is nothing to pay.
+"""
+from contextvars import ContextVar
+import functools
+import inspect
+import itertools
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+from utils.logs import json_logger, log_event
+
+TRACING = os.getenv("TRACING", "0") == "1"
+# Fraction of requests traced
+TRACE_SAMPLE = float(os.getenv("TRACE_SAMPLE", "1.0"))
+# Write each finished trace as a JSON line to stderr
+TRACE_LOG = os.getenv("TRACE_LOG", "1") == "1"
+# Only log traces at least this slow
+TRACE_LOG_MIN_MS = float(os.getenv("TRACE_LOG_MIN_MS", "0"))
+# Spans kept per trace for the log; later ones still count towards Server-Timing
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "500"))
+
+# Server-Timing entries per response (largest first)
+SERVER_TIMING_ENTRIES = 20
+
+_current = ContextVar("trace", default=None)
+_parent = ContextVar("trace_span", default=None)
+
+logger = json_logger("finance.trace")
+
+
+class Span:
+    __slots__ = ("trace", "name", "attrs", "id", "parent", "start", "_token")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        self.id = next(self.trace._ids)
+        self.parent = _parent.get()
+        self._token = _parent.set(self.id)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _parent.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.trace._record(self, duration)
+        return False
+
+
+class _NoSpan:
+    """Stands in for a span when no trace is active"""
+
+    def set(self, **attrs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Trace:
+    def __init__(self, name, attrs):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.dropped = 0
+        self.totals = {}  # span name -> [seconds, count]
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._token = None
+
+    def span(self, name, **attrs):
+        return Span(self, name, attrs)
+
+    def _record(self, span, duration):
+        with self._lock:
+            total = self.totals.setdefault(span.name, [0.0, 0])
+            total[0] += duration
+            total[1] += 1
+            if len(self.spans) >= TRACE_MAX_SPANS:
+                self.dropped += 1
+                return
+            self.spans.append({
+                "id": span.id,
+                "parent": span.parent,
+                "name": span.name,
+                "start_ms": round((span.start - self.start) * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+                **span.attrs
+            })
+
+    def server_timing(self):
+        """Header value: per-name totals (largest first) and the request total"""
+        with self._lock:
+            totals = sorted(self.totals.items(), key=lambda item: -item[1][0])[:SERVER_TIMING_ENTRIES]
+        entries = []
+        for name, (seconds, count) in totals:
+            entry = f"{_token_name(name)};dur={seconds * 1000:.2f}"
+            if count > 1:
+                entry += f';desc="{count} calls"'
+            entries.append(entry)
+        entries.append(f"total;dur={self.duration * 1000:.2f}")
+        return ", ".join(entries)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "trace_id": self.id,
+                "name": self.name,
+                "timestamp": round(self.wall_start, 3),
+                "duration_ms": round(self.duration * 1000, 3),
+                **self.attrs,
+                "totals": {name: {"ms": round(s * 1000, 3), "count": n} for name, (s, n) in self.totals.items()},
+                "spans": list(self.spans),
+                "dropped_spans": self.dropped
+            }
+
+
+def _token_name(name):
+    return re.sub(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]", "_", name)
+
+
+def start(name, **attrs):
+    """Open a trace for the current request; None when tracing is off or the request isn't sampled"""
+    if not TRACING or (TRACE_SAMPLE < 1 and random.random() >= TRACE_SAMPLE):
+        return None
+    trace = Trace(name, attrs)
+    trace._token = _current.set(trace)
+    return trace
+
+
+def finish(trace, **attrs):
+    """Close a trace from start(), log it and return its Server-Timing header value"""
+    if trace.duration is not None:
+        return trace.server_timing()
+    trace.duration = time.perf_counter() - trace.start
+    trace.attrs.update(attrs)
+    try:
+        _current.reset(trace._token)
+    except ValueError:
+        _current.set(None)  # finished from another context
+    if TRACE_LOG and trace.duration * 1000 >= TRACE_LOG_MIN_MS:
+        log_event(logger, "trace", **trace.to_dict())
+    return trace.server_timing()
+
+
+def current_trace():
+    return _current.get()
+
+
+def span(name, **attrs):
+    """A span in the current trace (no-op outside one): `with span("llm", provider=...) as s:`"""
+    trace = _current.get()
+    if trace is None:
+        return _NO_SPAN
+    return Span(trace, name, attrs)
+
+
+def statement(sql):
+    """SQL text as a span attribute"""
+    return " ".join(sql.split())[:160]
+
+
+def traced(name):
+    """Decorator: a span around each call while a trace is active"""
+    def decorate(func):
+        if not TRACING:
+            return func
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                trace = _current.get()
+                if trace is None:
+                    return await func(*args, **kwargs)
+                with Span(trace, name, {}):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            with Span(trace, name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def traced_methods(cls):
+    """Class decorator: @traced on every public method the class defines, as Class.method"""
+    if not TRACING:
+        return cls
+    for name, value in list(vars(cls).items()):
+        if inspect.isfunction(value) and not name.startswith("_"):
+            setattr(cls, name, traced(f"{cls.__name__}.{name}")(value))
+    return cls
+